@@ -0,0 +1,37 @@
+"""
+Helpers for the async views served under ASGI (`core.asgi`).
+
+Django's async ORM (`aget`, `afirst`, `async for`) covers reads. Transactions and
+row locks still need sync code, run with `sync_to_async`. CPU-bound or blocking
+work that does not touch the database (shapely, Labelbox SDK calls) goes through
+`run_blocking`, whose pool is bounded so a burst of requests cannot start
+unbounded numbers of threads.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.http import Http404
+
+_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_BLOCKING_WORKERS, thread_name_prefix='blocking')
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking call in the shared bounded pool and await its result.
+
+    The caller's context variables go with it, so metrics stages timed inside still
+    count towards the current request.
+    """
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_executor, call)
+
+
+async def aget_object_or_404(queryset, **lookup):
+    """Async `get_object_or_404` for a queryset."""
+    try:
+        return await queryset.aget(**lookup)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
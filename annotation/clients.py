@@ -0,0 +1,112 @@
+import threading
+
+import labelbox as lb
+from cachetools import TTLCache
+from django.conf import settings
+
+from .metrics import labelbox_call
+
+# api key -> lb.Client, shared by every LabelboxService in the process
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key=None):
+    """
+    Return the process-wide Labelbox client for an API key, creating it on first use.
+
+    The client keeps its HTTP session (and so its connection pool) for the life of the
+    process, instead of every service call paying for a new client and TLS handshake.
+    """
+    api_key = api_key or settings.LABELBOX_API_KEY
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = lb.Client(api_key=api_key)
+        return client
+
+
+def set_client(client, api_key=None):
+    """
+    Make `client` the shared client for an API key, e.g. a FakeLabelboxClient for
+    benchmarks. Cached metadata from the previous client is dropped.
+    """
+    api_key = api_key or settings.LABELBOX_API_KEY
+    with _clients_lock:
+        _clients[api_key] = client
+    metadata_cache.clear()
+
+
+def reset_clients():
+    """Drop the shared clients and cached metadata (e.g. after a fork or in tests)."""
+    with _clients_lock:
+        _clients.clear()
+    metadata_cache.clear()
+
+
+class LabelboxMetadataCache:
+    """
+    TTL/LRU cache of Labelbox project and ontology objects, keyed by Labelbox id.
+
+    Projects and ontologies change rarely, so hot paths (exports, uploads, label
+    conversion) read them from here instead of calling `get_project` /
+    `project.ontology()` every time. Code that changes a project's ontology calls
+    `invalidate` so the next read goes back to Labelbox.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self._cache = TTLCache(
+            maxsize=maxsize or settings.LABELBOX_CACHE_SIZE,
+            ttl=ttl if ttl is not None else settings.LABELBOX_CACHE_TTL
+        )
+        self._lock = threading.Lock()
+
+    def _get(self, key, load):
+        with self._lock:
+            value = self._cache.get(key)
+        if value is None:
+            # Loaded outside the lock; two threads missing at once both fetch, which is harmless
+            value = load()
+            with self._lock:
+                self._cache[key] = value
+        return value
+
+    def get_project(self, client, project_id):
+        def load():
+            with labelbox_call('get_project'):
+                return client.get_project(project_id)
+        return self._get(('project', project_id), load)
+
+    def get_ontology(self, client, project_id):
+        def load():
+            project = self.get_project(client, project_id)
+            with labelbox_call('get_ontology'):
+                return project.ontology()
+        return self._get(('ontology', project_id), load)
+
+    def get_ontology_by_id(self, client, ontology_id):
+        def load():
+            with labelbox_call('get_ontology'):
+                return client.get_ontology(ontology_id)
+        return self._get(('ontology_id', ontology_id), load)
+
+    def set_ontology(self, ontology):
+        with self._lock:
+            self._cache[('ontology_id', ontology.uid)] = ontology
+
+    def set_project(self, project):
+        with self._lock:
+            self._cache[('project', project.uid)] = project
+
+    def invalidate(self, project_id):
+        """Forget everything cached for a Labelbox project."""
+        with self._lock:
+            self._cache.pop(('project', project_id), None)
+            self._cache.pop(('ontology', project_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+metadata_cache = LabelboxMetadataCache()
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AnnotationTask
+
+
+def annotator_id(request):
+    """Who is asking for work: the logged-in user, or else the browser session."""
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    if request.session.session_key is None:
+        request.session.save()
+    return f"session:{request.session.session_key}"
+
+
+def claim_next_task(project, owner):
+    """
+    Hand the next task of a project to an annotator.
+
+    An annotator still holding a live lease gets that task back (and the lease is
+    renewed). Otherwise the oldest PENDING task is locked with SELECT ... FOR UPDATE
+    SKIP LOCKED, so concurrent callers each get a different row without waiting on
+    one another, and is leased as IN_PROGRESS for TASK_LEASE_SECONDS. Tasks with an
+    `import_error` are never handed out.
+
+    :param owner: Annotator id, see `annotator_id`.
+    :return: The leased AnnotationTask, or None if no task is available.
+    """
+    now = timezone.now()
+    lease_expires_at = now + timedelta(seconds=settings.TASK_LEASE_SECONDS)
+
+    with transaction.atomic():
+        tasks = AnnotationTask.objects.select_for_update(skip_locked=True).filter(project=project)
+        task = tasks.filter(status='IN_PROGRESS', lease_owner=owner, lease_expires_at__gt=now).first()
+        if task is None:
+            # A task whose data row Labelbox rejected could never be uploaded
+            task = tasks.filter(status='PENDING', import_error='').order_by('created_at').first()
+        if task is None:
+            return None
+
+        task.status = 'IN_PROGRESS'
+        task.lease_owner = owner
+        task.lease_expires_at = lease_expires_at
+        task.save(update_fields=['status', 'lease_owner', 'lease_expires_at', 'updated_at'])
+        return task
+
+
+def release_expired_leases():
+    """
+    Put IN_PROGRESS tasks whose lease ran out back to PENDING (the annotator left).
+
+    :return: Number of tasks released.
+    """
+    return AnnotationTask.objects.filter(status='IN_PROGRESS', lease_expires_at__lt=timezone.now()).update(
+        status='PENDING', lease_owner='', lease_expires_at=None, updated_at=timezone.now()
+    )
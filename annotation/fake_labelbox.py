@@ -0,0 +1,369 @@
+"""
+In-process stand-in for the parts of the Labelbox SDK this app uses.
+
+`FakeLabelboxClient` keeps projects, datasets, data rows, ontologies and labels in
+memory. Every API call can be slowed down (`latency`) and made to fail at random
+(`error_rate`), and data row imports can reject a share of their rows
+(`row_failure_rate`), so the sync, import and export paths can be timed and
+exercised without a Labelbox account. Install it for the whole process with
+`annotation.clients.set_client`; MAL imports go through the SDK class rather than the
+client, so patch `labelbox.MALPredictionImport` with `FakeMALPredictionImport` too.
+"""
+import hashlib
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from labelbox.data.serialization import NDJsonConverter
+from lbox.exceptions import InternalServerError, ResourceNotFoundError
+
+# NDJSON geometry key -> export `annotation_kind`
+ANNOTATION_KINDS = {'bbox': 'ImageBoundingBox', 'polygon': 'ImagePolygon', 'point': 'ImagePoint'}
+
+
+def _uid():
+    return uuid.uuid4().hex[:25]
+
+
+class FakeTask:
+    """A Labelbox task that already finished (`wait_till_done` returns at once)."""
+
+    def __init__(self, status='COMPLETE', result=None, errors=None, failed_data_rows=None):
+        self.status = status
+        self.result = result
+        self.errors = errors
+        self.failed_data_rows = failed_data_rows
+
+    def wait_till_done(self, *args, **kwargs):
+        return None
+
+
+class FakeDataRow:
+    def __init__(self, dataset, row_data, global_key, created_at):
+        self.uid = _uid()
+        self._dataset = dataset
+        self.row_data = row_data
+        self.global_key = global_key
+        self.created_at = created_at
+
+    def dataset(self):
+        return self._dataset
+
+
+class FakeDataset:
+    def __init__(self, client, name):
+        self.uid = _uid()
+        self.name = name
+        self._client = client
+        self._data_rows = []
+
+    def create_data_rows(self, items):
+        """:param items: {"row_data", "global_key"} dicts, as DataRowImporter sends them."""
+        self._client._call()
+        created, failures = [], []
+        for item in items:
+            if self._client._random() < self._client.row_failure_rate:
+                failures.append(item["global_key"])
+                continue
+            data_row = self._client._add_data_row(self, item["row_data"], item["global_key"])
+            created.append({"id": data_row.uid, "global_key": data_row.global_key, "row_data": data_row.row_data})
+
+        failed_data_rows = [
+            {"message": "Injected data row failure", "failedDataRows": [{"globalKey": global_key}]}
+            for global_key in failures
+        ]
+        return FakeTask(result=created, failed_data_rows=failed_data_rows)
+
+    def data_rows(self):
+        """Data rows newest first, like the SDK pages them."""
+        self._client._call()
+        with self._client._lock:
+            data_rows = list(self._data_rows)
+        return reversed(data_rows)
+
+
+class FakeOntology:
+    def __init__(self, name, normalized):
+        self.uid = _uid()
+        self.name = name
+        self.normalized = self._with_schema_ids(normalized)
+
+    @classmethod
+    def _with_schema_ids(cls, node):
+        # Every tool, classification and option gets a feature schema id, as Labelbox assigns them
+        if isinstance(node, list):
+            return [cls._with_schema_ids(item) for item in node]
+        if not isinstance(node, dict):
+            return node
+        node = {key: cls._with_schema_ids(value) for key, value in node.items()}
+        if "name" in node or "value" in node:
+            node["featureSchemaId"] = node.get("featureSchemaId") or _uid()
+            node["schemaNodeId"] = node.get("schemaNodeId") or _uid()
+        return node
+
+
+class FakeExportTask:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def wait_till_done(self, *args, **kwargs):
+        return None
+
+    def has_errors(self):
+        return False
+
+    def has_result(self):
+        return bool(self._rows)
+
+    def get_buffered_stream(self, stream_type=None):
+        return (FakeStreamOutput(row) for row in self._rows)
+
+
+class FakeStreamOutput:
+    def __init__(self, row):
+        self.json = row
+
+
+class FakeProject:
+    def __init__(self, client, name, description=''):
+        self.uid = _uid()
+        self.name = name
+        self.description = description
+        self._client = client
+        self._ontology = None
+        self._data_rows = {}  # global key -> FakeDataRow
+        self._labels = {}  # global key -> list of (updated_at, export object)
+        self._classifications = {}  # global key -> {uuid: label-level classification row}
+
+    def connect_ontology(self, ontology):
+        self._client._call()
+        self._ontology = ontology
+
+    def ontology(self):
+        self._client._call()
+        return self._ontology
+
+    def create_batches_from_dataset(self, name_prefix, dataset_id, *args, **kwargs):
+        self._client._call()
+        dataset = self._client.get_dataset(dataset_id)
+        with self._client._lock:
+            self._data_rows.update((data_row.global_key, data_row) for data_row in dataset._data_rows)
+        return FakeTask()
+
+    def add_label(self, global_key, obj, updated_at=None):
+        """
+        Attach an export object (as in `projects.<id>.labels[].annotations.objects`) to a data row.
+        An object with the `feature_id` of an earlier one replaces it, as a re-imported annotation does.
+        """
+        with self._client._lock:
+            labels = [
+                label for label in self._labels.get(global_key, [])
+                if label[1].get("feature_id") != obj.get("feature_id")
+            ]
+            labels.append((updated_at or datetime.now(timezone.utc), obj))
+            self._labels[global_key] = labels
+
+    def export(self, params=None, filters=None):
+        self._client._call()
+        since = until = None
+        if filters and filters.get("last_activity_at"):
+            since, until = (
+                datetime.strptime(value, "%Y-%m-%dT%H:%M:%S%z") for value in filters["last_activity_at"]
+            )
+
+        rows = []
+        with self._client._lock:
+            for global_key, data_row in self._data_rows.items():
+                objects = [
+                    obj for updated_at, obj in self._labels.get(global_key, [])
+                    if since is None or since <= updated_at.replace(microsecond=0) <= until
+                ]
+                if since is not None and not objects:
+                    continue
+                rows.append({
+                    "data_row": {"id": data_row.uid, "global_key": global_key, "row_data": data_row.row_data},
+                    "projects": {self.uid: {"labels": [{"annotations": {"objects": objects}}] if objects else []}},
+                })
+        return FakeExportTask(rows)
+
+    def _tool_names(self):
+        tools = self._ontology.normalized.get("tools", []) if self._ontology else []
+        return {tool["featureSchemaId"]: tool["name"] for tool in tools}
+
+    def _classification_names(self):
+        classifications = self._ontology.normalized.get("classifications", []) if self._ontology else []
+        return {classification["featureSchemaId"]: classification["name"] for classification in classifications}
+
+
+class FakeMALPredictionImport(FakeTask):
+    """Stands in for `lb.MALPredictionImport`; predictions become labels of the fake project."""
+
+    @classmethod
+    def create_from_objects(cls, client, project_id, name, predictions):
+        client._call()
+        project = client.get_project(project_id)
+        if predictions and not isinstance(predictions[0], dict):
+            predictions = list(NDJsonConverter.serialize(predictions))
+
+        tool_names = project._tool_names()
+        classification_names = project._classification_names()
+        errors = []
+        for row in predictions:
+            if row.get("schemaId") in classification_names and "answer" in row:
+                # Label-level classification of the data row
+                with client._lock:
+                    project._classifications.setdefault(row["dataRow"]["globalKey"], {})[row.get("uuid")] = row
+                continue
+            if row.get("schemaId") not in tool_names:
+                errors.append({"uuid": row.get("uuid"), "errors": [{"message": "Unknown schemaId"}]})
+                continue
+            kind = next((key for key in ANNOTATION_KINDS if key in row), None)
+            project.add_label(row["dataRow"]["globalKey"], {
+                "feature_id": row.get("uuid") or _uid(),
+                "name": tool_names[row["schemaId"]],
+                "annotation_kind": ANNOTATION_KINDS.get(kind, "Unknown"),
+                "classifications": row.get("classifications", []),
+                kind or "value": row.get(kind),
+            })
+        return cls(errors=errors)
+
+
+class FakeLabelboxClient:
+    """
+    In-memory Labelbox with configurable latency and error injection.
+
+    :param latency: Seconds every API call sleeps before answering.
+    :param error_rate: Probability (0-1) that an API call raises InternalServerError.
+    :param row_failure_rate: Probability (0-1) that a data row in `create_data_rows` is rejected.
+    :param seed: Seed of the random numbers behind the injected failures.
+    """
+    def __init__(self, latency=0.0, error_rate=0.0, row_failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.row_failure_rate = row_failure_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()
+        self._projects = {}
+        self._datasets = {}
+        self._ontologies = {}
+        self._data_rows = {}  # global key -> FakeDataRow
+
+    def _random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and self._random() < self.error_rate:
+            raise InternalServerError("Injected Labelbox error")
+
+    def _add_data_row(self, dataset, row_data, global_key):
+        with self._lock:
+            data_row = FakeDataRow(dataset, row_data, global_key, datetime.now(timezone.utc))
+            dataset._data_rows.append(data_row)
+            self._data_rows[global_key] = data_row
+            return data_row
+
+    def create_project(self, name, description='', media_type=None, **kwargs):
+        self._call()
+        project = FakeProject(self, name, description)
+        with self._lock:
+            self._projects[project.uid] = project
+        return project
+
+    def get_project(self, project_id):
+        self._call()
+        with self._lock:
+            project = self._projects.get(project_id)
+        if project is None:
+            raise ResourceNotFoundError(message=f"Project {project_id} not found")
+        return project
+
+    def create_dataset(self, name, **kwargs):
+        self._call()
+        dataset = FakeDataset(self, name)
+        with self._lock:
+            self._datasets[dataset.uid] = dataset
+        return dataset
+
+    def get_dataset(self, dataset_id):
+        self._call()
+        with self._lock:
+            dataset = self._datasets.get(dataset_id)
+        if dataset is None:
+            raise ResourceNotFoundError(message=f"Dataset {dataset_id} not found")
+        return dataset
+
+    def get_datasets(self, where=None):
+        self._call()
+        with self._lock:
+            return list(self._datasets.values())
+
+    def get_data_row_by_global_key(self, global_key):
+        self._call()
+        with self._lock:
+            data_row = self._data_rows.get(global_key)
+        if data_row is None:
+            raise ResourceNotFoundError(message=f"Data row {global_key} not found")
+        return data_row
+
+    def create_ontology(self, name, normalized, media_type=None, ontology_kind=None):
+        self._call()
+        ontology = FakeOntology(name, normalized)
+        with self._lock:
+            self._ontologies[ontology.uid] = ontology
+        return ontology
+
+    def get_ontology(self, ontology_id):
+        self._call()
+        with self._lock:
+            ontology = self._ontologies.get(ontology_id)
+        if ontology is None:
+            raise ResourceNotFoundError(message=f"Ontology {ontology_id} not found")
+        return ontology
+
+
+class FakeImageResponse:
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self._body), chunk_size):
+            yield self._body[start:start + chunk_size]
+
+
+class FakeImageSession:
+    """
+    `requests.Session` replacement for ImageDownloader: every URL serves a small,
+    URL-specific body with an ETag and answers conditional requests with 304.
+
+    :param size: Body size in bytes.
+    :param failing: URLs answered with HTTP 500 instead.
+    """
+
+    def __init__(self, size=4096, failing=()):
+        self.size = size
+        self.failing = set(failing)
+
+    def get(self, url, headers=None, **kwargs):
+        if url in self.failing:
+            return FakeImageResponse(500)
+        etag = '"%s"' % hashlib.sha256(url.encode()).hexdigest()[:16]
+        if (headers or {}).get('If-None-Match') == etag:
+            return FakeImageResponse(304)
+        body = (url.encode() * (self.size // max(len(url), 1) + 1))[:self.size]
+        return FakeImageResponse(200, body, {'ETag': etag})
@@ -0,0 +1,312 @@
+import struct
+import uuid
+from itertools import chain
+
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+# Errors that mean an annotation's stored data is malformed, not that the code is broken
+INVALID_DATA_ERRORS = (ValueError, TypeError, KeyError, IndexError)
+
+
+# Coordinate fields of one row of Annotation.data, per annotation type
+GEOMETRY_FIELDS = {
+    'bounding_box': ('left', 'top', 'width', 'height'),
+    'point': ('x', 'y'),
+    'polygon': ('x', 'y'),
+}
+GEOMETRY_KIND_CODES = {'bounding_box': 1, 'point': 2, 'polygon': 3}
+
+# Packed geometry: magic, format version, kind code, row count, then the rows as
+# little-endian float32. The 8 byte header keeps the floats 4-byte aligned.
+PACKED_HEADER = struct.Struct('<2sBBI')
+PACKED_MAGIC = b'GM'
+PACKED_VERSION = 1
+PACKED_DTYPE = np.dtype('<f4')
+
+
+def _geometry_fields(annotation_type):
+    fields = GEOMETRY_FIELDS.get(annotation_type)
+    if fields is None:
+        raise ValueError(f"Unsupported annotation type: {annotation_type}")
+    return fields
+
+
+def coordinates_from_json(annotation_type, data):
+    """Turn JSON `Annotation.data` into a float64 array with one row per box/point/vertex."""
+    fields = _geometry_fields(annotation_type)
+    return np.fromiter(
+        chain.from_iterable((item[field] for field in fields) for item in data),
+        dtype=np.float64,
+        count=len(data) * len(fields)
+    ).reshape(-1, len(fields))
+
+
+def coordinates_to_json(annotation_type, coordinates):
+    """The inverse of `coordinates_from_json`."""
+    fields = _geometry_fields(annotation_type)
+    return [dict(zip(fields, row)) for row in coordinates.tolist()]
+
+
+def pack_geometry(annotation_type, data):
+    """Pack JSON `Annotation.data` into the compact binary format."""
+    coordinates = coordinates_from_json(annotation_type, data).astype(PACKED_DTYPE)
+    header = PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, GEOMETRY_KIND_CODES[annotation_type], len(coordinates))
+    return header + coordinates.tobytes()
+
+
+def unpack_geometry(annotation_type, buffer):
+    """
+    Read packed geometry as a read-only NumPy view of the buffer; nothing is copied.
+
+    :param buffer: bytes or memoryview, as returned by a BinaryField.
+    """
+    magic, version, kind, rows = PACKED_HEADER.unpack_from(buffer)
+    if magic != PACKED_MAGIC or version != PACKED_VERSION:
+        raise ValueError("Not packed geometry, or an unknown format version")
+    if kind != GEOMETRY_KIND_CODES.get(annotation_type):
+        raise ValueError(f"Packed geometry does not hold a {annotation_type}")
+    columns = len(GEOMETRY_FIELDS[annotation_type])
+    return np.frombuffer(
+        buffer, dtype=PACKED_DTYPE, count=rows * columns, offset=PACKED_HEADER.size
+    ).reshape(rows, columns)
+
+
+def posted_coordinates(annotation_type, data):
+    """
+    Read posted JSON coordinates, rejecting what the upload would only reject later.
+
+    :return: The coordinates as by `coordinates_from_json`.
+    :raises ValueError: If a row is not an object with every coordinate field as a
+        finite number, or a bounding box has no area inside the image.
+    """
+    fields = _geometry_fields(annotation_type)
+    if not isinstance(data, list) or not data:
+        raise ValueError("Annotation data must be a non-empty list")
+    for item in data:
+        if not isinstance(item, dict) or not all(field in item for field in fields):
+            raise ValueError(f"Every {annotation_type} needs {', '.join(fields)}")
+        if not all(isinstance(item[field], (int, float)) and not isinstance(item[field], bool) for field in fields):
+            raise ValueError("Coordinates must be numbers")
+
+    coordinates = coordinates_from_json(annotation_type, data)
+    if not np.isfinite(coordinates).all():
+        raise ValueError("Coordinates must be finite")
+    if annotation_type == 'bounding_box':
+        # Same rule as the upload: boxes may be drawn right-to-left and are clamped to the image origin
+        x0, y0 = coordinates[:, 0], coordinates[:, 1]
+        x1, y1 = x0 + coordinates[:, 2], y0 + coordinates[:, 3]
+        has_area = (np.clip(np.maximum(x0, x1), 0, None) > np.clip(np.minimum(x0, x1), 0, None)) & \
+                   (np.clip(np.maximum(y0, y1), 0, None) > np.clip(np.minimum(y0, y1), 0, None))
+        if not has_area.all():
+            raise ValueError("Bounding box has no area")
+    return coordinates
+
+
+def normalize_geometry(annotation_type, data, tolerance):
+    """
+    Ingest stage for posted coordinates: all are validated by `posted_coordinates`,
+    polygons are then made valid (self-intersections fixed), simplified to `tolerance`
+    pixels and stripped of repeated vertices. Other types pass through unchanged.
+
+    :param tolerance: Maximum distance in pixels a simplified edge may move; 0 disables it.
+    :return: Tuple of (data to store, vertices received, vertices kept).
+    :raises ValueError: If the coordinates are invalid or a polygon has no area left after it is fixed.
+    """
+    coordinates = posted_coordinates(annotation_type, data)
+    received = len(data)
+    if annotation_type != 'polygon':
+        return data, received, received
+
+    if len(coordinates) < 3:
+        raise ValueError("A polygon needs at least 3 points")
+
+    polygon = Polygon(coordinates)
+    if not polygon.is_valid:
+        # A self-intersecting ring becomes several pieces; a Labelbox polygon is one ring
+        pieces = [geom for geom in shapely.get_parts(shapely.make_valid(polygon)) if isinstance(geom, Polygon)]
+        polygon = max(pieces, key=lambda piece: piece.area, default=Polygon())
+    if tolerance:
+        polygon = polygon.simplify(tolerance, preserve_topology=True)
+    else:
+        polygon = shapely.remove_repeated_points(polygon)
+    if polygon.is_empty or polygon.area <= 0:
+        raise ValueError("Polygon has no area")
+
+    exterior = shapely.get_coordinates(polygon.exterior)[:-1]  # shapely repeats the first vertex
+    return coordinates_to_json(annotation_type, exterior), received, len(exterior)
+
+
+def repack_annotations(annotations, packed, batch_size=1000):
+    """
+    Move existing annotations between JSON `data` and packed `geometry`.
+
+    Works on plain querysets, so data migrations can call it with historical models.
+
+    :param annotations: Queryset of annotations to convert.
+    :param packed: True to pack JSON rows, False to unpack packed rows.
+    :return: Number of annotations converted.
+    """
+    annotations = annotations.filter(geometry__isnull=packed, annotation_type__in=list(GEOMETRY_FIELDS))
+    converted = 0
+    batch = []
+    for annotation in annotations.only('id', 'annotation_type', 'data', 'geometry').iterator(chunk_size=batch_size):
+        if packed:
+            annotation.geometry = pack_geometry(annotation.annotation_type, annotation.data)
+            annotation.data = None
+        else:
+            annotation.data = coordinates_to_json(
+                annotation.annotation_type, unpack_geometry(annotation.annotation_type, annotation.geometry)
+            )
+            annotation.geometry = None
+        batch.append(annotation)
+        if len(batch) >= batch_size:
+            converted += _save_repacked(annotations.model, batch)
+            batch = []
+    return converted + _save_repacked(annotations.model, batch)
+
+
+def _save_repacked(model, batch):
+    model.objects.bulk_update(batch, ['data', 'geometry'])
+    return len(batch)
+
+
+class NDJsonAnnotationConverter:
+    """
+    Converts many Annotation rows straight to Labelbox NDJSON import dicts.
+
+    Coordinates are parsed into NumPy arrays and all annotations of one geometry type
+    are normalized, clamped to the image origin and validated together, instead of
+    building a pydantic Point per vertex and serializing the Label objects afterwards.
+    The rows match what `convert_to_python_annotation` + NDJsonConverter produce.
+
+    Classifications defined at the top level of the ontology become label-level rows
+    of the annotation's data row, sent only if its object row is. `row_annotations`
+    maps their uuids back to the annotation id, for matching Labelbox's errors (object
+    rows use the annotation id as uuid).
+    """
+    def __init__(self, schemas):
+        """:param schemas: FeatureSchemaMap of the annotations' project."""
+        self.schemas = schemas
+        self.row_annotations = {}
+
+    def convert(self, annotations):
+        """
+        :param annotations: Annotations with `task` and `classifications` loaded.
+        :return: Tuple of (NDJSON rows, {annotation id: error} for annotations that could
+            not be converted).
+        """
+        errors = {}
+        groups = {annotation_type: [] for annotation_type in GEOMETRY_FIELDS}
+        label_rows = {}  # annotation id -> its top-level classification rows
+
+        for annotation in annotations:
+            try:
+                label_rows[str(annotation.id)] = self._label_rows(annotation)
+                # JSON rows are parsed, packed rows are read as views of their buffer
+                coordinates = annotation.coordinates
+                if annotation.annotation_type == 'polygon':
+                    if len(coordinates) < 3:
+                        raise ValueError("A polygon needs at least 3 points")
+                else:
+                    coordinates = coordinates[0]  # the first box / point, as convert_to_python_annotation
+                groups[annotation.annotation_type].append((self._row(annotation), coordinates))
+            except INVALID_DATA_ERRORS as exc:
+                errors[str(annotation.id)] = f"Invalid annotation data: {exc}"
+
+        rows = []
+        for rows_and_coordinates, add_geometry in (
+            (groups['bounding_box'], self._add_boxes),
+            (groups['point'], self._add_points),
+            (groups['polygon'], self._add_polygons),
+        ):
+            if rows_and_coordinates:
+                rows += add_geometry(rows_and_coordinates, errors)
+
+        rows += [label_row for row in rows for label_row in label_rows[row["uuid"]]]
+        return rows, errors
+
+    def _row(self, annotation):
+        """Everything but the geometry; also validates names against the ontology."""
+        return {
+            "uuid": str(annotation.id),
+            "dataRow": {"globalKey": annotation.task.global_key},
+            "schemaId": self.schemas.tool(annotation.name),
+            "classifications": [
+                self.schemas.classification_ndjson(annotation.name, cls.name, cls.classification_type, cls.value)
+                for cls in annotation.classifications.all()
+                if not self.schemas.is_global(annotation.name, cls.name)
+            ],
+        }
+
+    def _label_rows(self, annotation):
+        """Label-level rows for the annotation's top-level classifications."""
+        rows = []
+        for cls in annotation.classifications.all():
+            if self.schemas.is_global(annotation.name, cls.name):
+                # Deterministic, so a re-upload of the annotation addresses the same classification
+                row_uuid = str(uuid.uuid5(annotation.id, cls.name))
+                self.row_annotations[row_uuid] = str(annotation.id)
+                rows.append({
+                    "uuid": row_uuid,
+                    "dataRow": {"globalKey": annotation.task.global_key},
+                    **self.schemas.classification_ndjson(annotation.name, cls.name, cls.classification_type, cls.value),
+                })
+        return rows
+
+    @staticmethod
+    def _keep(rows, valid, errors, message):
+        for row, ok in zip(rows, valid.tolist()):
+            if not ok:
+                errors[row["uuid"]] = f"Invalid annotation data: {message}"
+        return [row for row, ok in zip(rows, valid.tolist()) if ok]
+
+    def _add_boxes(self, items, errors):
+        rows = [row for row, _ in items]
+        boxes = np.stack([box for _, box in items])  # left, top, width, height
+
+        # Canvas boxes may be drawn right-to-left or hang over the top/left image edge
+        x0, y0 = boxes[:, 0], boxes[:, 1]
+        x1, y1 = x0 + boxes[:, 2], y0 + boxes[:, 3]
+        left = np.clip(np.minimum(x0, x1), 0, None)
+        right = np.clip(np.maximum(x0, x1), 0, None)
+        top = np.clip(np.minimum(y0, y1), 0, None)
+        bottom = np.clip(np.maximum(y0, y1), 0, None)
+
+        valid = np.isfinite(boxes).all(axis=1) & (right > left) & (bottom > top)
+        bboxes = np.column_stack([top, left, bottom - top, right - left]).tolist()
+        for row, (box_top, box_left, height, width) in zip(rows, bboxes):
+            row["bbox"] = {"top": box_top, "left": box_left, "height": height, "width": width}
+        return self._keep(rows, valid, errors, "bounding box has no area")
+
+    def _add_points(self, items, errors):
+        rows = [row for row, _ in items]
+        points = np.stack([point for _, point in items])
+
+        valid = np.isfinite(points).all(axis=1)
+        for row, (x, y) in zip(rows, np.clip(points, 0, None).tolist()):
+            row["point"] = {"x": x, "y": y}
+        return self._keep(rows, valid, errors, "point is not finite")
+
+    def _add_polygons(self, items, errors):
+        rows = [row for row, _ in items]
+        lengths = np.array([len(vertices) for _, vertices in items])
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        vertices = np.clip(np.concatenate([vertices for _, vertices in items]), 0, None)
+
+        # Shoelace area of every polygon at once: each vertex's successor wraps to its polygon's start
+        successor = np.arange(1, len(vertices) + 1)
+        successor[starts + lengths - 1] = starts
+        x, y = vertices[:, 0], vertices[:, 1]
+        cross = x * y[successor] - x[successor] * y
+        with np.errstate(invalid='ignore'):
+            area = 0.5 * np.abs(np.add.reduceat(cross, starts))
+
+        valid = np.isfinite(area) & (area > 0)
+        for row, polygon in zip(rows, np.split(vertices, starts[1:])):
+            points = polygon.tolist()
+            if points[0] != points[-1]:
+                points.append(points[0])  # closed, like lb_types.Polygon serializes
+            row["polygon"] = [{"x": px, "y": py} for px, py in points]
+        return self._keep(rows, valid, errors, "polygon is not finite or has no area")
@@ -0,0 +1,279 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from django.core.files import File
+from requests.adapters import HTTPAdapter
+
+from .models import ImageBlob, ImageSource
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadResult:
+    """Outcome of one image request. `path` is a temp file owned by the caller."""
+
+    def __init__(self, url, status, path=None, sha256='', size=0, etag='', last_modified='', error=''):
+        self.url = url
+        self.status = status  # 'DOWNLOADED', 'NOT_MODIFIED' or 'FAILED'
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.error = error
+
+
+class DownloadStats:
+    """Throughput and failure counters for one export run."""
+
+    def __init__(self):
+        self.requested = 0
+        self.downloaded = 0
+        self.not_modified = 0
+        self.failed = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.errors = {}  # url -> last error, capped to keep job results small
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        with self._lock:
+            self.requested += 1
+            self.bytes += result.size
+            if result.status == 'DOWNLOADED':
+                self.downloaded += 1
+            elif result.status == 'NOT_MODIFIED':
+                self.not_modified += 1
+            else:
+                self.failed += 1
+                if len(self.errors) < 20:
+                    self.errors[result.url] = result.error
+
+    def as_dict(self):
+        return {
+            "requested": self.requested,
+            "downloaded": self.downloaded,
+            "not_modified": self.not_modified,
+            "failed": self.failed,
+            "bytes": self.bytes,
+            "seconds": round(self.seconds, 3),
+            "images_per_second": round(self.requested / self.seconds, 2) if self.seconds else None,
+            "megabytes_per_second": round(self.bytes / self.seconds / 1e6, 2) if self.seconds else None,
+            "errors": self.errors,
+        }
+
+
+class ImageDownloader:
+    """
+    Downloads many images concurrently over one pooled requests.Session.
+
+    A bounded thread pool does the HTTP work, a semaphore per host caps how many
+    requests hit the same server at once, and bodies are streamed to temp files in
+    chunks (hashed on the way) instead of being held in memory.
+    """
+
+    def __init__(self, max_workers=None, per_host=None, chunk_size=None, session=None):
+        self.max_workers = max_workers or settings.IMAGE_DOWNLOAD_WORKERS
+        self.per_host = per_host or settings.IMAGE_DOWNLOAD_PER_HOST
+        self.chunk_size = chunk_size or settings.IMAGE_DOWNLOAD_CHUNK_SIZE
+        self.session = session or self._build_session()
+        self.stats = DownloadStats()
+        self._host_slots = defaultdict(lambda: threading.BoundedSemaphore(self.per_host))
+        self._host_slots_lock = threading.Lock()
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def download_many(self, requests_by_url):
+        """
+        :param requests_by_url: Dict of url -> extra request headers (conditional GET validators).
+        :return: Dict of url -> DownloadResult.
+        """
+        if not requests_by_url:
+            return {}
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = dict(zip(
+                requests_by_url,
+                pool.map(lambda item: self._download(*item), requests_by_url.items())
+            ))
+        self.stats.seconds += time.monotonic() - started
+        return results
+
+    def _host_slot(self, url):
+        with self._host_slots_lock:
+            return self._host_slots[urlparse(url).netloc]
+
+    def _download(self, url, headers):
+        try:
+            with self._host_slot(url):
+                result = self._stream_to_file(url, headers)
+        except requests.RequestException as exc:
+            result = DownloadResult(url, 'FAILED', error=str(exc))
+        self.stats.record(result)
+        return result
+
+    def _stream_to_file(self, url, headers):
+        with self.session.get(url, headers=headers, stream=True, timeout=settings.IMAGE_DOWNLOAD_TIMEOUT) as response:
+            if response.status_code == 304:
+                return DownloadResult(url, 'NOT_MODIFIED')
+            if response.status_code != 200:
+                return DownloadResult(url, 'FAILED', error=f"HTTP {response.status_code}")
+
+            digest = hashlib.sha256()
+            size = 0
+            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+                try:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        temp_file.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                except requests.RequestException:
+                    os.unlink(temp_file.name)
+                    raise
+
+            return DownloadResult(
+                url, 'DOWNLOADED',
+                path=temp_file.name,
+                sha256=digest.hexdigest(),
+                size=size,
+                etag=response.headers.get('ETag', ''),
+                last_modified=response.headers.get('Last-Modified', '')
+            )
+
+
+class ImageStore:
+    """
+    Content-addressed storage for exported images.
+
+    Each distinct image is stored once as an ImageBlob named after its SHA-256.
+    URLs fetched before are re-validated with If-None-Match / If-Modified-Since, so an
+    unchanged image costs a 304 instead of a full download, and a URL is requested at
+    most once per ImageStore instance (one export run).
+    """
+
+    def __init__(self, downloader=None):
+        self.downloader = downloader or ImageDownloader()
+        self._fetched = {}
+
+    @property
+    def stats(self):
+        return self.downloader.stats
+
+    def fetch(self, url):
+        """
+        Return the ImageBlob for `url`, downloading it only if it changed.
+
+        :return: ImageBlob, or None if the image could not be downloaded.
+        """
+        return self.fetch_many([url])[url]
+
+    def fetch_many(self, urls):
+        """
+        Fetch several images concurrently.
+
+        :return: Dict of url -> ImageBlob (None for images that could not be downloaded).
+        """
+        missing = [url for url in dict.fromkeys(urls) if url not in self._fetched]
+        if missing:
+            sources = {
+                source.url: source
+                for source in ImageSource.objects.select_related('blob').filter(url__in=missing)
+            }
+            results = self.downloader.download_many({
+                url: self._conditional_headers(sources.get(url)) for url in missing
+            })
+            # Database writes stay on this thread; the pool only does network and disk I/O
+            self._fetched.update(self._save_results(results, sources))
+
+        return {url: self._fetched[url] for url in urls}
+
+    @staticmethod
+    def _conditional_headers(source):
+        headers = {}
+        if source is not None:
+            if source.etag:
+                headers['If-None-Match'] = source.etag
+            if source.last_modified:
+                headers['If-Modified-Since'] = source.last_modified
+        return headers
+
+    def _save_results(self, results, sources):
+        """
+        Store the downloaded files and record every URL's source, with a few bulk
+        queries for the whole batch instead of several per image.
+
+        :return: Dict of url -> ImageBlob (None for failed downloads).
+        """
+        blobs = {}
+        downloaded = []
+        for url, result in results.items():
+            source = sources.get(url)
+            if result.status == 'NOT_MODIFIED' and source is not None:
+                blobs[url] = source.blob
+            elif result.status == 'DOWNLOADED':
+                downloaded.append(result)
+            else:
+                if result.status == 'FAILED':
+                    logger.warning("Image download failed for %s: %s", result.url, result.error)
+                blobs[url] = None
+        if not downloaded:
+            return blobs
+
+        try:
+            by_sha256 = self._store_files(downloaded)
+        finally:
+            for result in downloaded:
+                os.unlink(result.path)
+
+        ImageSource.objects.bulk_create(
+            [
+                ImageSource(
+                    url=result.url, blob=by_sha256[result.sha256], etag=result.etag,
+                    last_modified=result.last_modified
+                )
+                for result in downloaded
+            ],
+            update_conflicts=True,
+            unique_fields=['url'],
+            update_fields=['blob', 'etag', 'last_modified', 'updated_at']
+        )
+        blobs.update((result.url, by_sha256[result.sha256]) for result in downloaded)
+        return blobs
+
+    @staticmethod
+    def _store_files(results):
+        """
+        Store the downloaded files whose content is not stored yet.
+
+        :return: Dict of sha256 -> ImageBlob for every result.
+        """
+        stored = {blob.sha256: blob for blob in ImageBlob.objects.filter(sha256__in={r.sha256 for r in results})}
+        new_blobs = {}
+        for result in results:
+            if result.sha256 in stored or result.sha256 in new_blobs:
+                continue
+            blob = ImageBlob(sha256=result.sha256, size=result.size)
+            extension = os.path.splitext(urlparse(result.url).path)[1].lower()
+            with open(result.path, 'rb') as image:
+                blob.file.save(f"{result.sha256}{extension}", File(image), save=False)
+            new_blobs[result.sha256] = blob
+        if new_blobs:
+            # Another worker may store the same content meanwhile; its row wins, so read them back
+            ImageBlob.objects.bulk_create(new_blobs.values(), ignore_conflicts=True)
+            stored.update((blob.sha256, blob) for blob in ImageBlob.objects.filter(sha256__in=new_blobs))
+        return stored
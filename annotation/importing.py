@@ -0,0 +1,249 @@
+import csv
+import io
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .metrics import labelbox_call, stage
+from .models import AnnotationTask, DataRowIndex, ImageImport
+
+logger = logging.getLogger(__name__)
+
+
+class DataRowImporter:
+    """
+    Imports image URLs into a project in fixed-size chunks.
+
+    For every chunk the AnnotationTask rows are created with one bulk_create and the
+    data rows are sent to Labelbox with `dataset.create_data_rows`. Up to `max_workers`
+    chunk uploads run at once; they are finished in submission order, so everything
+    before the last finished chunk is fully imported. Rows Labelbox rejects get the
+    error message stored on their AnnotationTask.
+    """
+
+    def __init__(self, labelbox_service, chunk_size=None, max_workers=None):
+        self.labelbox_service = labelbox_service
+        self.chunk_size = chunk_size or settings.DATA_ROW_IMPORT_CHUNK_SIZE
+        self.max_workers = max_workers or settings.DATA_ROW_IMPORT_WORKERS
+
+    def run(self, project, rows, on_progress=None):
+        """
+        :param project: The AnnotationProject receiving the images.
+        :param rows: Any iterable of image URLs, or of {"row_data", "global_key"} dicts when
+            the caller chooses the global keys. It is consumed one chunk at a time.
+        :param on_progress: Called with the summary after each finished chunk.
+        :return: Dict with counts of rows read, rows in finished chunks ("done"), data rows
+            created and rows that failed.
+        """
+        dataset = self._get_or_create_dataset(project)
+        summary = {"rows": 0, "done": 0, "created": 0, "failed": 0}
+        rows = iter(rows)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            in_flight = deque()
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+
+                with stage('import.create_tasks'):
+                    uploads = self._create_tasks(project, chunk)
+                in_flight.append((len(chunk), pool.submit(self._upload_chunk, project, dataset, uploads)))
+                summary["rows"] += len(chunk)
+
+                # Bounded parallelism: wait for the oldest chunk before reading more input
+                while len(in_flight) >= self.max_workers:
+                    self._finish_chunk(project, dataset, in_flight.popleft(), summary, on_progress)
+
+            while in_flight:
+                self._finish_chunk(project, dataset, in_flight.popleft(), summary, on_progress)
+
+        # Provisioning batches the dataset once; rows imported into a ready project need
+        # batching too. Also run when nothing was read, so a resumed import that failed
+        # here still gets its rows batched.
+        if project.provisioning_status == 'READY':
+            with stage('import.create_batches'):
+                self.labelbox_service.add_dataset_to_project(project)
+
+        return summary
+
+    def _get_or_create_dataset(self, project):
+        client = self.labelbox_service.client
+        if project.lb_dataset_uid:
+            with labelbox_call('get_dataset'):
+                return client.get_dataset(project.lb_dataset_uid)
+
+        with labelbox_call('create_dataset'):
+            dataset = client.create_dataset(name=f"{project.name}-dataset")
+        project.lb_dataset_uid = dataset.uid
+        project.save(update_fields=['lb_dataset_uid', 'updated_at'])
+        return dataset
+
+    def _create_tasks(self, project, rows):
+        uploads = [
+            row if isinstance(row, dict) else {"row_data": row, "global_key": f"TEST-ID-{uuid.uuid1()}"}
+            for row in rows
+        ]
+        # Caller-chosen keys may already exist when an interrupted import is resumed
+        AnnotationTask.objects.bulk_create([
+            AnnotationTask(project=project, global_key=upload["global_key"], image_url=upload["row_data"])
+            for upload in uploads
+        ], ignore_conflicts=True)
+
+        uploaded = set(DataRowIndex.objects.filter(
+            global_key__in=[upload["global_key"] for upload in uploads]
+        ).values_list('global_key', flat=True))
+        return [upload for upload in uploads if upload["global_key"] not in uploaded]
+
+    def _upload_chunk(self, project, dataset, uploads):
+        """Runs in a pool thread: Labelbox calls only, no database access."""
+        if not uploads:
+            return uploads, [], {}
+
+        with labelbox_call('create_data_rows'):
+            task = dataset.create_data_rows(uploads)
+            task.wait_till_done()
+
+        if task.status == "FAILED":
+            message = str(task.errors or "Data row import task failed")
+            return uploads, [], {upload["global_key"]: message for upload in uploads}
+
+        failures = {}
+        for error in task.failed_data_rows or []:
+            for failed_row in error.get("failedDataRows", []):
+                failures[failed_row.get("globalKey")] = error.get("message", "")
+        return uploads, task.result or [], failures
+
+    def _finish_chunk(self, project, dataset, in_flight_chunk, summary, on_progress):
+        chunk_rows, future = in_flight_chunk
+        uploads, created, failures = future.result()
+
+        self.labelbox_service._upsert_data_row_index([
+            DataRowIndex(
+                global_key=row["global_key"],
+                data_row_id=row["id"],
+                dataset_id=dataset.uid,
+                project_lb_uid=project.lb_uid or ''
+            )
+            for row in created if row.get("global_key")
+        ])
+
+        # A row rejected by an earlier run that imports now can be annotated again
+        AnnotationTask.objects.filter(
+            project=project, global_key__in=[row["global_key"] for row in created if row.get("global_key")]
+        ).exclude(import_error='').update(import_error='')
+
+        if failures:
+            logger.warning("%s of %s data rows failed to import into %s", len(failures), len(uploads), dataset.uid)
+            failed_tasks = list(AnnotationTask.objects.filter(project=project, global_key__in=list(failures)))
+            for task in failed_tasks:
+                task.import_error = failures[task.global_key] or "Data row import failed"
+            AnnotationTask.objects.bulk_update(failed_tasks, ['import_error'])
+
+        summary["done"] += chunk_rows
+        summary["created"] += len(created)
+        summary["failed"] += len(failures)
+        if on_progress is not None:
+            on_progress(summary)
+
+
+def manifest_format(file_name):
+    """Guess the manifest format from its file name."""
+    if file_name.lower().endswith(('.ndjson', '.jsonl', '.json')):
+        return 'NDJSON'
+    return 'CSV'
+
+
+class ManifestImporter:
+    """
+    Streams a CSV or NDJSON manifest of image URLs through DataRowImporter.
+
+    The manifest is read row by row, so memory stays constant whatever its size.
+    After every finished chunk `ImageImport.rows_done` is saved; running the same
+    ImageImport again skips that many rows and carries on. Rows without a
+    `global_key` column get one derived from the import id and row number, so rows
+    re-read after an interruption are recognised instead of imported twice.
+    """
+    URL_FIELDS = ('image_url', 'row_data', 'url')
+
+    def __init__(self, labelbox_service, chunk_size=None, max_workers=None, on_progress=None):
+        self.data_row_importer = DataRowImporter(labelbox_service, chunk_size, max_workers)
+        self.on_progress = on_progress
+
+    def run(self, image_import):
+        """
+        Import (or resume importing) a manifest.
+
+        :param image_import: The ImageImport to process.
+        :return: The updated ImageImport.
+        """
+        image_import = self._start(image_import)
+        if image_import.status == 'COMPLETED':
+            return image_import
+
+        start_row = image_import.rows_done
+        created_before = image_import.rows_created
+        failed_before = image_import.rows_failed
+        started = time.monotonic()
+
+        def checkpoint(summary):
+            image_import.rows_done = start_row + summary["done"]
+            image_import.rows_created = created_before + summary["created"]
+            image_import.rows_failed = failed_before + summary["failed"]
+            image_import.save(update_fields=['rows_done', 'rows_created', 'rows_failed', 'updated_at'])
+            if self.on_progress is not None:
+                elapsed = time.monotonic() - started
+                self.on_progress(image_import, summary["done"] / elapsed if elapsed else 0.0)
+
+        try:
+            with image_import.open_manifest() as manifest:
+                rows = islice(self._read_rows(image_import, manifest), start_row, None)
+                self.data_row_importer.run(image_import.project, rows, on_progress=checkpoint)
+        except Exception as exc:
+            image_import.status = 'FAILED'
+            image_import.error = str(exc)
+            image_import.save(update_fields=['status', 'error', 'updated_at'])
+            raise
+
+        image_import.status = 'COMPLETED'
+        image_import.error = ''
+        image_import.finished_at = timezone.now()
+        image_import.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        return image_import
+
+    def _start(self, image_import):
+        # Checkpoints refresh updated_at, so a RUNNING import that stopped moving is abandoned
+        stale_before = timezone.now() - timedelta(seconds=settings.SYNC_JOB_LEASE_SECONDS)
+        with transaction.atomic():
+            image_import = ImageImport.objects.select_for_update().select_related('project').get(pk=image_import.pk)
+            if image_import.status == 'RUNNING' and image_import.updated_at > stale_before:
+                raise RuntimeError(f"Import {image_import.id} is already running")
+            if image_import.status != 'COMPLETED':
+                image_import.status = 'RUNNING'
+                image_import.save(update_fields=['status', 'updated_at'])
+        return image_import
+
+    def _read_rows(self, image_import, manifest):
+        text = io.TextIOWrapper(manifest, encoding='utf-8-sig', newline='')
+        if image_import.file_format == 'NDJSON':
+            records = (json.loads(line) for line in text if line.strip())
+        else:
+            records = csv.DictReader(text)
+
+        for row_number, record in enumerate(records, start=1):
+            image_url = next((record[field] for field in self.URL_FIELDS if record.get(field)), None)
+            if not image_url:
+                raise ValueError(f"Manifest row {row_number} has no {' / '.join(self.URL_FIELDS)} value")
+            yield {
+                "row_data": image_url.strip(),
+                "global_key": record.get("global_key") or f"{image_import.id}-{row_number}"
+            }
@@ -0,0 +1,218 @@
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .importing import ManifestImporter
+from .metrics import QueryCounter, collect_timings, stage
+from .models import Annotation, AnnotationProject, ImageImport, SyncJob
+from .provisioning import ProjectProvisioner
+from .services import ExportService, LabelboxService
+from .uploads import AnnotationUploadBatcher
+
+logger = logging.getLogger(__name__)
+# Structured per-job timing lines, next to the per-request ones
+timing_logger = logging.getLogger('annotation.metrics')
+
+# job_type -> callable(payload) returning a JSON-serialisable result
+JOB_HANDLERS = {}
+
+
+class RescheduleJob(Exception):
+    """
+    Raised by a handler that cannot make progress yet (e.g. another worker holds its
+    rows). The job runs again after `delay` seconds without using up an attempt.
+    """
+
+    def __init__(self, message, delay=None):
+        super().__init__(message)
+        self.delay = settings.SYNC_JOB_RETRY_BACKOFF if delay is None else delay
+
+
+class JobFailed(Exception):
+    """Raised by a handler when retrying cannot help: the job fails at once, keeping `result`."""
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
+
+def job_handler(job_type):
+    """Register a function as the handler for a SyncJob type."""
+    def register(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return register
+
+
+def enqueue(job_type, payload, dedupe_key='', run_after=None):
+    """
+    Queue a background job. Call inside the caller's transaction so the job only
+    becomes visible to workers once the data it refers to is committed.
+
+    :param job_type: One of SyncJob.JOB_TYPES.
+    :param payload: JSON-serialisable arguments for the handler.
+    :param dedupe_key: If set, an already queued job with the same key is reused
+        instead of creating a new one (e.g. one pending export per project).
+    :param run_after: Earliest time the job may run. Defaults to now.
+    :return: The SyncJob instance.
+    """
+    if dedupe_key:
+        existing = SyncJob.objects.filter(dedupe_key=dedupe_key, status='QUEUED').first()
+        if existing is not None:
+            return existing
+
+    return SyncJob.objects.create(
+        job_type=job_type,
+        payload=payload,
+        dedupe_key=dedupe_key,
+        max_attempts=settings.SYNC_JOB_MAX_ATTEMPTS,
+        run_after=run_after or timezone.now(),
+    )
+
+
+def claim_next_job(job_types=None):
+    """
+    Atomically claim the next due job. Uses SELECT ... FOR UPDATE SKIP LOCKED so that
+    any number of workers can poll the table without blocking each other. RUNNING jobs
+    whose lease expired (worker crashed) are picked up again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = SyncJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status='QUEUED', run_after__lte=now) | Q(status='RUNNING', locked_until__lt=now)
+        )
+        if job_types:
+            queryset = queryset.filter(job_type__in=job_types)
+        job = queryset.order_by('run_after').first()
+        if job is None:
+            return None
+
+        job.status = 'RUNNING'
+        job.attempts += 1
+        job.locked_until = now + timedelta(seconds=settings.SYNC_JOB_LEASE_SECONDS)
+        job.save(update_fields=['status', 'attempts', 'locked_until', 'updated_at'])
+        return job
+
+
+def run_job(job):
+    """Execute a claimed job and record the outcome."""
+    handler = JOB_HANDLERS.get(job.job_type)
+    if handler is None:
+        job.max_attempts = job.attempts
+        job.mark_failed(f"No handler registered for job type {job.job_type}", 0)
+        return job
+
+    queries = QueryCounter()
+    started = time.perf_counter()
+    with collect_timings() as timings, connection.execute_wrapper(queries):
+        try:
+            with stage(f'job.{job.job_type.lower()}'):
+                result = handler(job.payload)
+        except RescheduleJob as exc:
+            logger.info("Sync job %s (%s) rescheduled: %s", job.id, job.job_type, exc)
+            job.mark_rescheduled(exc, exc.delay)
+        except JobFailed as exc:
+            logger.error("Sync job %s (%s) failed: %s", job.id, job.job_type, exc)
+            job.max_attempts = job.attempts
+            job.mark_failed(exc, 0, exc.result)
+        except Exception as exc:
+            logger.exception("Sync job %s (%s) failed on attempt %s", job.id, job.job_type, job.attempts)
+            job.mark_failed(exc, settings.SYNC_JOB_RETRY_BACKOFF)
+        else:
+            job.mark_succeeded(result)
+
+    timing_logger.info(json.dumps({
+        "event": "job",
+        "job_id": str(job.id),
+        "job_type": job.job_type,
+        "status": job.status,
+        "attempt": job.attempts,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        "db_queries": queries.count,
+        "db_ms": round(queries.seconds * 1000, 2),
+        **timings,
+    }))
+    return job
+
+
+def flush_uploads(annotation_ids=None, batcher=None):
+    """Upload one MAL batch and queue an export for every project that received labels."""
+    summary = (batcher or AnnotationUploadBatcher()).flush(annotation_ids)
+    for project_id in summary['projects']:
+        enqueue('EXPORT_PROJECT', {'project_id': project_id}, dedupe_key=f"export:{project_id}")
+    return summary
+
+
+def flush_due_uploads():
+    """Flush a batch if enough annotations are pending or the oldest has waited long enough."""
+    batcher = AnnotationUploadBatcher()
+    if batcher.should_flush():
+        return flush_uploads(batcher=batcher)
+    return None
+
+
+@job_handler('UPLOAD_ANNOTATIONS')
+def upload_annotations(payload):
+    """
+    Make sure the given annotations reach Labelbox. They are uploaded as part of a
+    shared batch; if another flush already picked them up there is nothing left to do.
+
+    The job fails if Labelbox rejected any of them (listed in its result), uses up a
+    retry if the import itself failed, and is rescheduled without using one while
+    another worker is still uploading them.
+    """
+    annotation_ids = payload['annotation_ids']
+    flush_uploads(annotation_ids)
+
+    rows = list(Annotation.objects.filter(id__in=annotation_ids).values_list('id', 'sync_status', 'sync_error'))
+    statuses = {str(annotation_id): sync_status for annotation_id, sync_status, _ in rows}
+    result = {"annotations": statuses}
+
+    # Put back by _retry_later after a failed import: a real failure of this attempt
+    retry = [annotation_id for annotation_id, sync_status, error in rows if sync_status == 'PENDING' and error]
+    if retry:
+        raise RuntimeError(f"{len(retry)} annotation(s) not uploaded to Labelbox yet, will retry")
+
+    # SYNCING in another worker's batch, or edited while this batch was uploading
+    waiting = [annotation_id for annotation_id, status in statuses.items() if status in ('PENDING', 'SYNCING')]
+    if waiting:
+        raise RescheduleJob(f"{len(waiting)} annotation(s) are being uploaded by another batch")
+
+    failed = {str(annotation_id): error for annotation_id, sync_status, error in rows if sync_status == 'FAILED'}
+    if failed:
+        raise JobFailed(f"Labelbox rejected {len(failed)} annotation(s)", {**result, "failed": failed})
+
+    return result
+
+
+@job_handler('EXPORT_PROJECT')
+def export_project(payload):
+    export_service = ExportService()
+    return export_service.export_annotations(payload['project_id'])
+
+
+@job_handler('IMPORT_IMAGES')
+def import_images(payload):
+    """Import (or resume) an uploaded image manifest."""
+    image_import = ImageImport.objects.get(id=payload['import_id'])
+    image_import = ManifestImporter(LabelboxService()).run(image_import)
+    return image_import.as_dict()
+
+
+@job_handler('PROVISION_PROJECT')
+def provision_project(payload):
+    """
+    Run one provisioning step and queue the next one, so every step is retried
+    (with backoff) on its own.
+    """
+    project = AnnotationProject.objects.get(id=payload['project_id'])
+    status = ProjectProvisioner().advance(project)
+    if status != 'READY':
+        enqueue('PROVISION_PROJECT', payload, dedupe_key=f"provision:{project.id}")
+    return {"provisioning_status": status}
@@ -0,0 +1,84 @@
+import time
+from collections import defaultdict
+
+import labelbox.types as lb_types
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from labelbox.data.serialization import NDJsonConverter
+
+from annotation.geometry import NDJsonAnnotationConverter
+from annotation.models import Annotation, AnnotationProject, AnnotationTask, OntologyTemplate
+from annotation.ontology import FeatureSchemaMap
+from annotation.services import LabelboxService
+
+
+class Command(BaseCommand):
+    help = ("Compare converting annotations with pydantic Label objects against the vectorized "
+            "NDJSON path. Synthetic rows are created in a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--annotations', type=int, default=200, help="Annotations per geometry type.")
+        parser.add_argument('--vertices', type=int, default=1000, help="Vertices per polygon.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per path; the best time is reported.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            annotations, schemas = self._create_annotations(options['annotations'], options['vertices'])
+            service = LabelboxService(client=object())  # conversion only, never talks to Labelbox
+
+            def pydantic_path():
+                labels = defaultdict(list)
+                for annotation in annotations:
+                    labels[annotation.task.global_key].append(service.convert_to_python_annotation(annotation, schemas))
+                return list(NDJsonConverter.serialize(
+                    [lb_types.Label(data={"global_key": key}, annotations=objs) for key, objs in labels.items()]
+                ))
+
+            def vectorized_path():
+                return NDJsonAnnotationConverter(schemas).convert(annotations)[0]
+
+            results = {}
+            for name, convert in (('pydantic', pydantic_path), ('vectorized', vectorized_path)):
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    rows = convert()
+                    timings.append(time.perf_counter() - started)
+                results[name] = min(timings)
+                self.stdout.write(f"{name:>10}: {len(rows)} rows in {results[name]:.3f}s")
+
+            self.stdout.write(f"   speedup: {results['pydantic'] / results['vectorized']:.1f}x")
+            transaction.set_rollback(True)
+
+    def _create_annotations(self, count, vertices):
+        cuid = lambda name: f"c{name}".ljust(25, '0')  # noqa: E731 - fake 25 character ids
+        feature_schema_ids = {
+            "tools": {
+                tool: {"schema_id": cuid(tool[:10]), "classifications": {}}
+                for tool in ('bounding_box', 'polygon', 'point')
+            },
+            "classifications": {},
+        }
+        template = OntologyTemplate.objects.create(
+            name="benchmark", content_hash=cuid("benchmark"), ontology={}, feature_schema_ids=feature_schema_ids
+        )
+        project = AnnotationProject.objects.create(name="benchmark", ontology_template=template)
+        task = AnnotationTask.objects.create(
+            project=project, global_key=f"benchmark-{project.id}", image_url="https://example.com/benchmark.jpg"
+        )
+
+        angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+        polygon = [{"x": x, "y": y} for x, y in zip((500 + 400 * np.cos(angles)).tolist(),
+                                                     (500 + 400 * np.sin(angles)).tolist())]
+        Annotation.objects.bulk_create(
+            [Annotation(task=task, name='bounding_box', annotation_type='bounding_box',
+                        data=[{"left": i, "top": i, "width": 50, "height": 40}]) for i in range(count)]
+            + [Annotation(task=task, name='point', annotation_type='point', data=[{"x": i, "y": i}])
+               for i in range(count)]
+            + [Annotation(task=task, name='polygon', annotation_type='polygon', data=polygon) for _ in range(count)]
+        )
+        annotations = list(
+            Annotation.objects.filter(task=task).select_related('task').prefetch_related('classifications')
+        )
+        return annotations, FeatureSchemaMap(feature_schema_ids)
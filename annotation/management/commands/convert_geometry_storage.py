@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from annotation.geometry import repack_annotations
+from annotation.management.utils import get_project
+from annotation.models import Annotation
+
+
+class Command(BaseCommand):
+    help = "Switch a project's annotation coordinate storage between JSON and packed float32, converting existing rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', help="AnnotationProject id or name.")
+        parser.add_argument('storage', choices=['JSON', 'PACKED'])
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        project = get_project(options['project'])
+
+        with transaction.atomic():
+            project.geometry_storage = options['storage']
+            project.save(update_fields=['geometry_storage', 'updated_at'])
+            converted = repack_annotations(
+                Annotation.objects.filter(task__project=project),
+                packed=options['storage'] == 'PACKED',
+                batch_size=options['batch_size']
+            )
+        self.stdout.write(f"Converted {converted} annotations of {project.name} to {options['storage']}")
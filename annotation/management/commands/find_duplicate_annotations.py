@@ -0,0 +1,32 @@
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+
+from annotation.management.utils import get_project
+from annotation.models import Annotation
+from annotation.spatial import TaskSpatialIndex
+
+
+class Command(BaseCommand):
+    help = ("List overlapping (likely duplicate) annotations on the same task. Each task is checked "
+            "with one STRtree query instead of comparing every pair of annotations.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', help="Only check this AnnotationProject (id or name).")
+        parser.add_argument('--min-iou', type=float, default=0.8,
+                            help="Report pairs whose intersection over union is at least this.")
+
+    def handle(self, *args, **options):
+        annotations = Annotation.objects.exclude(annotation_type='point')
+        if options['project']:
+            annotations = annotations.filter(task__project=get_project(options['project']))
+
+        tasks = pairs = 0
+        ordered = annotations.order_by('task_id').only('id', 'task_id', 'name', 'annotation_type', 'data', 'geometry')
+        for task_id, task_annotations in groupby(ordered.iterator(chunk_size=2000), key=lambda a: a.task_id):
+            tasks += 1
+            for first, second, score in TaskSpatialIndex(task_annotations).overlapping_pairs(options['min_iou']):
+                pairs += 1
+                self.stdout.write(f"{task_id}\t{first.id}\t{second.id}\t{first.name}/{second.name}\t{score:.3f}")
+
+        self.stdout.write(f"{pairs} overlapping pairs in {tasks} tasks (IoU >= {options['min_iou']})")
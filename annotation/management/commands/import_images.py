@@ -0,0 +1,61 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from annotation.importing import ManifestImporter, manifest_format
+from annotation.management.utils import get_project
+from annotation.models import ImageImport
+from annotation.services import LabelboxService
+
+
+class Command(BaseCommand):
+    help = ("Import image URLs from a CSV (image_url[,global_key] header) or NDJSON manifest into a project. "
+            "Re-running the same command resumes an interrupted import.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', help="Project id or name.")
+        parser.add_argument('file', help="Path to the .csv or .ndjson manifest.")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help="Defaults to the file extension.")
+        parser.add_argument('--restart', action='store_true',
+                            help="Start from the first row instead of resuming an unfinished import.")
+        parser.add_argument('--chunk-size', type=int, help="Rows per Labelbox upload.")
+        parser.add_argument('--workers', type=int, help="Chunk uploads in flight.")
+
+    def handle(self, *args, **options):
+        project = get_project(options['project'])
+        source_path = os.path.abspath(options['file'])
+        if not os.path.isfile(source_path):
+            raise CommandError(f"No such file: {source_path}")
+
+        image_import = None
+        if not options['restart']:
+            image_import = ImageImport.objects.filter(
+                project=project, source_path=source_path
+            ).exclude(status='COMPLETED').order_by('-created_at').first()
+
+        if image_import is not None:
+            self.stdout.write(f"Resuming import {image_import.id} after row {image_import.rows_done}")
+        else:
+            image_import = ImageImport.objects.create(
+                project=project,
+                source_path=source_path,
+                file_format=(options['format'] or manifest_format(source_path)).upper()
+            )
+            self.stdout.write(f"Started import {image_import.id}")
+
+        importer = ManifestImporter(
+            LabelboxService(),
+            chunk_size=options['chunk_size'],
+            max_workers=options['workers'],
+            on_progress=self._report
+        )
+        image_import = importer.run(image_import)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {image_import.rows_done} rows: {image_import.rows_created} data rows created, "
+            f"{image_import.rows_failed} failed"
+        ))
+
+    def _report(self, image_import, rows_per_second):
+        self.stdout.write(
+            f"{image_import.rows_done} rows done, {image_import.rows_failed} failed ({rows_per_second:.1f} rows/s)"
+        )
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ("Send concurrent HTTP requests to a running server and print latency percentiles and "
+            "throughput as JSON, e.g. to compare the WSGI and ASGI deployments on the same endpoint.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help="Full URL, e.g. http://127.0.0.1:8000/jobs/<id>/?wait=5")
+        parser.add_argument('--concurrency', type=int, default=100, help="Open connections sending requests.")
+        parser.add_argument('--requests', type=int, default=1000, help="Total requests to send.")
+        parser.add_argument('--method', default='GET')
+        parser.add_argument('--data', default='', help="JSON request body.")
+        parser.add_argument('--timeout', type=float, default=60.0, help="Seconds before a request counts as failed.")
+        parser.add_argument('--label', default='', help="Name of the deployment under test, copied to the output.")
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError("Only plain http:// URLs are supported")
+
+        report = asyncio.run(self._run(url, options))
+        self.stdout.write(json.dumps(report, indent=2))
+
+    async def _run(self, url, options):
+        body = options['data'].encode()
+        path = url.path + (f"?{url.query}" if url.query else '')
+        request = (
+            f"{options['method'].upper()} {path} HTTP/1.1\r\n"
+            f"Host: {url.netloc}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"\r\n"
+        ).encode() + body
+
+        remaining = [options['requests']]
+        latencies = []
+        statuses = Counter()
+        errors = Counter()
+
+        async def connection_worker():
+            reader = writer = None
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                started = time.perf_counter()
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+                    writer.write(request)
+                    status, keep_alive = await asyncio.wait_for(self._read_response(reader), options['timeout'])
+                except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as exc:
+                    errors[type(exc).__name__] += 1
+                    keep_alive = False
+                else:
+                    latencies.append(time.perf_counter() - started)
+                    statuses[status] += 1
+                if not keep_alive and writer is not None:
+                    writer.close()
+                    reader = writer = None
+            if writer is not None:
+                writer.close()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connection_worker() for _ in range(min(options['concurrency'], options['requests']))))
+        seconds = time.perf_counter() - started
+
+        latencies.sort()
+        percentile = lambda p: round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 2)  # noqa: E731
+        return {
+            "label": options['label'],
+            "url": options['url'],
+            "concurrency": options['concurrency'],
+            "requests": options['requests'],
+            "seconds": round(seconds, 3),
+            "requests_per_second": round(len(latencies) / seconds, 1) if seconds else None,
+            "statuses": {str(status): count for status, count in sorted(statuses.items())},
+            "errors": dict(errors),
+            "latency_ms": {
+                "p50": percentile(0.5),
+                "p90": percentile(0.9),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1] * 1000, 2),
+            } if latencies else None,
+        }
+
+    @staticmethod
+    async def _read_response(reader):
+        """Read one HTTP/1.1 response. :return: Tuple of (status code, connection can be reused)."""
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode('latin-1').split("\r\n")
+        status = int(lines[0].split(" ")[1])
+        headers = {
+            name.strip().lower(): value.strip()
+            for name, _, value in (line.partition(":") for line in lines[1:] if line)
+        }
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif 'content-length' in headers:
+            await reader.readexactly(int(headers['content-length']))
+        else:
+            await reader.read()  # body runs until the server closes the connection
+            return status, False
+
+        return status, headers.get('connection', '').lower() != 'close'
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from annotation.services import LabelboxService
+
+
+class Command(BaseCommand):
+    help = "Copy Labelbox data rows created since the last run into the local global-key index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', action='append', dest='dataset_ids',
+                            help="Only refresh this Labelbox dataset id (may be repeated).")
+
+    def handle(self, *args, **options):
+        indexed = LabelboxService().refresh_data_row_index(options['dataset_ids'])
+        self.stdout.write(f"Indexed {indexed} data rows")
@@ -0,0 +1,234 @@
+import csv
+import io
+import json
+import platform
+import tempfile
+import time
+import uuid
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from lbox.exceptions import LabelboxError
+
+from annotation.clients import reset_clients, set_client
+from annotation.fake_labelbox import FakeImageSession, FakeLabelboxClient, FakeMALPredictionImport
+from annotation.images import ImageDownloader, ImageStore
+from annotation.importing import ManifestImporter
+from annotation.jobs import flush_uploads
+from annotation.models import AnnotationProject, AnnotationTask, ImageImport
+from annotation.provisioning import ProjectProvisioner
+from annotation.services import ExportService, LabelboxService
+
+
+class Command(BaseCommand):
+    help = ("Time provisioning, data row import, annotation submit/upload and export against an "
+            "in-process fake Labelbox and print the results as JSON. Everything runs in a "
+            "transaction that is rolled back, with media written to a temporary directory.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every fake API call.")
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help="Share of fake API calls that fail with a Labelbox error.")
+        parser.add_argument('--attempts', type=int, default=5,
+                            help="Tries per step when injected errors are on, as the sync worker retries jobs.")
+        parser.add_argument('--provision-rows', type=int, default=100, help="Manifest rows of the provisioned project.")
+        parser.add_argument('--import-rows', type=int, default=10000, help="Image URLs in the import benchmark.")
+        parser.add_argument('--submit', type=int, default=200, help="Annotations posted in the submit benchmark.")
+        parser.add_argument('--export-rows', default='1000,10000,100000',
+                            help="Comma separated data row counts for the export benchmarks.")
+        parser.add_argument('--output', help="Also write the JSON results to this file.")
+
+    def handle(self, *args, **options):
+        fake = FakeLabelboxClient(latency=options['latency'], error_rate=options['error_rate'], seed=0)
+        self.attempts = options['attempts']
+        self.retries = 0
+        report = {
+            "started_at": timezone.now().isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+            },
+            "options": {
+                "latency": options['latency'],
+                "error_rate": options['error_rate'],
+            },
+            "results": {},
+        }
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root, ALLOWED_HOSTS=['testserver']), \
+                mock.patch('labelbox.MALPredictionImport', FakeMALPredictionImport):
+            set_client(fake)
+            try:
+                with transaction.atomic():
+                    self._run(fake, options, report["results"])
+                    transaction.set_rollback(True)
+            finally:
+                reset_clients()
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + "\n")
+
+    def _run(self, fake, options, results):
+        project = self._measure(results, "provision", options['provision_rows'], self._provision,
+                                options['provision_rows'])
+        if project is not None:
+            self._measure(results, "import", options['import_rows'], self._import, project, options['import_rows'])
+            self._measure(results, "submit", options['submit'], self._submit, project, options['submit'])
+            self._measure(results, "submit_bulk", options['submit'], self._submit_bulk, project, options['submit'])
+            self._measure(results, "upload", options['submit'] * 2, self._upload)
+
+        for rows in [int(value) for value in options['export_rows'].split(',') if value.strip()]:
+            lb_project = self._labeled_project(fake, rows)
+            self._measure(results, f"export_{rows}", rows, self._export, lb_project)
+
+    def _measure(self, results, name, rows, func, *args):
+        """Run one benchmark, recording wall time, throughput and database queries."""
+        self.stderr.write(f"Running {name} ({rows} rows)...")
+        result = {"rows": rows}
+        self.retries = 0
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            try:
+                # A savepoint, so an injected failure leaves the outer transaction usable
+                with transaction.atomic():
+                    value = func(*args)
+            except Exception as exc:
+                value = None
+                result["error"] = f"{type(exc).__name__}: {exc}"
+            seconds = time.perf_counter() - started
+
+        result.update({
+            "seconds": round(seconds, 4),
+            "rows_per_second": round(rows / seconds, 1) if seconds else None,
+            "queries": len(queries),
+            "retries": self.retries,
+        })
+        results[name] = result
+        return value
+
+    def _retry(self, func, *args):
+        """Call `func` again after a Labelbox error, like a failed SyncJob is run again."""
+        for attempt in range(1, self.attempts + 1):
+            try:
+                return func(*args)
+            except LabelboxError:
+                if attempt >= self.attempts:
+                    raise
+                self.retries += 1
+
+    def _image_import(self, project, name, rows):
+        manifest = io.StringIO()
+        csv.writer(manifest).writerows(
+            [["image_url"]] + [[f"https://images.example.com/{name}/{i}.jpg"] for i in range(rows)]
+        )
+        return ImageImport.objects.create(
+            project=project, manifest=ContentFile(manifest.getvalue(), name=f"{name}.csv"), file_format='CSV'
+        )
+
+    def _provision(self, rows):
+        project = AnnotationProject.objects.create(name=f"benchmark-{uuid.uuid4().hex[:8]}")
+        self._image_import(project, "provision", rows)
+
+        # Every step is retried on its own, as the PROVISION_PROJECT job does
+        provisioner = ProjectProvisioner(LabelboxService())
+        while self._retry(provisioner.advance, project) != 'READY':
+            pass
+        return project
+
+    def _import(self, project, rows):
+        # Through the manifest importer, so a retried import resumes from its checkpoint
+        image_import = self._image_import(project, "import", rows)
+        return self._retry(ManifestImporter(LabelboxService()).run, image_import).as_dict()
+
+    @staticmethod
+    def _submit_tasks(project, count):
+        # A task can only be annotated once, so every annotation gets its own task
+        return AnnotationTask.objects.bulk_create([
+            AnnotationTask(project=project, global_key=f"benchmark-submit-{uuid.uuid4()}",
+                           image_url=f"https://images.example.com/submit/{i}.jpg")
+            for i in range(count)
+        ])
+
+    @staticmethod
+    def _box_payload(i):
+        return {
+            "annotation_type": "bounding_box",
+            "annotations": {"name": "bounding_box",
+                            "data": [{"left": i % 500, "top": i % 300, "width": 40, "height": 30}]},
+            "classification": [],
+        }
+
+    @staticmethod
+    def _post(client, url, payload):
+        response = client.post(url, data=json.dumps(payload), content_type='application/json')
+        if response.status_code != 202:
+            raise RuntimeError(f"Annotation submit returned {response.status_code}: {response.content[:200]}")
+
+    def _submit(self, project, count):
+        client = Client()
+        for i, task in enumerate(self._submit_tasks(project, count)):
+            self._post(client, reverse('task-annotate', kwargs={'task_id': task.id}), self._box_payload(i))
+
+    def _submit_bulk(self, project, count):
+        # The same annotations as `submit`, sent through the bulk endpoint in requests of one MAL batch
+        client = Client()
+        items = [
+            {"task_id": str(task.id), **self._box_payload(i)}
+            for i, task in enumerate(self._submit_tasks(project, count))
+        ]
+        for start in range(0, len(items), settings.MAL_BATCH_MAX_SIZE):
+            self._post(client, reverse('annotation_bulk'),
+                       {"annotations": items[start:start + settings.MAL_BATCH_MAX_SIZE]})
+
+    def _upload(self):
+        # Annotations put back after a failed import are picked up by the next flush
+        summary = flush_uploads()
+        for _ in range(self.attempts - 1):
+            if not summary["retry"]:
+                break
+            self.retries += 1
+            summary = flush_uploads(summary["retry"])
+        return summary
+
+    def _labeled_project(self, fake, rows):
+        """A fake Labelbox project with `rows` data rows carrying one box each (set up untimed)."""
+        error_rate, fake.error_rate = fake.error_rate, 0.0  # setup is not under test
+        try:
+            lb_project = fake.create_project(name=f"benchmark-export-{rows}")
+            dataset = fake.create_dataset(name=f"benchmark-export-{rows}")
+            # A few hundred distinct images, so the run covers both downloads and repeated URLs
+            dataset.create_data_rows([
+                {"row_data": f"https://images.example.com/export/{i % 250}.jpg", "global_key": f"{lb_project.uid}-{i}"}
+                for i in range(rows)
+            ])
+            lb_project.create_batches_from_dataset("benchmark", dataset.uid)
+        finally:
+            fake.error_rate = error_rate
+        for i in range(rows):
+            lb_project.add_label(f"{lb_project.uid}-{i}", {
+                "feature_id": f"{lb_project.uid}-feature-{i}",
+                "name": "bounding_box",
+                "annotation_kind": "ImageBoundingBox",
+                "bounding_box": {"top": i % 300, "left": i % 500, "height": 30, "width": 40},
+            })
+        AnnotationProject.objects.create(name=lb_project.name, lb_uid=lb_project.uid)
+        return lb_project
+
+    def _export(self, lb_project):
+        image_store = ImageStore(ImageDownloader(session=FakeImageSession()))
+        return self._retry(
+            ExportService().export_annotations, lb_project.uid, False, None, image_store
+        )
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from annotation.dispatch import release_expired_leases
+from annotation.metrics import serve_metrics
+from annotation.jobs import claim_next_job, flush_due_uploads, run_job
+
+
+class Command(BaseCommand):
+    help = "Process queued Labelbox sync jobs (uploads, exports) from the SyncJob table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the currently due jobs and exit.")
+        parser.add_argument('--job-type', action='append', dest='job_types',
+                            help="Only process this job type (may be repeated).")
+        parser.add_argument('--metrics-port', type=int,
+                            help="Serve this worker's Prometheus metrics on http://0.0.0.0:<port>/metrics.")
+
+    def handle(self, *args, **options):
+        if options['metrics_port']:
+            serve_metrics(options['metrics_port'])
+        self.stdout.write("Sync worker started")
+        while True:
+            close_old_connections()
+
+            released = release_expired_leases()
+            if released:
+                self.stdout.write(f"Released {released} task(s) with an expired annotator lease")
+
+            # Size/age triggered MAL batch, independent of any single queued job
+            summary = flush_due_uploads()
+            if summary:
+                self.stdout.write(
+                    f"Uploaded batch: {len(summary['synced'])} synced, {len(summary['failed'])} failed, "
+                    f"{len(summary['retry'])} to retry"
+                )
+
+            job = claim_next_job(options['job_types'])
+
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            run_job(job)
+            self.stdout.write(f"{job.job_type} {job.id}: {job.status} (attempt {job.attempts})")
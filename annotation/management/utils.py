@@ -0,0 +1,24 @@
+import uuid
+
+from django.core.management.base import CommandError
+
+from annotation.models import AnnotationProject
+
+
+def get_project(value):
+    """
+    Look up the AnnotationProject a command argument names.
+
+    :param value: Project id or name.
+    :raises CommandError: If no project, or more than one project, matches.
+    """
+    try:
+        return AnnotationProject.objects.get(id=uuid.UUID(value))
+    except (ValueError, AnnotationProject.DoesNotExist):
+        pass
+    try:
+        return AnnotationProject.objects.get(name=value)
+    except AnnotationProject.DoesNotExist:
+        raise CommandError(f"Project {value} does not exist")
+    except AnnotationProject.MultipleObjectsReturned:
+        raise CommandError(f"Several projects are named {value}, use the project id")
@@ -0,0 +1,335 @@
+"""
+Process-local metrics in the Prometheus text format, plus per-request timing.
+
+`labelbox_call` times one Labelbox SDK call and `stage` one step of a service
+(export, upload batch, import chunk, ...); both feed latency histograms labelled by
+operation only, so the number of series does not grow with the number of projects.
+`RequestMetricsMiddleware` counts the ORM queries of each request and logs one
+structured line with where the request spent its time. `/metrics` (and
+`run_sync_worker --metrics-port`) renders every metric of the process to staff users
+and `METRICS_ALLOWED_IPS`.
+"""
+import asyncio
+import bisect
+import ipaddress
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds, from a cached lookup to a long export
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_number(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(float(total))}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+registry = MetricsRegistry()
+
+LABELBOX_CALL_SECONDS = registry.register(Histogram(
+    'labelbox_call_seconds', "Duration of Labelbox SDK calls.", ['operation']
+))
+LABELBOX_CALL_ERRORS = registry.register(Counter(
+    'labelbox_call_errors_total', "Labelbox SDK calls that raised.", ['operation']
+))
+STAGE_SECONDS = registry.register(Histogram(
+    'annotation_stage_seconds', "Duration of service stages (export, upload batch, import chunk, ...).",
+    ['stage']
+))
+REQUEST_SECONDS = registry.register(Histogram(
+    'http_request_seconds', "Duration of HTTP requests.", ['view', 'method', 'status']
+))
+REQUEST_DB_QUERIES = registry.register(Histogram(
+    'http_request_db_queries', "ORM queries run per HTTP request.", ['view'], buckets=QUERY_COUNT_BUCKETS
+))
+REQUEST_DB_SECONDS = registry.register(Histogram(
+    'http_request_db_seconds', "Time spent in the database per HTTP request.", ['view']
+))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Breakdown of the current request or job, filled by `labelbox_call` and `stage`
+_timings = ContextVar('timings', default=None)
+
+
+@contextmanager
+def collect_timings():
+    """
+    Collect the Labelbox call and stage times (in ms) of the code run inside the block.
+    Work handed to thread pools is not included.
+    """
+    timings = {'labelbox_ms': {}, 'stages_ms': {}}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def _record(kind, name, seconds):
+    timings = _timings.get()
+    if timings is not None:
+        timings[kind][name] = round(timings[kind].get(name, 0.0) + seconds * 1000, 2)
+
+
+@contextmanager
+def labelbox_call(operation):
+    """
+    Time one Labelbox SDK call (including any `wait_till_done`).
+
+    :param operation: What is called, e.g. 'create_data_rows' or 'export'.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        LABELBOX_CALL_ERRORS.inc(operation=operation)
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        LABELBOX_CALL_SECONDS.observe(seconds, operation=operation)
+        _record('labelbox_ms', operation, seconds)
+
+
+@contextmanager
+def stage(name):
+    """Time one stage of a service operation, e.g. 'export.page' or 'upload.convert'."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=name)
+        _record('stages_ms', name, seconds)
+
+
+class QueryCounter:
+    """`connection.execute_wrapper` hook counting queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+# QueryCounter of the current request, read by `count_request_query` on whichever thread runs the query
+_request_queries = ContextVar('request_queries', default=None)
+
+
+def count_request_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection (see `annotation.signals`). Async views run
+    their queries on other threads with their own connections; the context variable goes with
+    them, so the queries still reach the counter of their request.
+    """
+    queries = _request_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    return queries(execute, sql, params, many, context)
+
+
+@contextmanager
+def count_request_queries():
+    """Count the queries run inside the block, on any thread the context is copied to."""
+    queries = QueryCounter()
+    token = _request_queries.set(queries)
+    try:
+        yield queries
+    finally:
+        _request_queries.reset(token)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records duration and ORM query count/time of every request and logs one JSON
+    line per request with its Labelbox call and stage timings.
+
+    Works in sync (WSGI) and async (ASGI) mode, like Django's own middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Same switch as django.utils.deprecation.MiddlewareMixin: __call__ hands over to __acall__
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        else:
+            self._is_coroutine = None
+
+    def __call__(self, request):
+        if self._is_coroutine:
+            return self.__acall__(request)
+
+        started = time.perf_counter()
+        with collect_timings() as timings, count_request_queries() as queries:
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, queries, timings)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with collect_timings() as timings, count_request_queries() as queries:
+            response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, queries, timings)
+        return response
+
+    @staticmethod
+    def _record(request, response, seconds, queries, timings):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        REQUEST_SECONDS.observe(seconds, view=view, method=request.method, status=response.status_code)
+        REQUEST_DB_QUERIES.observe(queries.count, view=view)
+        REQUEST_DB_SECONDS.observe(queries.seconds, view=view)
+
+        logger.info(json.dumps({
+            "event": "request",
+            "method": request.method,
+            "path": request.path,
+            "view": view,
+            "status": response.status_code,
+            "duration_ms": round(seconds * 1000, 2),
+            "db_queries": queries.count,
+            "db_ms": round(queries.seconds * 1000, 2),
+            **timings,
+        }))
+
+
+def metrics_client_allowed(address):
+    """
+    Whether a client may read the metrics without logging in.
+
+    :param address: The client's IP address.
+    :return: True if it is in one of the METRICS_ALLOWED_IPS addresses or networks.
+    """
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(allowed, strict=False) for allowed in settings.METRICS_ALLOWED_IPS)
+
+
+def serve_metrics(port):
+    """
+    Serve `registry` on http://0.0.0.0:<port>/metrics from a daemon thread (for worker processes).
+    Only clients in METRICS_ALLOWED_IPS get an answer.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if not metrics_client_allowed(self.client_address[0]):
+                self.send_error(403)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
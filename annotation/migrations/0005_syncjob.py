@@ -0,0 +1,67 @@
+# Generated by Django 4.1.13 on 2026-10-17 21:55
+
+from django.db import migrations, models
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0004_annotationproject_lb_uid_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('job_type', models.CharField(choices=[('UPLOAD_ANNOTATIONS', 'Upload Annotations'), ('EXPORT_PROJECT', 'Export Project')], max_length=50)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('SUCCEEDED', 'Succeeded'), ('FAILED', 'Failed')], default='QUEUED', max_length=20)),
+                ('dedupe_key', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ('-created_at',),
+                'abstract': False,
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='annotation',
+            options={'ordering': ('-created_at',)},
+        ),
+        migrations.AlterModelOptions(
+            name='annotationproject',
+            options={'ordering': ('-created_at',)},
+        ),
+        migrations.AlterModelOptions(
+            name='annotationtask',
+            options={'ordering': ('-created_at',)},
+        ),
+        migrations.AlterModelOptions(
+            name='classification',
+            options={'ordering': ('-created_at',)},
+        ),
+        migrations.AlterModelOptions(
+            name='exportedannotation',
+            options={'ordering': ('-created_at',)},
+        ),
+        migrations.AlterField(
+            model_name='annotation',
+            name='annotation_type',
+            field=models.CharField(choices=[('bounding_box', 'Bounding Box')], default='bounding_box', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='syncjob',
+            index=models.Index(fields=['status', 'run_after'], name='syncjob_status_run_after_idx'),
+        ),
+    ]
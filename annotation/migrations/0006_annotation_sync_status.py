@@ -0,0 +1,34 @@
+# Generated by Django 4.1.13 on 2026-10-17 21:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0005_syncjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotation',
+            name='sync_error',
+            field=models.TextField(blank=True),
+        ),
+        # Existing annotations were uploaded synchronously when they were saved
+        migrations.AddField(
+            model_name='annotation',
+            name='sync_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('SYNCING', 'Syncing'), ('SYNCED', 'Synced'), ('FAILED', 'Failed')], default='SYNCED', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='annotation',
+            name='sync_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('SYNCING', 'Syncing'), ('SYNCED', 'Synced'), ('FAILED', 'Failed')], default='PENDING', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='annotation',
+            name='synced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
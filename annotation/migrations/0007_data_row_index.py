@@ -0,0 +1,50 @@
+# Generated by Django 4.1.13 on 2026-10-17 21:58
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0006_annotation_sync_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataRowIndex',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('global_key', models.CharField(max_length=255, unique=True)),
+                ('data_row_id', models.CharField(max_length=255)),
+                ('dataset_id', models.CharField(blank=True, max_length=255)),
+                ('project_lb_uid', models.CharField(blank=True, db_index=True, max_length=200)),
+                ('row_created_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ('-created_at',),
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DatasetIndexWatermark',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('dataset_id', models.CharField(max_length=255, unique=True)),
+                ('last_row_created_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ('-created_at',),
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='annotationproject',
+            name='lb_dataset_uid',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-17 21:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0007_data_row_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotationproject',
+            name='last_exported_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
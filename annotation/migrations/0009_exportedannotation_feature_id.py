@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+
+def populate_feature_ids(apps, schema_editor):
+    """
+    Fill feature_id from the stored export object and drop the duplicates that every
+    previous re-export created, keeping the most recent copy.
+    """
+    ExportedAnnotation = apps.get_model('annotation', 'ExportedAnnotation')
+    seen = set()
+    duplicates = []
+
+    for exported in ExportedAnnotation.objects.order_by('-created_at').iterator():
+        feature_id = (exported.annotation_data or {}).get('feature_id') or str(exported.id)
+        key = (exported.task_id, feature_id)
+        if key in seen:
+            duplicates.append(exported.id)
+            continue
+        seen.add(key)
+        if exported.feature_id != feature_id:
+            exported.feature_id = feature_id
+            exported.save(update_fields=['feature_id'])
+
+    for start in range(0, len(duplicates), 1000):
+        ExportedAnnotation.objects.filter(id__in=duplicates[start:start + 1000]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0008_annotationproject_last_exported_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportedannotation',
+            name='feature_id',
+            field=models.CharField(default='', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_feature_ids, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='exportedannotation',
+            constraint=models.UniqueConstraint(fields=('task_id', 'feature_id'), name='unique_exported_annotation'),
+        ),
+    ]
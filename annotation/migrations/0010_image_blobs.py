@@ -0,0 +1,81 @@
+# Generated by Django 4.1.13 on 2026-10-17 22:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import hashlib
+import uuid
+
+
+def move_images_to_blobs(apps, schema_editor):
+    """
+    Point each exported annotation at a content-addressed ImageBlob. The first file
+    with a given hash becomes the blob's file, later identical copies are deleted.
+    """
+    ExportedAnnotation = apps.get_model('annotation', 'ExportedAnnotation')
+    ImageBlob = apps.get_model('annotation', 'ImageBlob')
+
+    for exported in ExportedAnnotation.objects.exclude(image_file='').iterator():
+        storage = exported.image_file.storage
+        name = exported.image_file.name
+        if not storage.exists(name):
+            continue
+
+        with storage.open(name, 'rb') as image:
+            content = image.read()
+        digest = hashlib.sha256(content).hexdigest()
+
+        blob = ImageBlob.objects.filter(sha256=digest).first()
+        if blob is None:
+            blob = ImageBlob.objects.create(sha256=digest, size=len(content), file=name)
+        elif blob.file.name != name:
+            storage.delete(name)
+
+        exported.image = blob
+        exported.save(update_fields=['image'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0009_exportedannotation_feature_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file', models.ImageField(upload_to='exported_annotations/')),
+                ('size', models.PositiveBigIntegerField()),
+            ],
+            options={
+                'ordering': ('-created_at',),
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ImageSource',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('url', models.URLField(max_length=2000, unique=True)),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('last_modified', models.CharField(blank=True, max_length=100)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sources', to='annotation.imageblob')),
+            ],
+            options={
+                'ordering': ('-created_at',),
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='exportedannotation',
+            name='image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='exported_annotations', to='annotation.imageblob'),
+        ),
+        migrations.RunPython(move_images_to_blobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0010_image_blobs'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='exportedannotation',
+            name='image_file',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-17 22:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0011_remove_exportedannotation_image_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotationtask',
+            name='import_error',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.1.13 on 2026-10-17 22:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0012_annotationtask_import_error'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='syncjob',
+            name='job_type',
+            field=models.CharField(choices=[('UPLOAD_ANNOTATIONS', 'Upload Annotations'), ('EXPORT_PROJECT', 'Export Project'), ('IMPORT_IMAGES', 'Import Images')], max_length=50),
+        ),
+        migrations.CreateModel(
+            name='ImageImport',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('manifest', models.FileField(blank=True, upload_to='imports/')),
+                ('source_path', models.CharField(blank=True, max_length=1000)),
+                ('file_format', models.CharField(choices=[('CSV', 'CSV'), ('NDJSON', 'NDJSON')], max_length=10)),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='QUEUED', max_length=20)),
+                ('rows_done', models.PositiveBigIntegerField(default=0)),
+                ('rows_created', models.PositiveBigIntegerField(default=0)),
+                ('rows_failed', models.PositiveBigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_imports', to='annotation.annotationproject')),
+            ],
+            options={
+                'ordering': ('-created_at',),
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.1.13 on 2026-10-17 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0013_image_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotationproject',
+            name='provisioning_error',
+            field=models.TextField(blank=True),
+        ),
+        # Existing projects were provisioned synchronously when they were created
+        migrations.AddField(
+            model_name='annotationproject',
+            name='provisioning_status',
+            field=models.CharField(choices=[('PROVISIONING', 'Provisioning'), ('ONTOLOGY_READY', 'Ontology Ready'), ('DATA_IMPORTED', 'Data Imported'), ('READY', 'Ready')], default='READY', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='annotationproject',
+            name='provisioning_status',
+            field=models.CharField(choices=[('PROVISIONING', 'Provisioning'), ('ONTOLOGY_READY', 'Ontology Ready'), ('DATA_IMPORTED', 'Data Imported'), ('READY', 'Ready')], default='PROVISIONING', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='syncjob',
+            name='job_type',
+            field=models.CharField(choices=[('UPLOAD_ANNOTATIONS', 'Upload Annotations'), ('EXPORT_PROJECT', 'Export Project'), ('IMPORT_IMAGES', 'Import Images'), ('PROVISION_PROJECT', 'Provision Project')], max_length=50),
+        ),
+    ]
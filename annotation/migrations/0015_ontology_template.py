@@ -0,0 +1,36 @@
+# Generated by Django 4.1.13 on 2026-10-17 22:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0014_annotationproject_provisioning_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OntologyTemplate',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=200)),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('ontology', models.JSONField()),
+                ('lb_ontology_id', models.CharField(blank=True, max_length=200)),
+            ],
+            options={
+                'ordering': ('-created_at',),
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='annotationproject',
+            name='ontology_template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='projects', to='annotation.ontologytemplate'),
+        ),
+    ]
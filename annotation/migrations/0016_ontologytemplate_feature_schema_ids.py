@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-17 22:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0015_ontology_template'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ontologytemplate',
+            name='feature_schema_ids',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 4.1.13 on 2026-10-17 22:13
+
+import logging
+import struct
+
+import numpy as np
+
+import annotation.models
+from django.db import migrations, models
+
+
+# Frozen copy of the packed geometry format as of this migration, so later changes
+# to annotation.geometry cannot change what it does
+GEOMETRY_FIELDS = {
+    'bounding_box': ('left', 'top', 'width', 'height'),
+    'point': ('x', 'y'),
+    'polygon': ('x', 'y'),
+}
+GEOMETRY_KIND_CODES = {'bounding_box': 1, 'point': 2, 'polygon': 3}
+PACKED_HEADER = struct.Struct('<2sBBI')
+PACKED_MAGIC = b'GM'
+PACKED_VERSION = 1
+PACKED_DTYPE = np.dtype('<f4')
+INVALID_DATA_ERRORS = (ValueError, TypeError, KeyError, IndexError, struct.error)
+
+logger = logging.getLogger(__name__)
+
+
+def pack_geometry(annotation_type, data):
+    fields = GEOMETRY_FIELDS[annotation_type]
+    coordinates = np.array([[item[field] for field in fields] for item in data], dtype=PACKED_DTYPE)
+    header = PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, GEOMETRY_KIND_CODES[annotation_type], len(data))
+    return header + coordinates.tobytes()
+
+
+def unpack_geometry(annotation_type, buffer):
+    fields = GEOMETRY_FIELDS[annotation_type]
+    magic, version, kind, rows = PACKED_HEADER.unpack_from(buffer)
+    if magic != PACKED_MAGIC or version != PACKED_VERSION or kind != GEOMETRY_KIND_CODES[annotation_type]:
+        raise ValueError(f"Not packed {annotation_type} geometry")
+    coordinates = np.frombuffer(buffer, dtype=PACKED_DTYPE, count=rows * len(fields), offset=PACKED_HEADER.size)
+    return [dict(zip(fields, row)) for row in coordinates.reshape(rows, len(fields)).tolist()]
+
+
+def repack_annotations(annotations, packed, batch_size=1000):
+    annotations = annotations.filter(geometry__isnull=packed, annotation_type__in=list(GEOMETRY_FIELDS))
+    batch = []
+    for annotation in annotations.only('id', 'annotation_type', 'data', 'geometry').iterator(chunk_size=batch_size):
+        # A malformed legacy row stays where it is instead of aborting the whole migration
+        try:
+            if packed:
+                annotation.geometry = pack_geometry(annotation.annotation_type, annotation.data)
+                annotation.data = None
+            else:
+                annotation.data = unpack_geometry(annotation.annotation_type, annotation.geometry)
+                annotation.geometry = None
+        except INVALID_DATA_ERRORS as exc:
+            logger.warning("Skipping annotation %s, its %s geometry could not be converted: %r",
+                           annotation.id, annotation.annotation_type, exc)
+            continue
+        batch.append(annotation)
+        if len(batch) >= batch_size:
+            annotations.model.objects.bulk_update(batch, ['data', 'geometry'])
+            batch = []
+    annotations.model.objects.bulk_update(batch, ['data', 'geometry'])
+
+
+def pack_existing_annotations(apps, schema_editor):
+    """
+    Existing projects get ANNOTATION_GEOMETRY_STORAGE as their storage; if that is
+    PACKED, pack the annotations they already have.
+    """
+    Annotation = apps.get_model('annotation', 'Annotation')
+    repack_annotations(Annotation.objects.filter(task__project__geometry_storage='PACKED'), packed=True)
+
+
+def unpack_annotations(apps, schema_editor):
+    Annotation = apps.get_model('annotation', 'Annotation')
+    repack_annotations(Annotation.objects.all(), packed=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0016_ontologytemplate_feature_schema_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotation',
+            name='geometry',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='annotationproject',
+            name='geometry_storage',
+            field=models.CharField(choices=[('JSON', 'JSON'), ('PACKED', 'Packed float32')], default=annotation.models.default_geometry_storage, max_length=10),
+        ),
+        migrations.RunPython(pack_existing_annotations, unpack_annotations),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.13 on 2026-10-17 22:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0017_packed_geometry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotation',
+            name='vertex_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='annotation',
+            name='vertex_count_received',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.13 on 2026-10-17 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0018_annotation_vertex_counts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='annotation',
+            index=models.Index(condition=models.Q(('sync_status', 'PENDING'), ('sync_status', 'SYNCING'), _connector='OR'), fields=['updated_at'], name='annotation_unsynced_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='annotationproject',
+            index=models.Index(fields=['created_at', 'id'], name='project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='annotationtask',
+            index=models.Index(fields=['project', 'created_at', 'id'], name='task_project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='annotationtask',
+            index=models.Index(fields=['project', 'status'], name='task_project_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='annotationtask',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['project', 'created_at'], name='task_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='syncjob',
+            index=models.Index(condition=models.Q(('status', 'QUEUED')), fields=['dedupe_key'], name='syncjob_queued_dedupe_idx'),
+        ),
+    ]
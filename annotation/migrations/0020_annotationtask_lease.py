@@ -0,0 +1,27 @@
+# Generated by Django 4.1.13 on 2026-10-17 22:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0019_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotationtask',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='annotationtask',
+            name='lease_owner',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='annotationtask',
+            index=models.Index(condition=models.Q(('status', 'IN_PROGRESS')), fields=['lease_expires_at'], name='task_leased_idx'),
+        ),
+    ]
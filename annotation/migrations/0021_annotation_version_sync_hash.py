@@ -0,0 +1,23 @@
+# Generated by Django 4.1.13 on 2026-10-17 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0020_annotationtask_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotation',
+            name='sync_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='annotation',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
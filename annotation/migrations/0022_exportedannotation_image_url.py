@@ -0,0 +1,22 @@
+# Generated by Django 4.1.13 on 2026-10-17 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0021_annotation_version_sync_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportedannotation',
+            name='image_url',
+            field=models.URLField(blank=True, max_length=2000),
+        ),
+        migrations.AddIndex(
+            model_name='exportedannotation',
+            index=models.Index(condition=models.Q(('image__isnull', True)), fields=['updated_at'], name='exported_image_missing_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.1.13 on 2026-10-17 23:10
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def set_missing_image_projects(apps, schema_editor):
+    """Rows still waiting for their image are retried per project, so look their project up."""
+    ExportedAnnotation = apps.get_model('annotation', 'ExportedAnnotation')
+    DataRowIndex = apps.get_model('annotation', 'DataRowIndex')
+    ExportedAnnotation.objects.filter(image__isnull=True).update(project_lb_uid=Coalesce(
+        Subquery(DataRowIndex.objects.filter(data_row_id=OuterRef('task_id')).values('project_lb_uid')[:1]),
+        Value('')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annotation', '0022_exportedannotation_image_url'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='exportedannotation',
+            name='exported_image_missing_idx',
+        ),
+        migrations.AddField(
+            model_name='exportedannotation',
+            name='image_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='exportedannotation',
+            name='project_lb_uid',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.RunPython(set_missing_image_projects, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='exportedannotation',
+            index=models.Index(condition=models.Q(('image__isnull', True)), fields=['project_lb_uid', 'image_attempts'], name='exported_image_missing_idx'),
+        ),
+    ]
@@ -1,7 +1,15 @@
+import hashlib
+import json
 import uuid
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
+from .geometry import coordinates_from_json, coordinates_to_json, pack_geometry, unpack_geometry
+
 
 class TimeStamp(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -13,8 +21,49 @@ class TimeStamp(models.Model):
         ordering = ('-created_at',)
 
 
+class OntologyTemplate(TimeStamp):
+    """
+    A Labelbox ontology created by this app, identified by the hash of its normalized
+    JSON, so projects with the same schema share one ontology.
+    """
+    name = models.CharField(max_length=200)
+    content_hash = models.CharField(max_length=64, unique=True)
+    ontology = models.JSONField()  # normalized OntologyBuilder.asdict()
+    lb_ontology_id = models.CharField(max_length=200, blank=True)
+    # Tool/classification name -> feature schema id, see annotation.ontology.build_feature_schema_ids
+    feature_schema_ids = models.JSONField(default=dict, blank=True)
+
+    @staticmethod
+    def normalize(ontology):
+        """Round-trip through canonical JSON so equal schemas compare and hash equal."""
+        return json.loads(json.dumps(ontology, sort_keys=True))
+
+    @staticmethod
+    def hash_ontology(ontology):
+        canonical = json.dumps(ontology, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def __str__(self):
+        return self.name
+
+
+def default_geometry_storage():
+    return settings.ANNOTATION_GEOMETRY_STORAGE
+
+
 class AnnotationProject(TimeStamp):
+    # Provisioning steps run in the sync worker, see annotation/provisioning.py
+    PROVISIONING_STATUS_CHOICES = [
+        ('PROVISIONING', 'Provisioning'),
+        ('ONTOLOGY_READY', 'Ontology Ready'),
+        ('DATA_IMPORTED', 'Data Imported'),
+        ('READY', 'Ready')
+    ]
+
     lb_uid = models.CharField(max_length=200, null=True, blank=True)
+    lb_dataset_uid = models.CharField(max_length=200, null=True, blank=True)
+    # Labelbox activity before this time has already been exported (see ExportService)
+    last_exported_at = models.DateTimeField(null=True, blank=True)
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     media_type = models.CharField(
@@ -22,6 +71,23 @@ class AnnotationProject(TimeStamp):
         choices=[('IMAGE', 'Image')],
         default='IMAGE'
     )
+    provisioning_status = models.CharField(max_length=20, choices=PROVISIONING_STATUS_CHOICES, default='PROVISIONING')
+    provisioning_error = models.TextField(blank=True)  # Last failed step, cleared when it succeeds
+    ontology_template = models.ForeignKey(
+        OntologyTemplate, on_delete=models.SET_NULL, null=True, blank=True, related_name='projects'
+    )
+    # How Annotation coordinates are stored: JSON `data`, or packed float32 `geometry`
+    geometry_storage = models.CharField(
+        max_length=10,
+        choices=[('JSON', 'JSON'), ('PACKED', 'Packed float32')],
+        default=default_geometry_storage
+    )
+
+    class Meta(TimeStamp.Meta):
+        indexes = [
+            # Keyset pagination of the project list
+            models.Index(fields=['created_at', 'id'], name='project_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -40,15 +106,42 @@ class AnnotationTask(TimeStamp):
     image_url = models.URLField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     annotated_at = models.DateTimeField(null=True, blank=True)
+    import_error = models.TextField(blank=True)  # Why Labelbox rejected this data row, if it did
+    # Annotator currently working on the task and until when (see annotation/dispatch.py)
+    lease_owner = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta(TimeStamp.Meta):
+        indexes = [
+            # Keyset pagination of a project's tasks
+            models.Index(fields=['project', 'created_at', 'id'], name='task_project_created_idx'),
+            # Task counts per status, status filters
+            models.Index(fields=['project', 'status'], name='task_project_status_idx'),
+            # Next pending task of a project, oldest first
+            models.Index(fields=['project', 'created_at'], condition=models.Q(status='PENDING'),
+                         name='task_pending_idx'),
+            # Expired annotator leases, released by the sync worker
+            models.Index(fields=['lease_expires_at'], condition=models.Q(status='IN_PROGRESS'),
+                         name='task_leased_idx'),
+        ]
 
     def mark_as_annotated(self):
         if self.status in ['PENDING', 'IN_PROGRESS']:
             self.status = 'COMPLETED'
             self.annotated_at = timezone.now()
+            self.lease_owner = ''
+            self.lease_expires_at = None
             self.save()
         else:
             raise ValueError("Task cannot be marked as completed from the current status.")
 
+    def is_leased_to_other(self, owner):
+        """True while another annotator holds an unexpired lease on this task."""
+        return (
+            self.status == 'IN_PROGRESS' and self.lease_owner not in ('', owner)
+            and self.lease_expires_at is not None and self.lease_expires_at > timezone.now()
+        )
+
     def __str__(self):
         return f"{self.project.name} - {self.global_key}"
 
@@ -68,6 +161,85 @@ class Annotation(TimeStamp):
     name = models.CharField(max_length=100)  # Tool/classification name
     data = models.JSONField(default=dict, null=True)  # Stores coordinates, values, or other annotation data
 
+    # Labelbox upload state, maintained by annotation.uploads.AnnotationUploadBatcher
+    SYNC_STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SYNCING', 'Syncing'),
+        ('SYNCED', 'Synced'),
+        ('FAILED', 'Failed')
+    ]
+    sync_status = models.CharField(max_length=20, choices=SYNC_STATUS_CHOICES, default='PENDING')
+    sync_error = models.TextField(blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
+    # compute_sync_hash() of the content last uploaded; an edit back to it needs no new upload
+    sync_hash = models.CharField(max_length=64, blank=True)
+    # Optimistic concurrency: edits name the version they were made against
+    version = models.PositiveIntegerField(default=1)
+
+    # Packed float32 coordinates (see annotation.geometry); `data` is null when this is set
+    geometry = models.BinaryField(null=True, blank=True)
+    # Vertices as posted and as stored after normalization/simplification
+    vertex_count_received = models.PositiveIntegerField(null=True, blank=True)
+    vertex_count = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta(TimeStamp.Meta):
+        indexes = [
+            # Annotations waiting for the MAL upload batcher (the few not yet SYNCED)
+            models.Index(fields=['updated_at'],
+                         condition=models.Q(sync_status='PENDING') | models.Q(sync_status='SYNCING'),
+                         name='annotation_unsynced_idx'),
+        ]
+
+    @property
+    def coordinates(self):
+        """Coordinates as a NumPy array, one row per box/point/vertex. A zero-copy view for packed rows."""
+        if self.geometry is not None:
+            return unpack_geometry(self.annotation_type, self.geometry)
+        return coordinates_from_json(self.annotation_type, self.data)
+
+    @property
+    def geometry_data(self):
+        """Coordinates in the JSON layout of `data`, however they are stored."""
+        if self.geometry is not None:
+            return coordinates_to_json(self.annotation_type, self.coordinates)
+        return self.data
+
+    def pack_geometry(self):
+        """Store the coordinates in `data` packed instead (call before saving)."""
+        self.geometry = pack_geometry(self.annotation_type, self.data)
+        self.data = None
+
+    def compute_sync_hash(self):
+        """
+        SHA-256 of everything uploaded to Labelbox for this annotation: name, type,
+        coordinates and classifications (read through `classifications.all()`, so a
+        prefetch is used when there is one).
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps([self.name, self.annotation_type]).encode())
+        digest.update(np.ascontiguousarray(self.coordinates, dtype=np.float64).tobytes())
+        for classification in sorted(
+            json.dumps([cls.name, cls.classification_type, cls.value], sort_keys=True, default=str)
+            for cls in self.classifications.all()
+        ):
+            digest.update(classification.encode())
+        return digest.hexdigest()
+
+    def as_dict(self):
+        return {
+            "id": str(self.id),
+            "task_id": str(self.task_id),
+            "name": self.name,
+            "annotation_type": self.annotation_type,
+            "data": self.geometry_data,
+            "classification": [
+                {"name": cls.name, "type": cls.classification_type, "value": cls.value}
+                for cls in self.classifications.all()
+            ],
+            "version": self.version,
+            "sync_status": self.sync_status,
+        }
+
     def __str__(self):
         return f"{self.task} - {self.name}"
 
@@ -88,9 +260,212 @@ class Classification(TimeStamp):
         return f"{self.annotation} - {self.name}"
 
 
+class ImageImport(TimeStamp):
+    """
+    A CSV or NDJSON manifest of image URLs being imported into a project.
+    `rows_done` is the resume checkpoint: manifest rows before it are fully imported.
+    """
+    FORMAT_CHOICES = [
+        ('CSV', 'CSV'),
+        ('NDJSON', 'NDJSON')
+    ]
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed')
+    ]
+
+    project = models.ForeignKey(AnnotationProject, on_delete=models.CASCADE, related_name='image_imports')
+    manifest = models.FileField(upload_to="imports/", blank=True)  # uploaded through the web endpoint
+    source_path = models.CharField(max_length=1000, blank=True)  # local file given to `import_images`
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    rows_done = models.PositiveBigIntegerField(default=0)
+    rows_created = models.PositiveBigIntegerField(default=0)
+    rows_failed = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def open_manifest(self):
+        """Open the manifest as a binary file object (streamed, never read whole)."""
+        if self.manifest:
+            return self.manifest.open('rb')
+        return open(self.source_path, 'rb')
+
+    def as_dict(self):
+        return {
+            "id": str(self.id),
+            "project_id": str(self.project_id),
+            "file_format": self.file_format,
+            "status": self.status,
+            "rows_done": self.rows_done,
+            "rows_created": self.rows_created,
+            "rows_failed": self.rows_failed,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __str__(self):
+        return f"{self.project} - {self.manifest.name or self.source_path}"
+
+
+class DataRowIndex(TimeStamp):
+    """
+    Local copy of Labelbox data rows keyed by global key, so existence and
+    project-membership checks are a single indexed lookup instead of a scan of
+    every dataset in the organization.
+    """
+    global_key = models.CharField(max_length=255, unique=True)
+    data_row_id = models.CharField(max_length=255)
+    dataset_id = models.CharField(max_length=255, blank=True)
+    project_lb_uid = models.CharField(max_length=200, blank=True, db_index=True)
+    row_created_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.global_key} - {self.data_row_id}"
+
+
+class DatasetIndexWatermark(TimeStamp):
+    """Newest data row creation time already copied into DataRowIndex, per dataset."""
+    dataset_id = models.CharField(max_length=255, unique=True)
+    last_row_created_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.dataset_id} - {self.last_row_created_at}"
+
+
+class ImageBlob(TimeStamp):
+    """An exported image stored once, keyed by the SHA-256 of its content."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.ImageField(upload_to="exported_annotations/")
+    size = models.PositiveBigIntegerField()
+
+    def __str__(self):
+        return self.sha256
+
+
+class ImageSource(TimeStamp):
+    """Last fetch of an image URL, with the validators needed for conditional GETs."""
+    url = models.URLField(max_length=2000, unique=True)
+    blob = models.ForeignKey(ImageBlob, on_delete=models.CASCADE, related_name='sources')
+    etag = models.CharField(max_length=255, blank=True)
+    last_modified = models.CharField(max_length=100, blank=True)  # raw Last-Modified header
+
+    def __str__(self):
+        return self.url
+
+
 class ExportedAnnotation(TimeStamp):
-    task_id = models.CharField(max_length=255)
+    task_id = models.CharField(max_length=255)  # Labelbox data row id
+    feature_id = models.CharField(max_length=255)  # Labelbox annotation (feature) id
     annotation_name = models.CharField(max_length=255)
     annotation_type = models.CharField(max_length=50)
     annotation_data = models.JSONField()
-    image_file = models.ImageField(upload_to="exported_annotations/")
+    image = models.ForeignKey(
+        ImageBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='exported_annotations'
+    )
+    # Data row image; `image` stays null until a download of it succeeds
+    image_url = models.URLField(max_length=2000, blank=True)
+    image_attempts = models.PositiveSmallIntegerField(default=0)  # Failed downloads of image_url
+    project_lb_uid = models.CharField(max_length=200, blank=True)  # Labelbox project that exported it
+
+    class Meta(TimeStamp.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['task_id', 'feature_id'], name='unique_exported_annotation'),
+        ]
+        indexes = [
+            # Annotations whose image download failed, retried by later exports of their project
+            models.Index(fields=['project_lb_uid', 'image_attempts'], condition=models.Q(image__isnull=True),
+                         name='exported_image_missing_idx'),
+        ]
+
+
+class SyncJob(TimeStamp):
+    """
+    A unit of background work (Labelbox upload, export, ...) stored in Postgres so
+    that no separate broker is needed. Jobs are claimed by `run_sync_worker`.
+    """
+    JOB_TYPES = [
+        ('UPLOAD_ANNOTATIONS', 'Upload Annotations'),
+        ('EXPORT_PROJECT', 'Export Project'),
+        ('IMPORT_IMAGES', 'Import Images'),
+        ('PROVISION_PROJECT', 'Provision Project'),
+    ]
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed')
+    ]
+
+    job_type = models.CharField(max_length=50, choices=JOB_TYPES)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    dedupe_key = models.CharField(max_length=255, blank=True, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta(TimeStamp.Meta):
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='syncjob_status_run_after_idx'),
+            # enqueue() looks for an already queued job with the same dedupe key
+            models.Index(fields=['dedupe_key'], condition=models.Q(status='QUEUED'), name='syncjob_queued_dedupe_idx'),
+        ]
+
+    def mark_succeeded(self, result=None):
+        self.status = 'SUCCEEDED'
+        self.result = result
+        self.locked_until = None
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'result', 'locked_until', 'finished_at', 'updated_at'])
+
+    def mark_failed(self, error, backoff_seconds, result=None):
+        """
+        Record a failed attempt. The job is re-queued with exponential backoff until
+        `max_attempts` is reached, after which it stays FAILED.
+        """
+        self.last_error = str(error)
+        self.result = result
+        self.locked_until = None
+        if self.attempts < self.max_attempts:
+            self.status = 'QUEUED'
+            self.run_after = timezone.now() + timedelta(seconds=backoff_seconds * 2 ** (self.attempts - 1))
+        else:
+            self.status = 'FAILED'
+            self.finished_at = timezone.now()
+        self.save(update_fields=[
+            'status', 'last_error', 'result', 'locked_until', 'run_after', 'finished_at', 'updated_at'
+        ])
+
+    def mark_rescheduled(self, reason, delay_seconds):
+        """Put the job back in the queue without counting this run as an attempt."""
+        self.status = 'QUEUED'
+        self.attempts = max(self.attempts - 1, 0)
+        self.last_error = str(reason)
+        self.locked_until = None
+        self.run_after = timezone.now() + timedelta(seconds=delay_seconds)
+        self.save(update_fields=['status', 'attempts', 'last_error', 'locked_until', 'run_after', 'updated_at'])
+
+    def as_dict(self):
+        return {
+            "id": str(self.id),
+            "job_type": self.job_type,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "run_after": self.run_after.isoformat(),
+            "last_error": self.last_error,
+            "result": self.result,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __str__(self):
+        return f"{self.job_type} - {self.status}"
@@ -0,0 +1,133 @@
+import labelbox.types as lb_types
+
+
+def build_feature_schema_ids(ontology):
+    """
+    Flatten a Labelbox ontology (`Ontology.normalized`) into name -> feature schema id lookups.
+
+    The result is plain JSON so it can be stored on OntologyTemplate:
+
+        {"tools": {tool name: {"schema_id", "classifications": {...}}},
+         "classifications": {name: {"schema_id", "options": {option value: schema id}}}}
+    """
+    def classifications(items):
+        return {
+            item["name"]: {
+                "schema_id": item.get("featureSchemaId"),
+                "options": {option["value"]: option.get("featureSchemaId") for option in item.get("options", [])},
+            }
+            for item in items or []
+        }
+
+    return {
+        "tools": {
+            tool["name"]: {
+                "schema_id": tool.get("featureSchemaId"),
+                "classifications": classifications(tool.get("classifications")),
+            }
+            for tool in ontology.get("tools", [])
+        },
+        "classifications": classifications(ontology.get("classifications")),
+    }
+
+
+class FeatureSchemaMap:
+    """
+    Resolves annotation and classification names against a project's ontology locally,
+    so annotations are sent to Labelbox by feature schema id and a name the ontology
+    does not define fails before any upload instead of inside the import job.
+
+    Classifications are looked up under the annotation's tool first, then among the
+    ontology's top-level (global) classifications, such as the default ontology's
+    radio/checklist/text questions. Top-level ones are not part of the object: they
+    are sent as label-level rows of the data row (see `NDJsonAnnotationConverter`).
+    """
+
+    def __init__(self, feature_schema_ids):
+        self.tools = feature_schema_ids.get("tools", {})
+        self.classifications = feature_schema_ids.get("classifications", {})
+
+    def tool(self, name):
+        """Feature schema id of a tool, e.g. "bounding_box"."""
+        tool = self.tools.get(name)
+        if tool is None or not tool["schema_id"]:
+            raise ValueError(f"Tool '{name}' is not defined in the project ontology")
+        return tool["schema_id"]
+
+    def classification(self, tool_name, name):
+        """Schema entry of a classification, nested under the tool or at the top level."""
+        return self._lookup(tool_name, name)[0]
+
+    def is_global(self, tool_name, name):
+        """True if the classification is a top-level one rather than nested under the tool."""
+        return self._lookup(tool_name, name)[1]
+
+    def _lookup(self, tool_name, name):
+        """:return: Tuple of (schema entry, whether it is a top-level classification)."""
+        self.tool(tool_name)
+        classification = self.tools[tool_name]["classifications"].get(name)
+        if classification is not None and classification["schema_id"]:
+            return classification, False
+        classification = self.classifications.get(name)
+        if classification is not None and classification["schema_id"]:
+            return classification, True
+        raise ValueError(
+            f"Classification '{name}' is not defined for tool '{tool_name}' or at the top level of the project ontology"
+        )
+
+    def validate(self, annotation_name, classifications):
+        """
+        :param annotation_name: Tool name of the annotation.
+        :param classifications: Iterable of (name, classification type, value).
+        :raises ValueError: If any name or option is missing from the ontology.
+        """
+        self.tool(annotation_name)
+        for name, classification_type, value in classifications:
+            self.classification_ndjson(annotation_name, name, classification_type, value)
+
+    def classification_annotation(self, tool_name, name, classification_type, value):
+        """Build a nested ClassificationAnnotation that refers to the ontology by schema id."""
+        if self.is_global(tool_name, name):
+            raise ValueError(f"Classification '{name}' is a top-level classification and cannot be nested in an object")
+        schema_id, kind, answer = self._resolve_classification(tool_name, name, classification_type, value)
+        if kind == "text":
+            answer = lb_types.Text(answer=answer)
+        elif kind == "radio":
+            answer = lb_types.Radio(answer=lb_types.ClassificationAnswer(feature_schema_id=answer))
+        else:
+            answer = lb_types.Checklist(answer=[lb_types.ClassificationAnswer(feature_schema_id=a) for a in answer])
+        return lb_types.ClassificationAnnotation(feature_schema_id=schema_id, value=answer)
+
+    def classification_ndjson(self, tool_name, name, classification_type, value):
+        """
+        The same classification as an NDJSON import dict: nested in the object row, or
+        (with "uuid" and "dataRow" added) a label-level row for top-level classifications.
+        """
+        schema_id, kind, answer = self._resolve_classification(tool_name, name, classification_type, value)
+        if kind == "radio":
+            answer = {"schemaId": answer}
+        elif kind == "checklist":
+            answer = [{"schemaId": option_id} for option_id in answer]
+        return {"schemaId": schema_id, "answer": answer}
+
+    def _resolve_classification(self, tool_name, name, classification_type, value):
+        """:return: Tuple of (schema id, "text"/"radio"/"checklist", text or option schema id(s))."""
+        classification = self.classification(tool_name, name)
+        classification_type = (classification_type or '').lower()
+
+        if classification_type == "text":
+            return classification["schema_id"], "text", str(value)
+        if classification_type == "radio":
+            return classification["schema_id"], "radio", self._option(classification, name, value)
+        if classification_type in ("checklist", "checkbox"):
+            values = value if isinstance(value, list) else [value]
+            options = [self._option(classification, name, item) for item in values]
+            return classification["schema_id"], "checklist", options
+        raise ValueError(f"Unsupported classification type: {classification_type}")
+
+    @staticmethod
+    def _option(classification, name, value):
+        schema_id = classification["options"].get(value)
+        if not schema_id:
+            raise ValueError(f"Option '{value}' is not defined for classification '{name}' in the project ontology")
+        return schema_id
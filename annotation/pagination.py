@@ -0,0 +1,87 @@
+import base64
+import binascii
+import uuid
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(obj):
+    value = f"{obj.created_at.isoformat()}|{obj.id}"
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """:return: Tuple of (created_at, id). Raises Http404 for a malformed cursor."""
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = value.split('|')
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError(cursor)
+        return created_at, uuid.UUID(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise Http404("Invalid page cursor")
+
+
+class KeysetPage:
+    """One page of a keyset-paginated list, with the cursors of its neighbours."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginationMixin:
+    """
+    ListView pagination on (created_at, id), newest first.
+
+    `?after=<cursor>` continues after the last row of a page and `?before=<cursor>` goes
+    back. Each page is one indexed range query with LIMIT page_size + 1, so the cost
+    stays the same however deep the page is and no COUNT(*) is needed (unlike
+    OFFSET pagination with Django's Paginator).
+    """
+    paginate_by = 50
+
+    def paginate_queryset(self, queryset, page_size):
+        after = self.request.GET.get('after')
+        before = self.request.GET.get('before')
+
+        if before:
+            created_at, pk = decode_cursor(before)
+            rows = list(
+                queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+                .order_by('created_at', 'id')[:page_size + 1]
+            )
+            more_before = len(rows) > page_size
+            rows = rows[:page_size][::-1]
+            page = KeysetPage(
+                rows,
+                next_cursor=encode_cursor(rows[-1]) if rows else before,
+                previous_cursor=encode_cursor(rows[0]) if rows and more_before else None
+            )
+        else:
+            if after:
+                created_at, pk = decode_cursor(after)
+                queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+            rows = list(queryset.order_by('-created_at', '-id')[:page_size + 1])
+            more_after = len(rows) > page_size
+            rows = rows[:page_size]
+            page = KeysetPage(
+                rows,
+                next_cursor=encode_cursor(rows[-1]) if rows and more_after else None,
+                previous_cursor=encode_cursor(rows[0]) if rows and after else None
+            )
+
+        return None, page, page.object_list, page.has_other_pages()
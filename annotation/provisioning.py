@@ -0,0 +1,85 @@
+import logging
+
+import labelbox as lb
+
+from .importing import ManifestImporter
+from .metrics import labelbox_call, stage
+from .models import ImageImport, OntologyTemplate
+from .services import LabelboxService
+
+logger = logging.getLogger(__name__)
+
+
+class ProjectProvisioner:
+    """
+    Sets up the Labelbox side of an AnnotationProject one step at a time:
+
+        PROVISIONING    -> create the Labelbox project, then the ontology -> ONTOLOGY_READY
+        ONTOLOGY_READY  -> import the project's pending image manifests   -> DATA_IMPORTED
+        DATA_IMPORTED   -> add the dataset's data rows to the project     -> READY
+
+    Each call to `advance` runs a single step and is safe to retry: the Labelbox
+    project is only created while `lb_uid` is empty, imports resume from their
+    checkpoint and batches only pick up data rows not yet in the project.
+    """
+
+    def __init__(self, labelbox_service=None):
+        self.labelbox_service = labelbox_service or LabelboxService()
+
+    def advance(self, project):
+        """
+        Run the next provisioning step for a project.
+
+        :return: The project's new provisioning status.
+        """
+        step = {
+            'PROVISIONING': self._create_project_and_ontology,
+            'ONTOLOGY_READY': self._import_data,
+            'DATA_IMPORTED': self._create_batches,
+        }.get(project.provisioning_status)
+        if step is None:
+            return project.provisioning_status
+
+        try:
+            with stage(f'provision.{project.provisioning_status.lower()}'):
+                project.provisioning_status = step(project)
+        except Exception as exc:
+            logger.exception("Provisioning step %s failed for project %s", project.provisioning_status, project.id)
+            project.provisioning_error = str(exc)
+            project.save(update_fields=['provisioning_error', 'updated_at'])
+            raise
+
+        project.provisioning_error = ''
+        project.save(update_fields=['provisioning_status', 'provisioning_error', 'updated_at'])
+        return project.provisioning_status
+
+    def _create_project_and_ontology(self, project):
+        if not project.lb_uid:
+            with labelbox_call('create_project'):
+                lb_project = self.labelbox_service.client.create_project(
+                    name=project.name,
+                    description=project.description,
+                    media_type=lb.MediaType.Image
+                )
+            project.lb_uid = lb_project.uid
+            project.save(update_fields=['lb_uid', 'updated_at'])
+        else:
+            lb_project = self.labelbox_service.get_project(project.lb_uid)
+
+        # Attach the shared ontology with all supported annotation types
+        ontology = self.labelbox_service.create_ontology(lb_project)
+        project.ontology_template = OntologyTemplate.objects.filter(lb_ontology_id=ontology.uid).first()
+        project.save(update_fields=['ontology_template', 'updated_at'])
+        return 'ONTOLOGY_READY'
+
+    def _import_data(self, project):
+        importer = ManifestImporter(self.labelbox_service)
+        for image_import in ImageImport.objects.filter(project=project).exclude(status='COMPLETED'):
+            importer.run(image_import)
+        # The importer saved the dataset it created on its own copy of the project
+        project.refresh_from_db(fields=['lb_dataset_uid'])
+        return 'DATA_IMPORTED'
+
+    def _create_batches(self, project):
+        self.labelbox_service.add_dataset_to_project(project)
+        return 'READY'
@@ -1,13 +1,28 @@
-import os
+import logging
 import uuid
+from datetime import timezone as dt_timezone
+from itertools import islice
 
 import labelbox as lb
-import requests
+import labelbox.types as lb_types
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.db.models import F
+from django.utils import timezone
+from lbox.exceptions import ResourceNotFoundError
 
-from .models import AnnotationProject, AnnotationTask, Annotation, Classification
-from .models import ExportedAnnotation
+from .clients import get_client, metadata_cache
+from .images import ImageStore
+from .importing import DataRowImporter
+from .metrics import labelbox_call, stage
+from .ontology import FeatureSchemaMap, build_feature_schema_ids
+from .models import AnnotationProject, DataRowIndex, DatasetIndexWatermark, ExportedAnnotation, OntologyTemplate
+
+logger = logging.getLogger(__name__)
+
+# Rows written per bulk upsert when refreshing the data row index
+DATA_ROW_INDEX_BATCH_SIZE = 1000
+# Rows per INSERT ... ON CONFLICT statement when storing exported annotations
+EXPORTED_ANNOTATION_BATCH_SIZE = 500
 
 
 class LabelboxService:
@@ -15,57 +30,132 @@ class LabelboxService:
     Service class to handle Labelbox-like operations and annotations
     """
 
-    def __init__(self):
-        self.client = lb.Client(api_key=settings.LABELBOX_API_KEY)
+    def __init__(self, client=None):
+        # Shared per process, see annotation.clients
+        self.client = client or get_client()
 
     def get_existing_data_row_keys(self, project_id):
         """
-        Retrieve existing data row global keys for a specific project by filtering datasets.
+        Retrieve existing data row global keys for a specific project from the local
+        DataRowIndex (kept current by `import_data_rows` and `refresh_data_row_index`).
 
         :param project_id: The ID of the Labelbox project.
         :return: List of existing data row global keys.
         """
-        # Get the project using the provided project_id
-        project = self.client.get_project(project_id)
-
-        # Retrieve all datasets in the account
-        datasets = self.client.get_datasets()
+        return list(
+            DataRowIndex.objects.filter(project_lb_uid=project_id).values_list('global_key', flat=True)
+        )
 
-        # Initialize an empty list to store global keys
-        global_keys = []
+    def check_dataRow_exists(self, global_key, project_id):
+        """
+        Check if the DataRow specified by the global_key exists in the project specified by project_id.
 
-        # Iterate through all datasets
-        for dataset in datasets:
-            # Filter data rows linked to the given project
-            for data_row in dataset.data_rows():
-                if data_row.project().id == project_id:  # Ensure the data row belongs to the project
-                    global_keys.append(data_row.global_key)
+        Answered from DataRowIndex. On a miss the single data row is looked up in Labelbox
+        by its global key and added to the index.
+        """
+        index_row = DataRowIndex.objects.filter(global_key=global_key).first()
+        if index_row is None:
+            index_row = self._index_data_row_by_global_key(global_key)
+        if index_row is None:
+            return False
 
-        return global_keys
+        # Rows from datasets we did not create have no known project
+        return not index_row.project_lb_uid or index_row.project_lb_uid == project_id
 
-    def check_dataRow_exists(self, global_key, project_id):
+    def refresh_data_row_index(self, dataset_ids=None):
         """
-        Check if the DataRow specified by the global_key exists in the project specified by project_id.
+        Copy data rows created since the last refresh into DataRowIndex.
+
+        Labelbox pages dataset rows newest first, so each dataset is only read until the
+        first row at or before its stored watermark.
+
+        :param dataset_ids: Restrict the refresh to these datasets. Defaults to all datasets.
+        :return: Number of index rows added or updated.
         """
+        with labelbox_call('get_datasets'):
+            if dataset_ids:
+                datasets = [self.client.get_dataset(dataset_id) for dataset_id in dataset_ids]
+            else:
+                datasets = list(self.client.get_datasets())
 
-        # Get project by project_id
-        project = self.client.get_project(project_id)
+        dataset_projects = self._dataset_projects()
+        indexed = 0
 
-        # Get datasets associated with the project
-        datasets = self.client.get_datasets()
-        # Loop over each dataset in the project
         for dataset in datasets:
+            watermark, _ = DatasetIndexWatermark.objects.get_or_create(dataset_id=dataset.uid)
+            newest = watermark.last_row_created_at
+            rows = []
+
+            for data_row in dataset.data_rows():
+                if watermark.last_row_created_at and data_row.created_at <= watermark.last_row_created_at:
+                    break
+                if newest is None or data_row.created_at > newest:
+                    newest = data_row.created_at
+                if not data_row.global_key:
+                    continue
+
+                rows.append(DataRowIndex(
+                    global_key=data_row.global_key,
+                    data_row_id=data_row.uid,
+                    dataset_id=dataset.uid,
+                    project_lb_uid=dataset_projects.get(dataset.uid, ''),
+                    row_created_at=data_row.created_at
+                ))
+                if len(rows) >= DATA_ROW_INDEX_BATCH_SIZE:
+                    indexed += self._upsert_data_row_index(rows)
+                    rows = []
+
+            indexed += self._upsert_data_row_index(rows)
+            watermark.last_row_created_at = newest
+            watermark.save(update_fields=['last_row_created_at', 'updated_at'])
+
+        return indexed
+
+    def _index_data_row_by_global_key(self, global_key):
+        try:
+            with labelbox_call('get_data_row_by_global_key'):
+                data_row = self.client.get_data_row_by_global_key(global_key)
+                dataset_id = data_row.dataset().uid
+        except ResourceNotFoundError:
+            return None
+
+        index_row, _ = DataRowIndex.objects.update_or_create(
+            global_key=global_key,
+            defaults={
+                "data_row_id": data_row.uid,
+                "dataset_id": dataset_id,
+                "project_lb_uid": self._dataset_projects().get(dataset_id, ''),
+                "row_created_at": data_row.created_at,
+            }
+        )
+        return index_row
 
-            # For each dataset, get all the DataRow objects
-            for dataRow in dataset.data_rows():
-                # print('row',  dataRow)
+    def _dataset_projects(self):
+        """Map of Labelbox dataset id -> Labelbox project id for datasets created by this app."""
+        return dict(
+            AnnotationProject.objects.exclude(lb_dataset_uid=None).exclude(lb_uid=None)
+            .values_list('lb_dataset_uid', 'lb_uid')
+        )
+
+    def _upsert_data_row_index(self, rows):
+        if not rows:
+            return 0
+        DataRowIndex.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['global_key'],
+            update_fields=['data_row_id', 'dataset_id', 'project_lb_uid', 'row_created_at', 'updated_at']
+        )
+        return len(rows)
 
-                # check if the global_key of the current DataRow matches the one you are looking for
-                if dataRow.global_key == global_key:
-                    return True
+    def get_project(self, project_id):
+        """
+        Fetches a Labelbox project, served from the shared metadata cache when possible.
 
-        # If loop finishes without finding the DataRow then it does not exist in the project
-        return False
+        :param project_id: The ID of the Labelbox project.
+        :return: The Labelbox Project object.
+        """
+        return metadata_cache.get_project(self.client, project_id)
 
     def get_ontology(self, project_id):
         """
@@ -74,18 +164,17 @@ class LabelboxService:
         :param project_id: The ID of the Labelbox project.
         :return: The Ontology object for the project.
         """
-        project = self.client.get_project(project_id)
-        ontology = project.ontology()
-        return ontology
+        return metadata_cache.get_ontology(self.client, project_id)
 
     def create_project(self, name, description, media_type='IMAGE'):
         """Create a new annotation project"""
         # Create Labelbox project
-        lb_project = self.client.create_project(
-            name=name,
-            description=description,
-            media_type=lb.MediaType.Image
-        )
+        with labelbox_call('create_project'):
+            lb_project = self.client.create_project(
+                name=name,
+                description=description,
+                media_type=lb.MediaType.Image
+            )
 
         # Create Django project
         project = AnnotationProject.objects.create(
@@ -94,47 +183,60 @@ class LabelboxService:
             media_type=media_type,
             lb_uid=lb_project.uid
         )
+        metadata_cache.set_project(lb_project)
 
         return project, lb_project
 
-    def import_data_rows(self, project, image_urls, lb_project):
-        """Import data rows for annotation"""
-        uploads = []
-        global_keys = []
-
-        for image_url in image_urls:
-            gb_key = f"TEST-ID-{uuid.uuid1()}"
-            uploads.append({
-                "row_data": image_url,
-                "global_key": gb_key
-            })
-            global_keys.append(gb_key)
-
-            # Create Django annotation task
-            AnnotationTask.objects.create(
-                project=project,
-                global_key=gb_key,
-                image_url=image_url
-            )
+    def import_data_rows(self, project, image_urls, lb_project=None):
+        """
+        Import data rows for annotation.
 
-        # Create dataset in Labelbox
-        dataset = self.client.create_dataset(name=f"{project.name}-dataset")
-        task = dataset.create_data_rows(uploads)
-        task.wait_till_done()
+        Tasks are bulk-created and data rows uploaded in chunks of
+        DATA_ROW_IMPORT_CHUNK_SIZE, with up to DATA_ROW_IMPORT_WORKERS uploads in flight.
 
-        # Log task errors if any
-        if task.errors:
-            print(f"Data row upload errors: {task.errors}")
-        print("Failed data rows:", task.failed_data_rows)
+        :param project: The AnnotationProject receiving the images.
+        :param image_urls: Iterable of image URLs.
+        :return: Dict with counts of rows read, data rows created and rows that failed.
+        """
+        return DataRowImporter(self).run(project, image_urls)
 
-        # Link dataset to the project
-        data_rows = list(dataset.data_rows())
+    def add_dataset_to_project(self, project):
+        """
+        Batch the data rows of a project's dataset into its Labelbox project, so they can
+        be labeled and receive MAL imports. Rows already in the project are skipped.
 
-        return global_keys
+        :param project: The AnnotationProject.
+        """
+        if not project.lb_dataset_uid:
+            return
+        lb_project = self.get_project(project.lb_uid)
+        with labelbox_call('create_batches_from_dataset'):
+            task = lb_project.create_batches_from_dataset(f"{project.name}-batch", project.lb_dataset_uid)
+            task.wait_till_done()
 
     def create_ontology(self, project):
-        """Create ontology for a project with all supported annotation types"""
-        ontology_builder = lb.OntologyBuilder(
+        """
+        Attach the ontology with all supported annotation types to a project.
+
+        The ontology is only created in Labelbox the first time this schema is seen;
+        later projects reuse it through its OntologyTemplate.
+
+        :param project: The Labelbox Project to attach the ontology to.
+        :return: The Labelbox Ontology.
+        """
+        _, ontology = self.get_or_create_ontology(self.default_ontology_builder().asdict())
+
+        # Attach ontology to Labelbox project
+        with labelbox_call('connect_ontology'):
+            project.connect_ontology(ontology)
+        metadata_cache.invalidate(project.uid)
+
+        return ontology
+
+    @staticmethod
+    def default_ontology_builder():
+        """Ontology with every classification and tool the annotation UI supports"""
+        return lb.OntologyBuilder(
             classifications=[
                 lb.Classification(
                     class_type=lb.Classification.Type.RADIO,
@@ -160,98 +262,299 @@ class LabelboxService:
             ]
         )
 
-        # Create Labelbox ontology
-        ontology = self.client.create_ontology(
-            f"{project.name}-ontology",
-            ontology_builder.asdict()
+    def get_or_create_ontology(self, ontology_json, name=None):
+        """
+        Return the Labelbox ontology for a schema, creating it only if no ontology with
+        the same normalized content exists yet.
+
+        :param ontology_json: Ontology definition, e.g. `OntologyBuilder.asdict()`.
+        :param name: Name for a newly created ontology. Defaults to one derived from the hash.
+        :return: Tuple of (OntologyTemplate, Labelbox Ontology).
+        """
+        normalized = OntologyTemplate.normalize(ontology_json)
+        content_hash = OntologyTemplate.hash_ontology(normalized)
+
+        template = OntologyTemplate.objects.filter(content_hash=content_hash).first()
+        if template is not None and template.lb_ontology_id:
+            try:
+                ontology = metadata_cache.get_ontology_by_id(self.client, template.lb_ontology_id)
+            except ResourceNotFoundError:
+                logger.warning("Ontology %s no longer exists in Labelbox, creating it again", template.lb_ontology_id)
+            else:
+                if not template.feature_schema_ids:
+                    template.feature_schema_ids = build_feature_schema_ids(ontology.normalized)
+                    template.save(update_fields=['feature_schema_ids', 'updated_at'])
+                return template, ontology
+
+        name = name or f"ontology-{content_hash[:12]}"
+        with labelbox_call('create_ontology'):
+            ontology = self.client.create_ontology(name, normalized)
+        metadata_cache.set_ontology(ontology)
+        template, _ = OntologyTemplate.objects.update_or_create(
+            content_hash=content_hash,
+            defaults={
+                "name": name,
+                "ontology": normalized,
+                "lb_ontology_id": ontology.uid,
+                "feature_schema_ids": build_feature_schema_ids(ontology.normalized),
+            }
         )
+        return template, ontology
 
-        # Attach ontology to Labelbox project
-        lb_project = self.client.get_project(project.uid)
-        lb_project.connect_ontology(ontology)
+    def get_feature_schemas(self, project):
+        """
+        Name -> feature schema id lookups for a project's ontology.
 
-        return ontology
+        Read from the project's OntologyTemplate; projects provisioned before templates
+        existed fall back to their (cached) Labelbox ontology.
+
+        :param project: The AnnotationProject.
+        :return: FeatureSchemaMap.
+        """
+        template = project.ontology_template
+        if template is not None and template.feature_schema_ids:
+            return FeatureSchemaMap(template.feature_schema_ids)
+        return FeatureSchemaMap(build_feature_schema_ids(self.get_ontology(project.lb_uid).normalized))
 
-    def create_annotation(self, task_id, annotation_data):
-        """Create annotation and sync with Labelbox"""
-        task = AnnotationTask.objects.get(id=task_id)
+    def convert_to_python_annotation(self, annotation, schemas=None):
+        """
+        Convert a Django Annotation object to the Labelbox Python annotation format.
+
+        Tools and classifications are referenced by feature schema id, resolved locally.
 
-        # Create annotation in Django
-        annotation = Annotation.objects.create(
-            task=task,
-            annotation_type=annotation_data['annotation_type'],
-            name=annotation_data['name'],
-            data=annotation_data['data']
+        :param schemas: FeatureSchemaMap of the annotation's project. Looked up if omitted.
+        :raises ValueError: If the annotation does not match the project ontology.
+        """
+        schemas = schemas or self.get_feature_schemas(annotation.task.project)
+        feature_schema_id = schemas.tool(annotation.name)
+        classifications = [
+            schemas.classification_annotation(annotation.name, cls.name, cls.classification_type, cls.value)
+            for cls in annotation.classifications.all()
+        ]
+
+        geometry_data = annotation.geometry_data
+        if annotation.annotation_type == "bounding_box":
+            bbox_data = geometry_data
+            value = lb_types.Rectangle(
+                start=lb_types.Point(x=bbox_data[0].get('left'), y=bbox_data[0].get('top')),
+                end=lb_types.Point(x=bbox_data[0].get('left') + bbox_data[0].get('width'),
+                                   y=bbox_data[0].get('top') + bbox_data[0].get('height'))
+            )
+        elif annotation.annotation_type == "polygon":
+            value = lb_types.Polygon(points=[lb_types.Point(x=pt['x'], y=pt['y']) for pt in geometry_data])
+        elif annotation.annotation_type == "point":
+            point_data = geometry_data[0]
+            value = lb_types.Point(x=point_data.get('x'), y=point_data.get('y'))
+        else:
+            raise ValueError(f"Unsupported annotation type: {annotation.annotation_type}")
+
+        return lb_types.ObjectAnnotation(
+            feature_schema_id=feature_schema_id,
+            value=value,
+            classifications=classifications,
+            extra={"uuid": str(annotation.id)}
         )
 
-        # Create classifications if any
-        if 'classifications' in annotation_data:
-            for class_data in annotation_data['classifications']:
-                Classification.objects.create(
-                    annotation=annotation,
-                    name=class_data['name'],
-                    classification_type=class_data['type'],
-                    value=class_data['value']
-                )
+    def upload_labels(self, labels, project_id):
+        """
+        Upload labels to Labelbox as a single MAL import job.
 
-        # Convert to Labelbox format and upload
-        lb_annotation = self._convert_to_labelbox_format(annotation)
-        self._upload_to_labelbox(task.global_key, lb_annotation)
+        :param labels: List of Labelbox `Label` objects (one per data row), or NDJSON
+            import dicts as built by `NDJsonAnnotationConverter`.
+        :param project_id: The ID of the Labelbox project.
+        :return: Per-annotation error rows reported by Labelbox (empty if none).
+        """
+        with labelbox_call('mal_import'):
+            upload_job = lb.MALPredictionImport.create_from_objects(
+                client=self.client,
+                project_id=project_id,
+                name="mal_job" + str(uuid.uuid4()),
+                predictions=labels
+            )
+            upload_job.wait_till_done()
 
-        return annotation
+        return upload_job.errors
 
-    def _convert_to_labelbox_format(self, annotation):
-        """Convert Django annotation to Labelbox format"""
-        lb_format = {
-            "name": annotation.name + "-ontology",
-            "dataRow": {"globalKey": annotation.task.global_key}
-        }
 
-        # Convert based on annotation type
-        if annotation.annotation_type == 'BBOX':
-            lb_format.update({
-                "bbox": {
-                    "top": annotation.data['top'],
-                    "left": annotation.data['left'],
-                    "height": annotation.data['height'],
-                    "width": annotation.data['width']
-                }
-            })
-        # Add other annotation type conversions here
+class ExportService(LabelboxService):
+    def export_annotations(self, project_id, incremental=True, page_size=None, image_store=None):
+        """
+        Export labels from Labelbox and store them as ExportedAnnotation rows.
 
-        return lb_format
+        In incremental mode only data rows with activity since the project's
+        `last_exported_at` high-water mark are requested. Rows are streamed from the
+        export task and processed a page at a time, never materialized as one list.
 
+        :param project_id: The ID of the Labelbox project.
+        :param incremental: Set to False to re-export every data row in the project.
+        :param page_size: Rows processed per page. Defaults to settings.EXPORT_PAGE_SIZE.
+        :param image_store: ImageStore for the run's image downloads. A new one by default.
+        :return: Number of data rows processed, exported annotations still waiting for
+            their image, and the run's image download stats.
+        """
+        page_size = page_size or settings.EXPORT_PAGE_SIZE
+        local_project = AnnotationProject.objects.filter(lb_uid=project_id).first()
+        since = local_project.last_exported_at if incremental and local_project else None
+        started_at = timezone.now()
+
+        image_store = image_store or ImageStore()
+        processed = 0
+        for page in self._pages(self.iter_export_rows(project_id, since, started_at), page_size):
+            with stage('export.diff'):
+                existing = self._existing_exports(page)
+                changed = [self._process_annotation(row, existing) for row in page]
+
+            # Download the page's images concurrently (stored once per distinct content)
+            with stage('export.images'):
+                images = image_store.fetch_many([image_url for _, image_url, objects in changed if objects])
+
+            with stage('export.save'):
+                self._save_exported_annotations([
+                    ExportedAnnotation(
+                        task_id=task_id,
+                        feature_id=obj["feature_id"],
+                        annotation_name=obj["annotation_name"],
+                        annotation_type=obj["annotation_type"],
+                        annotation_data=obj["annotation_data"],
+                        # Stored even if the download failed: the high-water mark moves past this
+                        # row, so the image is retried by _retry_missing_images instead
+                        image=images[image_url],
+                        image_url=image_url,
+                        image_attempts=0 if images[image_url] is not None else 1,
+                        project_lb_uid=project_id
+                    )
+                    for task_id, image_url, objects in changed if objects
+                    for obj in objects
+                ])
+            processed += len(page)
+
+        with stage('export.retry_images'):
+            missing_images = self._retry_missing_images(project_id, image_store, started_at)
+
+        # Only move the high-water mark once the whole window has been stored
+        if local_project is not None:
+            local_project.last_exported_at = started_at
+            local_project.save(update_fields=['last_exported_at', 'updated_at'])
+
+        downloads = image_store.stats.as_dict()
+        logger.info("Exported %s data rows for project %s, image downloads: %s", processed, project_id, downloads)
+        return {"rows": processed, "missing_images": missing_images, "downloads": downloads}
+
+    def iter_export_rows(self, project_id, since=None, until=None):
+        """
+        Stream exported data rows (one JSON dict per data row) for a project.
 
-class ExportService(LabelboxService):
-    def export_annotations(self, project_id):
+        :param since: Only include data rows with label activity after this datetime.
+        :param until: Upper bound for the activity window, defaults to now.
+        """
         # Retrieve the project
-        project = self.client.get_project(project_id)
+        project = self.get_project(project_id)
 
-        # Set export parameters
+        # Only what _process_annotation reads: label objects and the data row itself
         export_params = {
-            "attachments": True,
-            "metadata_fields": True,
-            "data_row_details": True,
-            "project_details": True,
-            "label_details": True,
-        }
-        filters = {
-            "workflow_status": "Done"  # Only export completed tasks
+            "attachments": False,
+            "metadata_fields": False,
+            "data_row_details": False,
+            "project_details": False,
+            "label_details": False,
+            "performance_details": False,
         }
+        filters = {}
+        if since is not None:
+            filters["last_activity_at"] = [
+                self._export_datetime(since),
+                self._export_datetime(until or timezone.now())
+            ]
 
         # Start export task
-        export_task = project.export_v2(params=export_params)
-        export_task.wait_till_done()
+        with labelbox_call('export'):
+            export_task = project.export(params=export_params, filters=filters)
+            export_task.wait_till_done()
+
+        if export_task.has_errors():
+            errors = [error.json for error in export_task.get_buffered_stream(stream_type=lb.StreamType.ERRORS)]
+            raise Exception(f"Export errors: {errors}")
+
+        if not export_task.has_result():
+            return
+
+        for output in export_task.get_buffered_stream(stream_type=lb.StreamType.RESULT):
+            yield output.json
+
+    @staticmethod
+    def _export_datetime(value):
+        # ISO 8601 in UTC, one of the formats accepted by Labelbox export filters
+        return value.astimezone(dt_timezone.utc).strftime("%Y-%m-%dT%H:%M:%S%z")
+
+    @staticmethod
+    def _pages(rows, page_size):
+        rows = iter(rows)
+        while True:
+            page = list(islice(rows, page_size))
+            if not page:
+                return
+            yield page
+
+    def _existing_exports(self, rows):
+        """Map of (data row id, feature id) -> stored annotation_data for one page of rows."""
+        task_ids = [row["data_row"]["id"] for row in rows]
+        return {
+            (task_id, feature_id): annotation_data
+            for task_id, feature_id, annotation_data in ExportedAnnotation.objects.filter(
+                task_id__in=task_ids
+            ).values_list('task_id', 'feature_id', 'annotation_data')
+        }
 
-        if export_task.errors:
-            raise Exception(f"Export errors: {export_task.errors}")
+    def _save_exported_annotations(self, exported):
+        """Insert new objects and update changed ones in a few bulk round-trips."""
+        if not exported:
+            return
+        ExportedAnnotation.objects.bulk_create(
+            exported,
+            batch_size=EXPORTED_ANNOTATION_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['task_id', 'feature_id'],
+            update_fields=[
+                'annotation_name', 'annotation_type', 'annotation_data', 'image', 'image_url', 'image_attempts',
+                'project_lb_uid', 'updated_at'
+            ]
+        )
 
-        # Process exported JSON
-        annotations = export_task.result
-        for annotation in annotations:
-            self._process_annotation(annotation)
+    @staticmethod
+    def _retry_missing_images(project_id, image_store, started_at):
+        """
+        Download again the images of the project's exported annotations stored without
+        one by earlier runs, up to EXPORT_IMAGE_RETRY_LIMIT distinct URLs. A URL is given
+        up on after EXPORT_IMAGE_MAX_ATTEMPTS failed downloads.
+
+        :param started_at: Start of this run; rows it stored already had their download now.
+        :return: Number of the project's exported annotations still without an image.
+        """
+        missing = ExportedAnnotation.objects.filter(project_lb_uid=project_id, image__isnull=True).exclude(image_url='')
+        retry = missing.filter(image_attempts__lt=settings.EXPORT_IMAGE_MAX_ATTEMPTS, updated_at__lt=started_at)
+        urls = list(
+            retry.order_by().values_list('image_url', flat=True).distinct()[
+                :settings.EXPORT_IMAGE_RETRY_LIMIT
+            ]
+        )
+        now = timezone.now()
+        for url, blob in image_store.fetch_many(urls).items():
+            if blob is not None:
+                missing.filter(image_url=url).update(image=blob, image_attempts=0, updated_at=now)
+            else:
+                missing.filter(image_url=url).update(image_attempts=F('image_attempts') + 1, updated_at=now)
+        return missing.count()
+
+    def _process_annotation(self, annotation, existing):
+        """
+        Collect the changed annotation objects of one exported data row.
 
-    def _process_annotation(self, annotation):
+        :param annotation: One data row from the export stream.
+        :param existing: Output of `_existing_exports` for the current page. Objects whose
+            stored data is unchanged are skipped, so a data row with no changes needs no
+            image download.
+        :return: Tuple of (data row id, image url, list of changed objects).
+        """
         # Extract relevant data row details
         data_row = annotation["data_row"]
         task_id = data_row["id"]
@@ -265,29 +568,15 @@ class ExportService(LabelboxService):
         for label in labels:
             annotation_objects = label.get("annotations", {}).get("objects", [])
             for obj in annotation_objects:
-                annotation_name = obj["name"]
-                annotation_type = obj["annotation_kind"]
-                annotation_data = obj  # Complete object data for JSONField
+                if existing.get((task_id, obj["feature_id"])) == obj:
+                    continue
 
                 # Append annotation to the list
                 annotations.append({
-                    "annotation_name": annotation_name,
-                    "annotation_type": annotation_type,
-                    "annotation_data": annotation_data
+                    "feature_id": obj["feature_id"],
+                    "annotation_name": obj["name"],
+                    "annotation_type": obj["annotation_kind"],
+                    "annotation_data": obj  # Complete object data for JSONField
                 })
 
-        # Download the image
-        response = requests.get(image_url)
-        if response.status_code == 200:
-            image_content = ContentFile(response.content)
-            image_name = os.path.basename(image_url)
-
-            # Save each annotation in the database
-            for annotation in annotations:
-                ExportedAnnotation.objects.create(
-                    task_id=task_id,
-                    annotation_name=annotation["annotation_name"],
-                    annotation_type=annotation["annotation_type"],
-                    annotation_data=annotation["annotation_data"],
-                    image_file=image_content
-                )
+        return task_id, image_url, annotations
@@ -0,0 +1,24 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .metrics import count_request_query
+from .models import Annotation
+from .spatial import invalidate_task_index
+
+
+@receiver(post_save, sender=Annotation)
+@receiver(post_delete, sender=Annotation)
+def drop_task_spatial_index(sender, instance, **kwargs):
+    """The cached index of the task is stale once one of its annotations changes."""
+    invalidate_task_index(instance.task_id)
+
+
+@receiver(connection_created)
+def install_request_query_counter(sender, connection, **kwargs):
+    """
+    Every connection reports its queries to the request that runs them. The signal fires
+    again each time a closed connection reconnects, so the wrapper is only added once.
+    """
+    if count_request_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_request_query)
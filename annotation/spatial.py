@@ -0,0 +1,117 @@
+import threading
+
+import numpy as np
+import shapely
+from cachetools import LRUCache
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .geometry import INVALID_DATA_ERRORS
+from .models import Annotation
+
+
+def annotation_shape(annotation):
+    """
+    Shapely geometry of an annotation (its first box/point, like the upload path).
+
+    :return: A shapely geometry, or None if the annotation has no usable coordinates.
+    """
+    try:
+        coordinates = annotation.coordinates
+        if annotation.annotation_type == 'bounding_box':
+            left, top, width, height = coordinates[0]
+            return shapely.box(min(left, left + width), min(top, top + height),
+                               max(left, left + width), max(top, top + height))
+        if annotation.annotation_type == 'point':
+            return shapely.Point(coordinates[0])
+        if annotation.annotation_type == 'polygon':
+            return shapely.make_valid(shapely.Polygon(coordinates))
+    except INVALID_DATA_ERRORS:
+        pass
+    return None
+
+
+def iou(left, right):
+    """Element-wise intersection over union of geometry arrays (NaN where the union has no area)."""
+    union = shapely.area(shapely.union(left, right))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(union > 0, shapely.area(shapely.intersection(left, right)) / union, np.nan)
+
+
+class TaskSpatialIndex:
+    """STRtree over the annotations of one task, for region and overlap queries."""
+
+    def __init__(self, annotations, version=None):
+        shapes = [(annotation, annotation_shape(annotation)) for annotation in annotations]
+        shapes = [(annotation, shape) for annotation, shape in shapes if shape is not None]
+        self.annotations = [annotation for annotation, _ in shapes]
+        self.geometries = np.array([shape for _, shape in shapes], dtype=object)
+        self.tree = shapely.STRtree(self.geometries)
+        self.version = version
+
+    def query(self, region):
+        """
+        Annotations intersecting a region.
+
+        :param region: A shapely geometry.
+        :return: List of (Annotation, IoU with the region or None) sorted by IoU, highest first.
+        """
+        hits = self.tree.query(region, predicate='intersects')
+        scores = iou(self.geometries[hits], region)
+        matches = [
+            (self.annotations[hit], None if np.isnan(score) else float(score))
+            for hit, score in zip(hits.tolist(), scores.tolist())
+        ]
+        return sorted(matches, key=lambda match: -1 if match[1] is None else match[1], reverse=True)
+
+    def overlapping_pairs(self, min_iou):
+        """
+        Pairs of annotations whose IoU is at least `min_iou`.
+
+        One bulk STRtree query finds the candidate pairs (O(n log n) plus the number of
+        intersecting pairs) and their IoUs are computed together, instead of comparing
+        every pair of annotations.
+
+        :return: List of (Annotation, Annotation, IoU).
+        """
+        if len(self.geometries) < 2:
+            return []
+        left, right = self.tree.query(self.geometries, predicate='intersects')
+        pairs = left < right  # each unordered pair once, no self matches
+        left, right = left[pairs], right[pairs]
+        scores = iou(self.geometries[left], self.geometries[right])
+        keep = scores >= min_iou  # NaN (points, lines) never passes
+        return [
+            (self.annotations[a], self.annotations[b], float(score))
+            for a, b, score in zip(left[keep].tolist(), right[keep].tolist(), scores[keep].tolist())
+        ]
+
+
+# task id -> TaskSpatialIndex, shared by the requests of one process
+_indexes = LRUCache(maxsize=settings.SPATIAL_INDEX_CACHE_SIZE)
+_indexes_lock = threading.Lock()
+
+
+def _task_version(task_id):
+    # Changes whenever an annotation of the task is added, saved or deleted, in any process
+    version = Annotation.objects.filter(task_id=task_id).aggregate(count=Count('id'), updated=Max('updated_at'))
+    return version['count'], version['updated']
+
+
+def get_task_index(task_id):
+    """Spatial index of a task's annotations, rebuilt only when they changed."""
+    version = _task_version(task_id)
+    with _indexes_lock:
+        index = _indexes.get(task_id)
+    if index is not None and index.version == version:
+        return index
+
+    index = TaskSpatialIndex(Annotation.objects.filter(task_id=task_id), version)
+    with _indexes_lock:
+        _indexes[task_id] = index
+    return index
+
+
+def invalidate_task_index(task_id):
+    with _indexes_lock:
+        _indexes.pop(task_id, None)
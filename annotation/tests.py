@@ -1,3 +1,1187 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Count, Max, Q
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from shapely.geometry import Polygon
+
+from .clients import LabelboxMetadataCache, metadata_cache, reset_clients, set_client
+from .dispatch import claim_next_task, release_expired_leases
+from .fake_labelbox import FakeDataset, FakeImageSession, FakeLabelboxClient, FakeMALPredictionImport
+from .geometry import normalize_geometry
+from .images import ImageDownloader, ImageStore
+from .importing import DataRowImporter, ManifestImporter
+from .jobs import JOB_HANDLERS, claim_next_job, enqueue, flush_uploads, run_job
+from .metrics import count_request_query, labelbox_call, serve_metrics
+from .models import (
+    Annotation, AnnotationProject, AnnotationTask, Classification, DataRowIndex, DatasetIndexWatermark,
+    ExportedAnnotation, ImageBlob, ImageImport, ImageSource, OntologyTemplate, SyncJob
+)
+from .ontology import FeatureSchemaMap
+from .provisioning import ProjectProvisioner
+from .services import ExportService, LabelboxService
+from .spatial import TaskSpatialIndex, get_task_index
+from .views import AnnotationTaskListView
+
+
+@skipUnless(connection.vendor == 'postgresql', "Query plans are only checked on PostgreSQL")
+class HotQueryPlanTests(TestCase):
+    """
+    EXPLAIN the queries on hot paths and fail if any of them reads a table with a
+    sequential scan, i.e. if the index it relies on is missing or no longer matches.
+
+    Sequential scans are disabled for the planner first: on these tiny test tables a
+    seq scan would otherwise be cheapest, and with it off the planner still falls
+    back to one when no usable index exists.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = AnnotationProject.objects.create(name="plan-test", lb_uid="plan-test")
+        cls.task = AnnotationTask.objects.create(
+            project=cls.project, global_key="plan-test-1", image_url="https://example.com/1.jpg"
+        )
+        Annotation.objects.create(task=cls.task, name="bounding_box", data=[])
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertIndexed(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn("Seq Scan", plan, f"Sequential scan in plan for:\n{queryset.query}\n\n{plan}")
+
+    def test_tasks_by_project_and_status(self):
+        self.assertIndexed(AnnotationTask.objects.filter(project=self.project, status='COMPLETED'))
+
+    def test_next_pending_task(self):
+        self.assertIndexed(
+            AnnotationTask.objects.filter(project=self.project, status='PENDING').order_by('created_at')[:1]
+        )
+
+    def test_task_list_page(self):
+        now = timezone.now()
+        self.assertIndexed(
+            AnnotationTask.objects.filter(project=self.project)
+            .filter(Q(created_at__lt=now) | Q(created_at=now, id__lt=self.task.id))
+            .order_by('-created_at', '-id')[:101]
+        )
+
+    def test_project_list_page(self):
+        self.assertIndexed(AnnotationProject.objects.order_by('-created_at', '-id')[:25])
+
+    def test_annotations_by_task(self):
+        self.assertIndexed(Annotation.objects.filter(task=self.task))
+        # Per-task counts (task list) and the spatial index version check
+        self.assertIndexed(
+            Annotation.objects.filter(task=self.task).values('task').annotate(count=Count('id'), updated=Max('updated_at'))
+        )
+
+    def test_unsynced_annotations(self):
+        stale_before = timezone.now() - timedelta(minutes=10)
+        self.assertIndexed(
+            Annotation.objects.filter(
+                Q(sync_status='PENDING') | Q(sync_status='SYNCING', updated_at__lt=stale_before)
+            ).order_by('updated_at')[:500]
+        )
+
+    def test_exported_annotations_by_task(self):
+        self.assertIndexed(ExportedAnnotation.objects.filter(task_id__in=["data-row-1", "data-row-2"]))
+
+    def test_due_sync_jobs(self):
+        now = timezone.now()
+        self.assertIndexed(
+            SyncJob.objects.filter(
+                Q(status='QUEUED', run_after__lte=now) | Q(status='RUNNING', locked_until__lt=now)
+            ).order_by('run_after')[:1]
+        )
+
+    def test_queued_job_by_dedupe_key(self):
+        self.assertIndexed(SyncJob.objects.filter(dedupe_key=f"export:{self.project.lb_uid}", status='QUEUED'))
+
+    def test_data_row_index_by_project(self):
+        self.assertIndexed(DataRowIndex.objects.filter(project_lb_uid=self.project.lb_uid))
+
+
+class FakeLabelboxTestCase(TestCase):
+    """
+    Runs against an in-memory FakeLabelboxClient holding one project with the default
+    ontology, mirrored by `self.project`.
+    """
+
+    def setUp(self):
+        self.fake = FakeLabelboxClient(seed=0)
+        set_client(self.fake)
+        self.addCleanup(reset_clients)
+        mal_import = mock.patch('labelbox.MALPredictionImport', FakeMALPredictionImport)
+        mal_import.start()
+        self.addCleanup(mal_import.stop)
+
+        self.lb_project = self.fake.create_project(name="test")
+        self.dataset = self.fake.create_dataset(name="test")
+        template, ontology = LabelboxService().get_or_create_ontology(
+            LabelboxService.default_ontology_builder().asdict()
+        )
+        self.lb_project.connect_ontology(ontology)
+        self.project = AnnotationProject.objects.create(
+            name="test", lb_uid=self.lb_project.uid, ontology_template=template, provisioning_status='READY'
+        )
+
+    def make_task(self, global_key, **fields):
+        """A task whose data row exists in the fake project."""
+        self.dataset.create_data_rows([{"row_data": f"https://images.example.com/{global_key}.jpg",
+                                        "global_key": global_key}])
+        self.lb_project.create_batches_from_dataset("test", self.dataset.uid)
+        return AnnotationTask.objects.create(
+            project=self.project, global_key=global_key,
+            image_url=f"https://images.example.com/{global_key}.jpg", **fields
+        )
+
+    def make_annotation(self, task, name="bounding_box", data=None, **fields):
+        return Annotation.objects.create(
+            task=task, name=name, annotation_type='bounding_box',
+            data=data if data is not None else [{"left": 1, "top": 2, "width": 30, "height": 40}], **fields
+        )
+
+    def run_next_job(self, job_type):
+        job = claim_next_job([job_type])
+        self.assertIsNotNone(job, f"No {job_type} job is due")
+        return run_job(job)
+
+
+class UploadAnnotationsJobTests(FakeLabelboxTestCase):
+    def enqueue_upload(self, *annotations):
+        return enqueue('UPLOAD_ANNOTATIONS', {'annotation_ids': [str(a.id) for a in annotations]})
+
+    def test_uploads_annotations_of_all_tasks(self):
+        annotations = [self.make_annotation(self.make_task(f"upload-{i}")) for i in range(3)]
+        self.enqueue_upload(*annotations)
+
+        job = self.run_next_job('UPLOAD_ANNOTATIONS')
+
+        self.assertEqual(job.status, 'SUCCEEDED')
+        self.assertEqual(set(job.result["annotations"].values()), {'SYNCED'})
+        self.assertEqual(sum(len(labels) for labels in self.lb_project._labels.values()), 3)
+        self.assertTrue(SyncJob.objects.filter(job_type='EXPORT_PROJECT', status='QUEUED').exists())
+
+    def test_rejected_annotations_fail_the_job(self):
+        annotation = self.make_annotation(
+            self.make_task("rejected"), data=[{"left": 1, "top": 2, "width": 0, "height": 0}]
+        )
+        self.enqueue_upload(annotation)
+
+        job = self.run_next_job('UPLOAD_ANNOTATIONS')
+
+        self.assertEqual(job.status, 'FAILED')
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("has no area", job.result["failed"][str(annotation.id)])
+
+    def test_import_error_uses_up_a_retry(self):
+        annotation = self.make_annotation(self.make_task("flaky"))
+        self.enqueue_upload(annotation)
+        self.fake.error_rate = 1.0
+
+        job = self.run_next_job('UPLOAD_ANNOTATIONS')
+
+        self.assertEqual((job.status, job.attempts), ('QUEUED', 1))
+        annotation.refresh_from_db()
+        self.assertEqual(annotation.sync_status, 'PENDING')
+
+    def test_annotations_syncing_elsewhere_reschedule_without_an_attempt(self):
+        annotation = self.make_annotation(self.make_task("elsewhere"), sync_status='SYNCING')
+        self.enqueue_upload(annotation)
+
+        job = self.run_next_job('UPLOAD_ANNOTATIONS')
+
+        self.assertEqual((job.status, job.attempts), ('QUEUED', 0))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(self.lb_project._labels, {})
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ExportTests(FakeLabelboxTestCase):
+    def label(self, task, feature_id, left=1, updated_at=None):
+        self.lb_project.add_label(task.global_key, {
+            "feature_id": feature_id,
+            "name": "bounding_box",
+            "annotation_kind": "ImageBoundingBox",
+            "bounding_box": {"top": 2, "left": left, "height": 30, "width": 40},
+        }, updated_at)
+
+    def export(self, failing=(), incremental=True):
+        image_store = ImageStore(ImageDownloader(session=FakeImageSession(failing=failing)))
+        return ExportService().export_annotations(self.lb_project.uid, incremental, None, image_store)
+
+    def test_failed_image_download_is_retried_by_the_next_export(self):
+        task = self.make_task("export-1")
+        self.label(task, "feature-1", updated_at=timezone.now() - timedelta(hours=1))
+
+        result = self.export(failing={task.image_url})
+
+        exported = ExportedAnnotation.objects.get(feature_id="feature-1")
+        self.assertIsNone(exported.image)
+        self.assertEqual(result["missing_images"], 1)
+
+        # Nothing new in Labelbox: the incremental window is empty, the image is still fetched
+        result = self.export()
+
+        self.assertEqual(result["rows"], 0)
+        self.assertEqual(result["missing_images"], 0)
+        exported.refresh_from_db()
+        self.assertIsNotNone(exported.image)
+
+    @override_settings(EXPORT_IMAGE_MAX_ATTEMPTS=2)
+    def test_dead_image_urls_are_given_up_on(self):
+        task = self.make_task("export-dead")
+        self.label(task, "feature-dead", updated_at=timezone.now() - timedelta(hours=1))
+
+        attempts = []
+        for _ in range(3):
+            result = self.export(failing={task.image_url})
+            attempts.append(ExportedAnnotation.objects.get(feature_id="feature-dead").image_attempts)
+
+        self.assertEqual(attempts, [1, 2, 2])
+        self.assertEqual(result["downloads"]["requested"], 0)
+        self.assertEqual(result["missing_images"], 1)
+
+    def test_only_the_exported_project_is_retried(self):
+        ExportedAnnotation.objects.create(
+            task_id="other-row", feature_id="other-feature", annotation_name="bounding_box",
+            annotation_type="ImageBoundingBox", annotation_data={}, project_lb_uid="other-project",
+            image_url="https://images.example.com/other.jpg", image_attempts=1,
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+
+        result = self.export()
+
+        self.assertEqual((result["downloads"]["requested"], result["missing_images"]), (0, 0))
+
+    def test_upserts_changed_objects_on_the_natural_key(self):
+        task = self.make_task("export-2")
+        self.label(task, "feature-2", left=1)
+        self.export(incremental=False)
+        self.label(task, "feature-2", left=5)
+
+        self.export(incremental=False)
+
+        exported = ExportedAnnotation.objects.get(feature_id="feature-2")
+        self.assertEqual(exported.annotation_data["bounding_box"]["left"], 5)
+        self.assertEqual(ExportedAnnotation.objects.count(), 1)
+
+    def test_unchanged_objects_are_not_written_or_downloaded_again(self):
+        task = self.make_task("export-3")
+        self.label(task, "feature-3")
+        self.export(incremental=False)
+        before = ExportedAnnotation.objects.get(feature_id="feature-3").updated_at
+
+        result = self.export(incremental=False)
+
+        self.assertEqual(result["downloads"]["requested"], 0)
+        self.assertEqual(ExportedAnnotation.objects.get(feature_id="feature-3").updated_at, before)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImageStoreTests(TestCase):
+    urls = [f"https://images.example.com/store/{index}.jpg" for index in range(10)]
+
+    def store(self, failing=()):
+        return ImageStore(ImageDownloader(session=FakeImageSession(failing=failing)))
+
+    def test_a_batch_is_stored_with_a_fixed_number_of_queries(self):
+        # Sources and blobs read, new blobs inserted and read back, sources upserted
+        with self.assertNumQueries(5):
+            blobs = self.store(failing={self.urls[0]}).fetch_many(self.urls)
+
+        self.assertIsNone(blobs[self.urls[0]])
+        self.assertEqual(ImageBlob.objects.count(), 9)
+        self.assertEqual(
+            set(ImageSource.objects.values_list('url', 'blob_id')),
+            {(url, blob.id) for url, blob in blobs.items() if blob is not None}
+        )
+
+    def test_unchanged_images_are_revalidated_not_stored_again(self):
+        first = self.store().fetch_many(self.urls)
+        store = self.store()
+
+        with self.assertNumQueries(1):
+            second = store.fetch_many(self.urls)
+
+        self.assertEqual(second, first)
+        self.assertEqual(store.stats.not_modified, len(self.urls))
+        self.assertEqual(ImageBlob.objects.count(), len(self.urls))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DataRowIndexTests(FakeLabelboxTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project.lb_dataset_uid = self.dataset.uid
+        self.project.save()
+
+    def add_rows(self, *global_keys):
+        self.dataset.create_data_rows([{"row_data": f"https://images.example.com/{key}.jpg", "global_key": key}
+                                       for key in global_keys])
+
+    def refresh(self):
+        output = io.StringIO()
+        call_command('refresh_data_row_index', dataset_ids=[self.dataset.uid], stdout=output)
+        return output.getvalue()
+
+    def test_refresh_only_reads_rows_after_the_watermark(self):
+        self.add_rows("first", "second")
+
+        self.assertIn("Indexed 2 data rows", self.refresh())
+        watermark = DatasetIndexWatermark.objects.get(dataset_id=self.dataset.uid)
+        self.assertEqual(watermark.last_row_created_at, self.fake._data_rows["second"].created_at)
+        self.assertCountEqual(LabelboxService().get_existing_data_row_keys(self.lb_project.uid), ["first", "second"])
+
+        self.add_rows("third")
+        first_indexed_at = DataRowIndex.objects.get(global_key="first").updated_at
+
+        self.assertIn("Indexed 1 data rows", self.refresh())
+        self.assertEqual(DataRowIndex.objects.get(global_key="first").updated_at, first_indexed_at)
+        self.assertEqual(DataRowIndex.objects.get(global_key="third").project_lb_uid, self.lb_project.uid)
+        self.assertIn("Indexed 0 data rows", self.refresh())
+
+    def test_check_data_row_exists_indexes_a_missing_row_once(self):
+        self.add_rows("unindexed")
+        service = LabelboxService()
+
+        self.assertTrue(service.check_dataRow_exists("unindexed", self.lb_project.uid))
+        calls = self.fake.calls
+        self.assertTrue(service.check_dataRow_exists("unindexed", self.lb_project.uid))
+        self.assertFalse(service.check_dataRow_exists("unindexed", "another-project"))
+        self.assertFalse(service.check_dataRow_exists("unknown", self.lb_project.uid))
+
+        self.assertEqual(self.fake.calls, calls + 1)  # only the lookup of the unknown key
+        self.assertEqual(DataRowIndex.objects.get(global_key="unindexed").dataset_id, self.dataset.uid)
+
+
+@override_settings(DATA_ROW_IMPORT_CHUNK_SIZE=2, DATA_ROW_IMPORT_WORKERS=1)
+class ImageImportResumeTests(FakeLabelboxTestCase):
+    ROWS = 5
+
+    def setUp(self):
+        super().setUp()
+        self.content = "image_url\n" + "".join(f"https://images.example.com/{i}.jpg\n" for i in range(self.ROWS))
+        self.uploaded = []
+        create_data_rows = FakeDataset.create_data_rows
+
+        def fail_second_chunk(dataset, items):
+            self.uploaded.append([item["row_data"] for item in items])
+            if len(self.uploaded) == 2:
+                raise RuntimeError("Connection reset")
+            return create_data_rows(dataset, items)
+
+        patcher = mock.patch.object(FakeDataset, 'create_data_rows', fail_second_chunk)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertImportedOnce(self, image_import):
+        self.assertEqual(image_import.status, 'COMPLETED')
+        self.assertEqual((image_import.rows_done, image_import.rows_created), (self.ROWS, self.ROWS))
+        image_urls = [url for chunk in self.uploaded for url in chunk]
+        # The failed chunk is sent again, nothing else is
+        self.assertEqual(len(image_urls), self.ROWS + 2)
+        self.assertEqual(self.uploaded[2], self.uploaded[1])
+        self.project.refresh_from_db()
+        self.assertEqual(len(self.fake.get_dataset(self.project.lb_dataset_uid)._data_rows), self.ROWS)
+        self.assertEqual(AnnotationTask.objects.filter(project=self.project).count(), self.ROWS)
+
+    def test_command_resumes_after_the_last_checkpoint(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as manifest:
+            manifest.write(self.content)
+            manifest.flush()
+
+            with self.assertRaisesMessage(RuntimeError, "Connection reset"):
+                call_command('import_images', str(self.project.id), manifest.name, stdout=io.StringIO())
+            image_import = ImageImport.objects.get(project=self.project)
+            self.assertEqual((image_import.status, image_import.rows_done), ('FAILED', 2))
+
+            output = io.StringIO()
+            call_command('import_images', str(self.project.id), manifest.name, stdout=output)
+
+        self.assertIn(f"Resuming import {image_import.id} after row 2", output.getvalue())
+        image_import.refresh_from_db()
+        self.assertImportedOnce(image_import)
+
+    def test_uploaded_manifest_resumes_when_the_job_is_retried(self):
+        response = self.client.post(reverse('image_import', kwargs={'project_id': self.project.id}),
+                                    data={"manifest": ContentFile(self.content, name="images.csv")})
+        self.assertEqual(response.status_code, 202, response.content)
+        status_url = response.json()["status_url"]
+
+        job = self.run_next_job('IMPORT_IMAGES')
+        self.assertEqual(job.status, 'QUEUED')
+        self.assertEqual(self.client.get(status_url).json()["rows_done"], 2)
+
+        SyncJob.objects.filter(id=job.id).update(run_after=timezone.now())
+        self.assertEqual(self.run_next_job('IMPORT_IMAGES').status, 'SUCCEEDED')
+        self.assertImportedOnce(ImageImport.objects.get(id=response.json()["import_id"]))
+
+
+class ProvisioningTests(FakeLabelboxTestCase):
+    def manifest(self, project, name, rows):
+        content = "image_url\n" + "".join(f"https://images.example.com/{name}/{i}.jpg\n" for i in range(rows))
+        return ImageImport.objects.create(
+            project=project, manifest=ContentFile(content, name=f"{name}.csv"), file_format='CSV'
+        )
+
+    def lb_global_keys(self, project):
+        return set(self.fake.get_project(project.lb_uid)._data_rows)
+
+    def test_provisions_project_one_step_at_a_time(self):
+        project = AnnotationProject.objects.create(name="provisioned")
+        self.manifest(project, "initial", 3)
+
+        statuses = []
+        while not statuses or statuses[-1] != 'READY':
+            statuses.append(ProjectProvisioner().advance(project))
+
+        self.assertEqual(statuses, ['ONTOLOGY_READY', 'DATA_IMPORTED', 'READY'])
+        self.assertIsNotNone(project.ontology_template)
+        self.assertEqual(self.lb_global_keys(project), set(
+            AnnotationTask.objects.filter(project=project).values_list('global_key', flat=True)
+        ))
+
+    def test_images_imported_into_a_ready_project_are_batched_into_it(self):
+        project = AnnotationProject.objects.create(name="ready")
+        while ProjectProvisioner().advance(project) != 'READY':
+            pass
+
+        ManifestImporter(LabelboxService()).run(self.manifest(project, "later", 4))
+
+        global_keys = set(AnnotationTask.objects.filter(project=project).values_list('global_key', flat=True))
+        self.assertEqual(len(global_keys), 4)
+        self.assertEqual(self.lb_global_keys(project), global_keys)
+
+    def test_rejected_data_rows_are_not_dispatched_until_imported(self):
+        rows = [{"row_data": "https://images.example.com/rejected.jpg", "global_key": "rejected"}]
+        self.fake.row_failure_rate = 1.0
+        DataRowImporter(LabelboxService()).run(self.project, rows)
+        task = AnnotationTask.objects.get(global_key="rejected")
+        self.assertNotEqual(task.import_error, '')
+        self.assertIsNone(claim_next_task(self.project, "annotator"))
+
+        self.fake.row_failure_rate = 0.0
+        DataRowImporter(LabelboxService()).run(self.project, rows)
+
+        self.assertEqual(claim_next_task(self.project, "annotator"), task)
+
+
+class OntologyTemplateTests(FakeLabelboxTestCase):
+    def get_or_create_default(self, schema=None):
+        return LabelboxService().get_or_create_ontology(schema or LabelboxService.default_ontology_builder().asdict())
+
+    @staticmethod
+    def tool_schema_id(ontology, name):
+        return next(tool["featureSchemaId"] for tool in ontology.normalized["tools"] if tool["name"] == name)
+
+    def test_projects_with_the_same_schema_share_one_ontology(self):
+        ontologies = len(self.fake._ontologies)
+        other_project = self.fake.create_project(name="other")
+
+        ontology = LabelboxService().create_ontology(other_project)
+        # Same content with its keys in another order hashes the same
+        schema = LabelboxService.default_ontology_builder().asdict()
+        template, reused = self.get_or_create_default(dict(reversed(list(schema.items()))))
+
+        self.assertEqual(len(self.fake._ontologies), ontologies)
+        self.assertIs(reused, ontology)
+        self.assertIs(other_project.ontology(), self.lb_project.ontology())
+        self.assertEqual(template, self.project.ontology_template)
+        self.assertEqual(OntologyTemplate.objects.count(), 1)
+
+    def test_ontology_deleted_in_labelbox_is_created_again(self):
+        del self.fake._ontologies[self.project.ontology_template.lb_ontology_id]
+        reset_clients()
+        set_client(self.fake)
+
+        with self.assertLogs('annotation.services', level='WARNING'):
+            template, ontology = self.get_or_create_default()
+
+        self.assertIn(ontology.uid, self.fake._ontologies)
+        self.assertEqual(template.lb_ontology_id, ontology.uid)
+        self.assertEqual(FeatureSchemaMap(template.feature_schema_ids).tool("bounding_box"),
+                         self.tool_schema_id(ontology, "bounding_box"))
+        self.assertEqual(OntologyTemplate.objects.count(), 1)
+
+    def test_reused_template_gets_its_feature_schema_ids_filled_in(self):
+        OntologyTemplate.objects.update(feature_schema_ids={})
+
+        template, ontology = self.get_or_create_default()
+
+        template.refresh_from_db()
+        self.assertEqual(FeatureSchemaMap(template.feature_schema_ids).tool("polygon"),
+                         self.tool_schema_id(ontology, "polygon"))
+
+
+class MetadataCacheTests(FakeLabelboxTestCase):
+    def test_projects_are_fetched_again_after_the_ttl(self):
+        cache = LabelboxMetadataCache(ttl=0.05)
+        calls = self.fake.calls
+
+        self.assertIs(cache.get_project(self.fake, self.lb_project.uid), self.lb_project)
+        cache.get_project(self.fake, self.lb_project.uid)
+        self.assertEqual(self.fake.calls, calls + 1)
+
+        time.sleep(0.1)
+        cache.get_project(self.fake, self.lb_project.uid)
+        self.assertEqual(self.fake.calls, calls + 2)
+
+    def test_connecting_an_ontology_invalidates_the_cached_one(self):
+        other = self.fake.create_ontology("other", {"tools": [{"tool": "point", "name": "point"}]})
+        self.lb_project.connect_ontology(other)
+        service = LabelboxService()
+        self.assertIs(service.get_ontology(self.lb_project.uid), other)
+        calls = self.fake.calls
+        self.assertIs(service.get_ontology(self.lb_project.uid), other)
+        self.assertEqual(self.fake.calls, calls)
+
+        default = service.create_ontology(self.lb_project)
+
+        self.assertIsNot(default, other)
+        self.assertIs(service.get_ontology(self.lb_project.uid), default)
+        self.assertIs(metadata_cache.get_ontology(self.fake, self.lb_project.uid), default)
+
+
+class FeatureSchemaMapTests(FakeLabelboxTestCase):
+    def setUp(self):
+        super().setUp()
+        self.schemas = FeatureSchemaMap(self.project.ontology_template.feature_schema_ids)
+
+    def test_resolves_top_level_classifications_of_the_default_ontology(self):
+        self.schemas.validate("bounding_box", [
+            ("text_question", "TEXT", "a note"),
+            ("radio_question", "RADIO", "option1"),
+            ("checklist_question", "CHECKLIST", ["option1", "option2"]),
+        ])
+        self.assertTrue(self.schemas.is_global("bounding_box", "text_question"))
+
+    def test_rejects_unknown_names_and_options(self):
+        for classification in [("missing", "TEXT", "x"), ("radio_question", "RADIO", "option3")]:
+            with self.assertRaises(ValueError):
+                self.schemas.validate("bounding_box", [classification])
+        with self.assertRaises(ValueError):
+            self.schemas.validate("ellipse", [])
+
+    def test_top_level_classifications_are_uploaded_as_label_level_rows(self):
+        annotation = self.make_annotation(self.make_task("classified"))
+        Classification.objects.create(
+            annotation=annotation, name="radio_question", classification_type="RADIO", value="option2"
+        )
+
+        summary = flush_uploads([annotation.id])
+
+        self.assertEqual(summary["synced"], [str(annotation.id)])
+        [label] = self.lb_project._labels["classified"]
+        self.assertEqual(label[1]["classifications"], [])
+        [row] = self.lb_project._classifications["classified"].values()
+        radio = self.schemas.classification("bounding_box", "radio_question")
+        self.assertEqual(row["schemaId"], radio["schema_id"])
+        self.assertEqual(row["answer"], {"schemaId": radio["options"]["option2"]})
+
+    def test_annotate_accepts_classifications_of_the_annotate_page(self):
+        task = self.make_task("annotate-classified")
+        response = self.client.post(
+            reverse('task-annotate', kwargs={'task_id': task.id}),
+            data={
+                "annotation_type": "bounding_box",
+                "annotations": {"name": "bounding_box", "data": [{"left": 1, "top": 2, "width": 30, "height": 40}]},
+                "classification": [{"name": "text_question", "type": "TEXT", "value": "a note"}],
+            },
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 202, response.content)
+
+
+class PackedGeometryTests(FakeLabelboxTestCase):
+    def test_task_detail_shows_packed_coordinates(self):
+        task = self.make_task("packed")
+        annotation = Annotation(task=task, name="bounding_box", annotation_type='bounding_box',
+                                data=[{"left": 1.5, "top": 2, "width": 30, "height": 40}])
+        annotation.pack_geometry()
+        annotation.save()
+
+        response = self.client.get(reverse('task_detail', kwargs={'pk': task.pk}))
+
+        self.assertContains(response, "&#x27;left&#x27;: 1.5")
+
+    def test_migration_leaves_malformed_rows_in_json(self):
+        migration = importlib.import_module('annotation.migrations.0017_packed_geometry')
+        task = self.make_task("legacy")
+        good = Annotation.objects.create(task=task, name="bounding_box", annotation_type='bounding_box',
+                                         data=[{"left": 1, "top": 2, "width": 30, "height": 40}])
+        bad = Annotation.objects.create(task=task, name="bounding_box", annotation_type='bounding_box',
+                                        data=[{"left": 1, "top": 2}])
+
+        with self.assertLogs(migration.__name__, level='WARNING') as logs:
+            migration.repack_annotations(Annotation.objects.filter(task=task), packed=True)
+
+        good.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertIsNotNone(good.geometry)
+        self.assertIsNone(bad.geometry)
+        self.assertEqual(bad.data, [{"left": 1, "top": 2}])
+        self.assertIn(str(bad.id), logs.output[0])
+
+
+class RequestMetricsTests(FakeLabelboxTestCase):
+    def test_counts_queries_of_async_requests(self):
+        task = self.make_task("metrics")
+        self.make_annotation(task)
+
+        with self.assertLogs('annotation.metrics', level='INFO') as logs:
+            response = async_to_sync(self.async_client.get)(reverse('task_detail', kwargs={'pk': task.pk}))
+
+        self.assertEqual(response.status_code, 200)
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line["view"], "task_detail")
+        self.assertEqual(line["db_queries"], 2)
+
+    def test_query_counter_is_installed_once_per_connection(self):
+        reconnected = connections.create_connection(DEFAULT_DB_ALIAS)
+        self.addCleanup(reconnected.close)
+        for _ in range(3):
+            reconnected.connect()
+            reconnected.close()
+
+        self.assertEqual(reconnected.execute_wrappers.count(count_request_query), 1)
+
+    def test_renders_metrics_labelled_by_operation(self):
+        with labelbox_call('get_metrics_test'):
+            pass
+
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn('labelbox_call_seconds_count{operation="get_metrics_test"} 1', response.content.decode())
+
+    def test_metrics_are_only_served_to_allowed_ips_and_staff(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3').status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.0/8']):
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3').status_code, 200)
+
+        self.client.force_login(User.objects.create_user('annotator'))
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3').status_code, 403)
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3').status_code, 200)
+
+    def test_worker_metrics_port_checks_allowed_ips(self):
+        server = serve_metrics(0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+
+        with urllib.request.urlopen(url) as response:
+            self.assertIn(b'# TYPE labelbox_call_seconds histogram', response.read())
+        with override_settings(METRICS_ALLOWED_IPS=[]), self.assertRaises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url)
+        self.assertEqual(error.exception.code, 403)
+
+
+class BulkAnnotationTests(FakeLabelboxTestCase):
+    def item(self, task, data=None, **fields):
+        return {
+            "task_id": str(task.id),
+            "annotation_type": "bounding_box",
+            "annotations": {"name": "bounding_box",
+                            "data": data if data is not None else [{"left": 1, "top": 2, "width": 30, "height": 40}]},
+            **fields,
+        }
+
+    def post(self, items):
+        return self.client.post(reverse('annotation_bulk'), data={"annotations": items},
+                                content_type='application/json')
+
+    def test_saves_every_item_and_queues_one_upload(self):
+        first, second = self.make_task("bulk-1"), self.make_task("bulk-2")
+
+        response = self.post([
+            self.item(first),
+            self.item(first, classification=[{"name": "text_question", "type": "TEXT", "value": "a note"}]),
+            self.item(second),
+        ])
+
+        self.assertEqual(response.status_code, 202, response.content)
+        annotation_ids = response.json()["annotation_ids"]
+        self.assertEqual(Annotation.objects.filter(id__in=annotation_ids).count(), 3)
+        self.assertEqual(response.json()["versions"], [1, 1, 1])
+        self.assertEqual(Classification.objects.filter(annotation_id__in=annotation_ids).count(), 1)
+        job = SyncJob.objects.get()
+        self.assertEqual(str(job.id), response.json()["job_id"])
+        self.assertEqual(job.payload["annotation_ids"], annotation_ids)
+        self.assertEqual(set(AnnotationTask.objects.values_list('status', flat=True)), {'COMPLETED'})
+
+        self.assertCountEqual(flush_uploads(annotation_ids)["synced"], annotation_ids)
+
+    def test_invalid_coordinates_save_nothing(self):
+        task = self.make_task("bulk-invalid")
+        invalid = [
+            [{"left": 1, "top": 2, "width": 30}],
+            [{"left": "1", "top": 2, "width": 30, "height": 40}],
+            [{"left": 1, "top": 2, "width": 30, "height": float('nan')}],
+            [{"left": 1, "top": 2, "width": 0, "height": 40}],
+            [{"left": -50, "top": 2, "width": 30, "height": 40}],
+            [],
+        ]
+
+        response = self.post([self.item(task)] + [self.item(task, data) for data in invalid])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["index"] for error in response.json()["errors"]], list(range(1, len(invalid) + 1)))
+        self.assertFalse(Annotation.objects.exists())
+        self.assertFalse(SyncJob.objects.exists())
+        self.assertEqual(AnnotationTask.objects.get().status, 'PENDING')
+
+    def test_rejects_unknown_tasks_and_annotated_tasks(self):
+        annotated = self.make_task("bulk-done", status='COMPLETED')
+
+        response = self.post([self.item(annotated), {**self.item(annotated), "task_id": "not-a-uuid"}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [error["message"] for error in response.json()["errors"]],
+            ["The task is already annotated.", "Unknown or missing task_id."]
+        )
+
+    def test_malformed_classifications_are_rejected_per_item(self):
+        task = self.make_task("bulk-classified")
+
+        response = self.post([
+            self.item(task, classification=[{"name": "text_question", "type": "TEXT"}]),
+            self.item(task, classification=[{"name": "radio_question", "type": "RADIO", "value": ["option1"]}]),
+            self.item(task, classification="text_question"),
+            self.item(task),
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["index"] for error in response.json()["errors"]], [0, 1, 2])
+        self.assertFalse(Annotation.objects.exists())
+
+
+class AnnotationDetailTests(FakeLabelboxTestCase):
+    def setUp(self):
+        super().setUp()
+        self.annotation = self.make_annotation(self.make_task("edited"))
+        flush_uploads([self.annotation.id])
+        self.annotation.refresh_from_db()
+
+    def put(self, version, width=30):
+        return self.client.put(
+            reverse('annotation_detail', kwargs={'pk': self.annotation.id}),
+            data={
+                "version": version,
+                "annotation_type": "bounding_box",
+                "annotations": {"name": "bounding_box", "data": [{"left": 1, "top": 2, "width": width, "height": 40}]},
+            },
+            content_type='application/json'
+        )
+
+    def delete(self, version):
+        return self.client.delete(
+            reverse('annotation_detail', kwargs={'pk': self.annotation.id}) + f"?version={version}"
+        )
+
+    def test_stale_version_is_rejected(self):
+        response = self.put(self.annotation.version - 1, width=50)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["version"], self.annotation.version)
+        self.annotation.refresh_from_db()
+        self.assertEqual(self.annotation.data[0]["width"], 30)
+        self.assertFalse(SyncJob.objects.filter(job_type='UPLOAD_ANNOTATIONS').exists())
+
+    def test_unchanged_edit_queues_no_upload(self):
+        response = self.put(self.annotation.version)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIsNone(response.json()["job_id"])
+        self.assertEqual(response.json()["version"], self.annotation.version + 1)
+        self.assertEqual(response.json()["sync_status"], 'SYNCED')
+        self.assertFalse(SyncJob.objects.filter(job_type='UPLOAD_ANNOTATIONS').exists())
+
+    def test_unchanged_edit_during_an_upload_is_uploaded_again(self):
+        Annotation.objects.filter(id=self.annotation.id).update(sync_status='SYNCING')
+
+        response = self.put(self.annotation.version)
+
+        self.assertEqual(response.json()["sync_status"], 'PENDING')
+        self.assertIsNotNone(response.json()["job_id"])
+
+    def test_changed_edit_queues_an_upload(self):
+        response = self.put(self.annotation.version, width=50)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["sync_status"], 'PENDING')
+        job = SyncJob.objects.get(id=response.json()["job_id"])
+        self.assertEqual(job.payload["annotation_ids"], [str(self.annotation.id)])
+
+        self.assertEqual(flush_uploads([self.annotation.id])["synced"], [str(self.annotation.id)])
+        [label] = self.lb_project._labels["edited"]
+        self.assertEqual(label[1]["bbox"]["width"], 50)
+
+    def test_edit_follows_a_create(self):
+        task = self.make_task("created")
+        created = self.client.post(
+            reverse('task-annotate', kwargs={'task_id': task.id}),
+            data={"annotation_type": "bounding_box",
+                  "annotations": {"name": "bounding_box", "data": [{"left": 1, "top": 2, "width": 30, "height": 40}]}},
+            content_type='application/json'
+        ).json()
+        self.annotation = Annotation.objects.get(id=created["annotation_id"])
+
+        response = self.put(created["version"], width=50)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["version"], created["version"] + 1)
+
+    def test_get_returns_the_current_version(self):
+        Classification.objects.create(
+            annotation=self.annotation, name="text_question", classification_type="TEXT", value="a note"
+        )
+
+        response = self.client.get(reverse('annotation_detail', kwargs={'pk': self.annotation.id}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["version"], self.annotation.version)
+        self.assertEqual(response.json()["data"], self.annotation.data)
+        self.assertEqual(response.json()["classification"], [{"name": "text_question", "type": "TEXT", "value": "a note"}])
+        self.assertEqual(self.put(response.json()["version"], width=50).status_code, 200)
+
+    def test_delete(self):
+        self.assertEqual(self.delete(self.annotation.version - 1).status_code, 409)
+        self.assertTrue(Annotation.objects.filter(id=self.annotation.id).exists())
+
+        response = self.delete(self.annotation.version)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["labelbox_copy_kept"])
+        self.assertFalse(Annotation.objects.filter(id=self.annotation.id).exists())
+
+
+@override_settings(SYNC_JOB_MAX_ATTEMPTS=3, SYNC_JOB_RETRY_BACKOFF=10, SYNC_JOB_LEASE_SECONDS=60)
+class JobQueueTests(TestCase):
+    def run_with(self, handler, job_type='EXPORT_PROJECT'):
+        with mock.patch.dict(JOB_HANDLERS, {job_type: handler}):
+            return run_job(claim_next_job([job_type]))
+
+    def test_dedupe_key_reuses_the_queued_job_only(self):
+        first = enqueue('EXPORT_PROJECT', {}, dedupe_key="export:1")
+        self.assertEqual(enqueue('EXPORT_PROJECT', {}, dedupe_key="export:1"), first)
+
+        claim_next_job()
+
+        self.assertNotEqual(enqueue('EXPORT_PROJECT', {}, dedupe_key="export:1"), first)
+
+    def test_claims_due_jobs_in_order_and_leases_them(self):
+        later = enqueue('EXPORT_PROJECT', {}, run_after=timezone.now() - timedelta(seconds=1))
+        earlier = enqueue('EXPORT_PROJECT', {}, run_after=timezone.now() - timedelta(seconds=2))
+        enqueue('EXPORT_PROJECT', {}, run_after=timezone.now() + timedelta(hours=1))
+
+        claimed = [claim_next_job(), claim_next_job(), claim_next_job()]
+
+        self.assertEqual(claimed[:2], [earlier, later])
+        self.assertIsNone(claimed[2])
+        self.assertEqual((claimed[0].status, claimed[0].attempts), ('RUNNING', 1))
+
+        # A worker that died leaves its lease behind; the job is claimed again once it expires
+        SyncJob.objects.filter(id=earlier.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(claim_next_job(), earlier)
+        self.assertEqual(SyncJob.objects.get(id=earlier.id).attempts, 2)
+
+    def test_failures_back_off_until_attempts_run_out(self):
+        def fail(payload):
+            raise RuntimeError("Labelbox is down")
+
+        job = enqueue('EXPORT_PROJECT', {})
+        delays = []
+        for _ in range(2):
+            started = timezone.now()
+            job = self.run_with(fail)
+            self.assertEqual((job.status, job.last_error), ('QUEUED', "Labelbox is down"))
+            delays.append(round((job.run_after - started).total_seconds()))
+            SyncJob.objects.filter(id=job.id).update(run_after=timezone.now())
+
+        job = self.run_with(fail)
+
+        self.assertEqual(delays, [10, 20])
+        self.assertEqual((job.status, job.attempts), ('FAILED', 3))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_success_stores_the_result(self):
+        enqueue('EXPORT_PROJECT', {"project_id": "p"})
+
+        job = self.run_with(lambda payload: {"exported": payload["project_id"]})
+
+        self.assertEqual((job.status, job.result), ('SUCCEEDED', {"exported": "p"}))
+        self.assertIsNone(SyncJob.objects.get(id=job.id).locked_until)
+
+    def test_job_without_handler_fails_at_once(self):
+        enqueue('EXPORT_PROJECT', {})
+
+        with mock.patch.dict(JOB_HANDLERS, clear=True):
+            job = run_job(claim_next_job())
+
+        self.assertEqual(job.status, 'FAILED')
+
+
+class PolygonNormalizationTests(SimpleTestCase):
+    @staticmethod
+    def ring(*points):
+        return [{"x": x, "y": y} for x, y in points]
+
+    def test_self_intersecting_polygon_keeps_its_largest_piece(self):
+        # A bow tie whose right loop is larger than the left one
+        bow_tie = self.ring((0, 0), (4, 4), (4, 0), (0, 4 / 3))
+
+        data, received, kept = normalize_geometry('polygon', bow_tie, 0)
+
+        polygon = Polygon([(point["x"], point["y"]) for point in data])
+        self.assertTrue(polygon.is_valid)
+        self.assertEqual((received, kept), (4, 3))
+        self.assertAlmostEqual(polygon.area, 6)
+
+    def test_simplification_drops_vertices_within_tolerance(self):
+        wobbly = self.ring((0, 0), (5, 0.01), (10, 0), (10, 10), (5, 10.01), (0, 10), (0, 10))
+
+        data, received, kept = normalize_geometry('polygon', wobbly, 0.5)
+
+        self.assertEqual((received, kept), (7, 4))
+        self.assertEqual(normalize_geometry('polygon', wobbly, 0)[2], 6)  # only the repeated vertex goes
+
+    def test_polygons_without_area_are_rejected(self):
+        for polygon in [self.ring((0, 0), (1, 1)), self.ring((0, 0), (1, 1), (2, 2))]:
+            with self.assertRaises(ValueError):
+                normalize_geometry('polygon', polygon, 0)
+
+    def test_boxes_pass_through_unchanged(self):
+        box = [{"left": 5, "top": 5, "width": -3, "height": 4}]
+
+        self.assertEqual(normalize_geometry('bounding_box', box, 1), (box, 1, 1))
+
+
+class SpatialIndexTests(FakeLabelboxTestCase):
+    def setUp(self):
+        super().setUp()
+        self.task = self.make_task("spatial")
+        self.box = self.make_annotation(self.task, data=[{"left": 0, "top": 0, "width": 10, "height": 10}])
+        # The same box drawn right-to-left and bottom-to-top
+        self.duplicate = self.make_annotation(self.task, data=[{"left": 10, "top": 10, "width": -10, "height": -9}])
+        self.far = self.make_annotation(self.task, data=[{"left": 100, "top": 100, "width": 10, "height": 10}])
+
+    def region(self, **params):
+        return self.client.get(reverse('annotation_region', kwargs={'task_id': self.task.id}), params)
+
+    def test_region_query_ranks_intersecting_annotations_by_iou(self):
+        response = self.region(bbox="0,0,10,10")
+
+        self.assertEqual(response.status_code, 200)
+        matches = [(match["id"], match["iou"]) for match in response.json()["annotations"]]
+        self.assertEqual(matches, [(str(self.box.id), 1.0), (str(self.duplicate.id), 0.9)])
+        self.assertEqual(len(self.region(bbox="0,0,10,10", min_iou=0.95).json()["annotations"]), 1)
+        self.assertEqual(self.region(bbox="0,0").status_code, 400)
+
+    def test_index_is_rebuilt_only_when_annotations_change(self):
+        index = get_task_index(self.task.id)
+        self.assertIs(get_task_index(self.task.id), index)
+
+        self.far.delete()
+
+        self.assertEqual(len(get_task_index(self.task.id).annotations), 2)
+
+    def test_overlapping_pairs(self):
+        pairs = TaskSpatialIndex(self.task.annotations.all()).overlapping_pairs(0.8)
+
+        self.assertEqual([{first.id, second.id} for first, second, _ in pairs], [{self.box.id, self.duplicate.id}])
+        self.assertEqual(TaskSpatialIndex(self.task.annotations.all()).overlapping_pairs(0.95), [])
+
+    def test_find_duplicate_annotations_command(self):
+        output = io.StringIO()
+
+        call_command('find_duplicate_annotations', project=str(self.project.id), stdout=output)
+
+        self.assertIn(f"{self.box.id}", output.getvalue())
+        self.assertIn("1 overlapping pairs in 1 tasks", output.getvalue())
+
+
+@mock.patch.object(AnnotationTaskListView, 'paginate_by', 2)
+class KeysetPaginationTests(FakeLabelboxTestCase):
+    def setUp(self):
+        super().setUp()
+        created_at = timezone.now() - timedelta(hours=1)
+        for index in range(5):
+            task = self.make_task(f"page-{index}")
+            # Two tasks share a timestamp, so the id has to break the tie
+            AnnotationTask.objects.filter(id=task.id).update(created_at=created_at + timedelta(minutes=min(index, 3)))
+        self.newest_first = list(AnnotationTask.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def page(self, **params):
+        response = self.client.get(reverse('task_list', kwargs={'project_id': self.project.id}), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['page_obj'], [task.id for task in response.context['tasks']]
+
+    def test_walks_forward_and_back_without_gaps(self):
+        pages, cursor = [], None
+        while True:
+            page, ids = self.page(**({'after': cursor} if cursor else {}))
+            pages.append(ids)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(pages, [self.newest_first[:2], self.newest_first[2:4], self.newest_first[4:]])
+
+        page, ids = self.page(before=page.previous_cursor)
+        self.assertEqual(ids, self.newest_first[2:4])
+        page, ids = self.page(before=page.previous_cursor)
+        self.assertEqual(ids, self.newest_first[:2])
+        self.assertFalse(page.has_previous())
+
+    def test_rows_carry_their_annotation_count(self):
+        self.make_annotation(AnnotationTask.objects.get(id=self.newest_first[1]))
+
+        page, _ = self.page()
+
+        self.assertEqual([task.annotation_count for task in page.object_list], [0, 1])
+
+    def test_malformed_cursor_is_not_found(self):
+        response = self.client.get(reverse('task_list', kwargs={'project_id': self.project.id}), {'after': 'nope'})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TaskLeaseTests(FakeLabelboxTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tasks = [self.make_task(f"lease-{index}") for index in range(2)]
+        self.other = Client()
+
+    def next_task(self, client):
+        return client.post(reverse('next_task', kwargs={'project_id': self.project.id}))
+
+    def annotate(self, client, task_id):
+        return client.post(
+            reverse('task-annotate', kwargs={'task_id': task_id}),
+            data={"annotation_type": "bounding_box",
+                  "annotations": {"name": "bounding_box", "data": [{"left": 1, "top": 2, "width": 30, "height": 40}]}},
+            content_type='application/json'
+        )
+
+    def test_annotators_get_distinct_tasks_and_keep_theirs(self):
+        mine = self.next_task(self.client).json()
+        theirs = self.next_task(self.other).json()
+
+        self.assertNotEqual(mine["task_id"], theirs["task_id"])
+        again = self.next_task(self.client).json()
+        self.assertEqual(again["task_id"], mine["task_id"])
+        self.assertGreaterEqual(again["lease_expires_at"], mine["lease_expires_at"])
+        self.assertEqual(self.next_task(Client()).status_code, 204)
+
+    def test_leased_task_cannot_be_annotated_by_another_annotator(self):
+        task_id = self.next_task(self.client).json()["task_id"]
+
+        self.assertEqual(self.annotate(self.other, task_id).status_code, 409)
+        self.assertEqual(self.annotate(self.client, task_id).status_code, 202)
+
+    def test_annotated_task_cannot_be_annotated_again(self):
+        task_id = self.next_task(self.client).json()["task_id"]
+        self.assertEqual(self.annotate(self.client, task_id).status_code, 202)
+
+        response = self.annotate(self.client, task_id)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Annotation.objects.filter(task_id=task_id).count(), 1)
+
+    def test_expired_leases_are_released(self):
+        task_id = self.next_task(self.client).json()["task_id"]
+        AnnotationTask.objects.filter(id=task_id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(release_expired_leases(), 1)
+
+        task = AnnotationTask.objects.get(id=task_id)
+        self.assertEqual((task.status, task.lease_owner), ('PENDING', ''))
+        self.assertEqual(self.annotate(self.other, task_id).status_code, 202)
+
+
+@override_settings(JOB_STATUS_POLL_INTERVAL=0.05)
+class SyncJobStatusTests(TestCase):
+    def setUp(self):
+        self.job = enqueue('EXPORT_PROJECT', {}, run_after=timezone.now() + timedelta(hours=1))
+
+    def get(self, pk, **params):
+        return self.client.get(reverse('job_status', kwargs={'pk': pk}), params)
+
+    def test_returns_the_job(self):
+        response = self.get(self.job.id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["id"], response.json()["status"]), (str(self.job.id), 'QUEUED'))
+
+    def test_unknown_job_is_not_found(self):
+        self.assertEqual(self.get(uuid.uuid4()).status_code, 404)
+        self.assertEqual(self.get(self.job.id, wait="soon").status_code, 400)
+
+    def test_long_poll_answers_when_the_wait_runs_out(self):
+        started = time.monotonic()
+
+        response = self.get(self.job.id, wait=0.2)
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(response.json()["status"], 'QUEUED')
+
+    def test_long_poll_answers_once_the_job_finishes(self):
+        polls = []
+
+        async def finish_job(seconds):
+            polls.append(seconds)
+            await SyncJob.objects.filter(id=self.job.id).aupdate(status='SUCCEEDED')
+
+        with mock.patch('annotation.views.asyncio.sleep', finish_job):
+            response = self.get(self.job.id, wait=30)
+
+        self.assertEqual(response.json()["status"], 'SUCCEEDED')
+        self.assertEqual(len(polls), 1)
+
+
+class RunBenchmarksTests(TestCase):
+    def run_benchmarks(self, *args):
+        with tempfile.NamedTemporaryFile('r', suffix='.json') as output:
+            call_command('run_benchmarks', '--provision-rows=3', '--import-rows=5', '--submit=2', '--export-rows=5',
+                         f'--output={output.name}', *args, stdout=io.StringIO(), stderr=io.StringIO())
+            return json.load(output)["results"]
+
+    def test_runs_every_benchmark_and_rolls_back(self):
+        results = self.run_benchmarks()
+
+        self.assertEqual(list(results), ["provision", "import", "submit", "submit_bulk", "upload", "export_5"])
+        for name, result in results.items():
+            self.assertNotIn("error", result, name)
+            self.assertGreater(result["queries"], 0, name)
+            self.assertEqual(result["retries"], 0, name)
+        self.assertEqual(results["import"]["rows"], 5)
+        self.assertFalse(AnnotationProject.objects.exists())
+        self.assertFalse(SyncJob.objects.exists())
+
+    def test_retries_injected_labelbox_errors(self):
+        results = self.run_benchmarks('--error-rate=0.3', '--attempts=20')
+
+        for name, result in results.items():
+            self.assertNotIn("error", result, name)
+        self.assertGreater(sum(result["retries"] for result in results.values()), 0)
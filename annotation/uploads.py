@@ -0,0 +1,176 @@
+import logging
+import operator
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Q, Value, When
+from django.utils import timezone
+
+from .geometry import INVALID_DATA_ERRORS, NDJsonAnnotationConverter
+from .metrics import stage
+from .models import Annotation
+from .services import LabelboxService
+
+logger = logging.getLogger(__name__)
+
+
+class AnnotationUploadBatcher:
+    """
+    Coalesces pending annotations from any number of tasks and projects into one
+    MAL import per project, instead of one import job per annotation.
+
+    Annotations are created with sync_status PENDING. A flush claims up to
+    `max_batch_size` of them, converts them to NDJSON rows in bulk, uploads each
+    project's rows in a single import and maps Labelbox's per-annotation errors (keyed by the
+    annotation uuid) back onto the rows.
+    """
+
+    def __init__(self, labelbox_service=None, max_batch_size=None, max_age=None):
+        self._labelbox_service = labelbox_service
+        self.max_batch_size = max_batch_size or settings.MAL_BATCH_MAX_SIZE
+        self.max_age = timedelta(seconds=max_age if max_age is not None else settings.MAL_BATCH_MAX_AGE)
+
+    @property
+    def labelbox_service(self):
+        # Only connect to Labelbox once there is something to upload
+        if self._labelbox_service is None:
+            self._labelbox_service = LabelboxService()
+        return self._labelbox_service
+
+    def _claimable(self):
+        # SYNCING rows that have not moved for a whole job lease belong to a dead worker
+        stale_before = timezone.now() - timedelta(seconds=settings.SYNC_JOB_LEASE_SECONDS)
+        return Annotation.objects.filter(
+            Q(sync_status='PENDING') | Q(sync_status='SYNCING', updated_at__lt=stale_before)
+        )
+
+    def should_flush(self):
+        """True once enough annotations are pending, or the oldest one has waited max_age."""
+        pending = self._claimable()
+        if pending.order_by()[:self.max_batch_size].count() >= self.max_batch_size:
+            return True
+        # updated_at rather than created_at, so rows put back after a failed import wait too
+        oldest = pending.order_by('updated_at').values_list('updated_at', flat=True).first()
+        return oldest is not None and oldest <= timezone.now() - self.max_age
+
+    def flush(self, annotation_ids=None):
+        """
+        Upload one batch of pending annotations.
+
+        :param annotation_ids: Annotations that must be part of this batch (e.g. the ones
+            a queued job is waiting on). The rest of the batch is filled with the oldest
+            other pending annotations.
+        :return: Dict with the synced/failed annotation ids and the Labelbox project ids
+            that received new labels.
+        """
+        claimed = self._claim(annotation_ids or [])
+        summary = {"synced": [], "failed": [], "retry": [], "projects": []}
+        if not claimed:
+            return summary
+
+        annotations = (
+            Annotation.objects
+            .filter(id__in=claimed)
+            .select_related('task__project__ontology_template')
+            .prefetch_related('classifications')
+        )
+        by_project = defaultdict(list)
+        for annotation in annotations:
+            by_project[annotation.task.project.lb_uid].append(annotation)
+
+        for project_id, project_annotations in by_project.items():
+            self._upload_project(project_id, project_annotations, summary)
+
+        return summary
+
+    def _claim(self, annotation_ids):
+        with transaction.atomic():
+            claimable = self._claimable().select_for_update(skip_locked=True)
+            claimed = list(
+                claimable.filter(id__in=annotation_ids).values_list('id', flat=True)[:self.max_batch_size]
+            )
+            remaining = self.max_batch_size - len(claimed)
+            if remaining > 0:
+                claimed += list(
+                    claimable.exclude(id__in=claimed).order_by('created_at')
+                    .values_list('id', flat=True)[:remaining]
+                )
+            Annotation.objects.filter(id__in=claimed).update(
+                sync_status='SYNCING', sync_error='', updated_at=timezone.now()
+            )
+        return claimed
+
+    def _upload_project(self, project_id, annotations, summary):
+        try:
+            # One lookup table per project; usually read from the local OntologyTemplate
+            schemas = self.labelbox_service.get_feature_schemas(annotations[0].task.project)
+        except Exception as exc:
+            logger.exception("Could not load the ontology of project %s", project_id)
+            self._retry_later(annotations, exc, summary)
+            return
+
+        # Annotations edited back to what Labelbox already has are not sent again
+        hashes, changed, unchanged = {}, [], []
+        for annotation in annotations:
+            try:
+                hashes[annotation.id] = annotation.compute_sync_hash()
+            except INVALID_DATA_ERRORS:
+                hashes[annotation.id] = ''  # reported by the converter below
+            if annotation.sync_hash and hashes[annotation.id] == annotation.sync_hash:
+                unchanged.append(annotation)
+            else:
+                changed.append(annotation)
+
+        # Validated against the local ontology map and converted in bulk before anything is sent
+        converter = NDJsonAnnotationConverter(schemas)
+        with stage('upload.convert'):
+            rows, errors = converter.convert(changed)
+
+        uploadable = [a for a in changed if str(a.id) not in errors]
+        if rows:
+            try:
+                upload_errors = self.labelbox_service.upload_labels(rows, project_id)
+            except Exception as exc:
+                # Whole import failed (network, auth, ...): put the rows back for the next flush
+                logger.exception("MAL batch upload to project %s failed", project_id)
+                self._retry_later(uploadable, exc, summary)
+                uploadable = []
+            else:
+                for row in upload_errors:
+                    annotation_id = converter.row_annotations.get(row.get("uuid"), row.get("uuid"))
+                    errors[annotation_id] = "; ".join(
+                        error.get("message", str(error)) for error in row.get("errors", [])
+                    ) or str(row)
+
+        now = timezone.now()
+        uploaded = [a for a in uploadable if str(a.id) not in errors]
+        synced = uploaded + unchanged
+        if synced:
+            # Only the version that was uploaded: rows edited meanwhile stay PENDING for the next flush
+            Annotation.objects.filter(
+                reduce(operator.or_, (Q(id=a.id, version=a.version) for a in synced))
+            ).update(
+                sync_status='SYNCED', sync_error='', synced_at=now, updated_at=now,
+                sync_hash=Case(*(When(id=a.id, then=Value(hashes[a.id])) for a in synced))
+            )
+        for annotation in annotations:
+            if str(annotation.id) in errors:
+                Annotation.objects.filter(id=annotation.id, version=annotation.version).update(
+                    sync_status='FAILED', sync_error=errors[str(annotation.id)], updated_at=now
+                )
+                summary["failed"].append(str(annotation.id))
+
+        summary["synced"] += [str(a.id) for a in synced]
+        if uploaded:
+            summary["projects"].append(project_id)
+
+    @staticmethod
+    def _retry_later(annotations, exc, summary):
+        ids = [a.id for a in annotations]
+        Annotation.objects.filter(id__in=ids).update(
+            sync_status='PENDING', sync_error=str(exc), updated_at=timezone.now()
+        )
+        summary["retry"] += [str(i) for i in ids]
@@ -3,16 +3,30 @@ from .views import (
     AnnotationProjectListView,
     AnnotationProjectCreateView,
     AnnotationTaskListView,
-    AnnotationTaskDetailView, AnnotationView
+    AnnotationTaskDetailView, AnnotationView, BulkAnnotationView, AnnotationDetailView, AnnotationRegionView,
+    NextTaskView, MetricsView,
+    SyncJobStatusView, ImageImportView, ImageImportStatusView
 )
 
 urlpatterns = [
     # Project URLs
     path('projects/', AnnotationProjectListView.as_view(), name='project_list'),
     path('projects/create/', AnnotationProjectCreateView.as_view(), name='project_create'),
+    path('projects/<uuid:project_id>/imports/', ImageImportView.as_view(), name='image_import'),
+    path('imports/<uuid:pk>/', ImageImportStatusView.as_view(), name='image_import_status'),
 
     # Task URLs
     path('projects/<uuid:project_id>/tasks/', AnnotationTaskListView.as_view(), name='task_list'),
+    path('projects/<uuid:project_id>/tasks/next/', NextTaskView.as_view(), name='next_task'),
     path('tasks/<uuid:pk>/', AnnotationTaskDetailView.as_view(), name='task_detail'),
     path('tasks/<uuid:task_id>/annotate/', AnnotationView.as_view(), name='task-annotate'),
+    path('annotations/bulk/', BulkAnnotationView.as_view(), name='annotation_bulk'),
+    path('annotations/<uuid:pk>/', AnnotationDetailView.as_view(), name='annotation_detail'),
+    path('tasks/<uuid:task_id>/annotations/region/', AnnotationRegionView.as_view(), name='annotation_region'),
+
+    # Background job URLs
+    path('jobs/<uuid:pk>/', SyncJobStatusView.as_view(), name='job_status'),
+
+    # Prometheus scrape endpoint
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -1,210 +1,640 @@
+import asyncio
+import csv
+import io
 import json
 import uuid
+from datetime import timedelta
 
-import labelbox as lb
-import labelbox.types as lb_types
+import shapely
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
 from django.db import transaction
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views import View
-from django.views.generic import ListView, DetailView, CreateView
+from django.views.generic import ListView, CreateView
 from django.shortcuts import redirect, render, get_object_or_404
-from django.http import JsonResponse
-
-from .models import AnnotationTask, Annotation, Classification, AnnotationProject
-from .services import ExportService
-from .services import LabelboxService
-
-
-class AnnotationProjectListView(ListView):
+from django.http import HttpResponse, JsonResponse
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .aio import aget_object_or_404, run_blocking
+from .dispatch import annotator_id, claim_next_task
+from .geometry import INVALID_DATA_ERRORS, normalize_geometry
+from .importing import manifest_format
+from .jobs import enqueue
+from .metrics import CONTENT_TYPE, metrics_client_allowed, registry, stage
+from .ontology import FeatureSchemaMap
+from .pagination import KeysetPaginationMixin
+from .spatial import get_task_index
+from .models import AnnotationTask, Annotation, Classification, AnnotationProject, ImageImport, SyncJob
+
+
+def count_subquery(model, group_by, **filters):
+    """
+    Correlated COUNT(*) of related rows. Unlike a JOIN + GROUP BY over every parent row,
+    it is only evaluated for the rows of the current page.
+    """
+    return Coalesce(Subquery(
+        model.objects.filter(**filters).order_by().values(group_by).annotate(count=Count('id')).values('count')
+    ), 0)
+
+
+class AnnotationProjectListView(KeysetPaginationMixin, ListView):
     model = AnnotationProject
     template_name = 'annotation/project_list.html'
     context_object_name = 'projects'
+    paginate_by = 24
+
+    def get_queryset(self):
+        task_counts = {
+            f"{status.lower()}_task_count": count_subquery(AnnotationTask, 'project', project=OuterRef('pk'), status=status)
+            for status, _ in AnnotationTask.STATUS_CHOICES
+        }
+        return AnnotationProject.objects.annotate(
+            task_count=count_subquery(AnnotationTask, 'project', project=OuterRef('pk')),
+            annotation_count=count_subquery(Annotation, 'task__project', task__project=OuterRef('pk')),
+            **task_counts
+        )
 
 
 class AnnotationProjectCreateView(CreateView):
     model = AnnotationProject
     template_name = 'annotation/project_create.html'
-    fields = ['name', 'description', 'media_type']
+    fields = ['name', 'description', 'media_type', 'geometry_storage']
     success_url = reverse_lazy('project_list')
 
     def form_valid(self, form):
-        with transaction.atomic():
-            labelbox_service = LabelboxService()
-            project, lb_project = labelbox_service.create_project(
-                name=form.cleaned_data['name'],
-                description=form.cleaned_data['description'],
-                media_type=form.cleaned_data['media_type']
-            )
-
-            # Create ontology with all supported annotation types
-            labelbox_service.create_ontology(lb_project)
+        # Labelbox project, ontology and data rows are provisioned by the sync worker
+        image_urls = [
+            image_url.strip()
+            for value in self.request.POST.getlist('image_urls')
+            for image_url in value.splitlines() if image_url.strip()
+        ]
 
-            # Import images
-            image_urls = self.request.POST.getlist('image_urls')
-            labelbox_service.import_data_rows(project, image_urls, lb_project)
+        with transaction.atomic():
+            project = form.save()
+            if image_urls:
+                manifest = io.StringIO()
+                csv.writer(manifest).writerows([["image_url"]] + [[image_url] for image_url in image_urls])
+                ImageImport.objects.create(
+                    project=project,
+                    manifest=ContentFile(manifest.getvalue(), name=f"{project.id}.csv"),
+                    file_format='CSV'
+                )
+            enqueue('PROVISION_PROJECT', {'project_id': str(project.id)}, dedupe_key=f"provision:{project.id}")
 
-            return redirect(self.success_url)
+        return redirect(self.success_url)
 
 
-class AnnotationTaskListView(ListView):
+class AnnotationTaskListView(KeysetPaginationMixin, ListView):
     model = AnnotationTask
     template_name = 'annotation/task_list.html'
     context_object_name = 'tasks'
+    paginate_by = 100
 
     def get_queryset(self):
-        project_id = self.kwargs.get('project_id')
-        return AnnotationTask.objects.filter(project_id=project_id)
-
-
-class AnnotationTaskDetailView(DetailView):
-    model = AnnotationTask
-    template_name = 'annotation/task_detail.html'
-    context_object_name = 'task'
+        self.project = get_object_or_404(AnnotationProject, id=self.kwargs.get('project_id'))
+        return AnnotationTask.objects.filter(project=self.project).select_related('project').annotate(
+            annotation_count=count_subquery(Annotation, 'task', task=OuterRef('pk'))
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['annotation_types'] = Annotation.ANNOTATION_TYPES
+        context['project'] = self.project
         return context
 
 
-class AnnotationView(View):
-    def get(self, request, task_id):
-        task = get_object_or_404(AnnotationTask, id=task_id)
-        return render(request, 'annotation/annotate.html', {
+class AnnotationTaskDetailView(View):
+    async def get(self, request, pk):
+        task = await aget_object_or_404(AnnotationTask.objects.select_related('project'), pk=pk)
+        annotations = [annotation async for annotation in task.annotations.all()]
+        return render(request, 'annotation/task_detail.html', {
             'task': task,
+            'annotations': annotations,
             'annotation_types': Annotation.ANNOTATION_TYPES
         })
 
-    def post(self, request, task_id):
-        # try:
-        with transaction.atomic():
-            # Parse JSON data from request body
-            data = json.loads(request.body)
-            print(data)
-            # Extract task
-            task = get_object_or_404(AnnotationTask, id=task_id)
-
-            # Extract annotation details
-            annotation_type = data.get('annotation_type')
-            annotation_name = data.get("annotations").get('name')
-            annotation_objects = data.get('annotations').get('data', [])
-            classifications = data.get('classification', [])
-
-            # Save annotation
-            annotation = Annotation.objects.create(
+
+class AnnotationPayloadMixin:
+    """Validation and normalization of the annotation JSON posted by the annotate page."""
+
+    async def _build_annotation(self, task, data):
+        """
+        Validate an annotation payload and build the (unsaved) Annotation from it.
+
+        :return: Tuple of (Annotation, classification dicts, None), or (None, None, 400 response).
+        """
+        try:
+            annotation, classifications = await run_blocking(self._parse, task, data)
+        except ValueError as exc:
+            return None, None, JsonResponse({"message": str(exc)}, status=400)
+        return annotation, classifications, None
+
+    @staticmethod
+    def _parse(task, data):
+        """
+        Build the (unsaved) Annotation of one payload. CPU-bound, run it with `run_blocking`.
+
+        :param task: The AnnotationTask, with `project__ontology_template` selected.
+        :return: Tuple of (Annotation, classification dicts).
+        :raises ValueError: With the message for the client if the payload is invalid.
+        """
+        # Extract annotation details
+        annotation_type = data.get('annotation_type')
+        annotation_name = data.get("annotations").get('name')
+        annotation_objects = data.get('annotations').get('data', [])
+        classifications = data.get('classification', [])
+
+        try:
+            answers = [
+                (classification['name'], classification['type'], classification['value'])
+                for classification in classifications
+            ]
+            # Reject names the project ontology does not define now, not in the import job
+            template = task.project.ontology_template
+            if template is not None and template.feature_schema_ids:
+                FeatureSchemaMap(template.feature_schema_ids).validate(annotation_name, answers)
+        except ValueError:
+            raise
+        except INVALID_DATA_ERRORS as exc:
+            raise ValueError(f"Invalid classification data: {exc!r}") from exc
+
+        try:
+            with stage('annotation.normalize'):
+                annotation_objects, received, kept = normalize_geometry(
+                    annotation_type, annotation_objects, settings.POLYGON_SIMPLIFY_TOLERANCE
+                )
+            annotation = Annotation(
                 task=task,
                 name=annotation_name,
                 annotation_type=annotation_type,
-                data=annotation_objects  # Store the raw data for further processing if needed
+                data=annotation_objects,  # Store the raw data for further processing if needed
+                vertex_count_received=received,
+                vertex_count=kept
+            )
+            if task.project.geometry_storage == 'PACKED':
+                annotation.pack_geometry()
+        except INVALID_DATA_ERRORS as exc:
+            raise ValueError(f"Invalid annotation data: {exc}") from exc
+        return annotation, classifications
+
+    @staticmethod
+    def _create_classifications(items):
+        """:param items: (Annotation, classification dicts) pairs; one INSERT for all of them."""
+        Classification.objects.bulk_create([
+            Classification(
+                annotation=annotation,
+                name=classification['name'],
+                classification_type=classification['type'],
+                value=classification['value']
             )
+            for annotation, classifications in items
+            for classification in classifications
+        ])
+
+    @staticmethod
+    def _enqueue_upload(annotations):
+        # Labelbox upload and export run in the sync worker once this transaction commits.
+        # The job becomes due after MAL_BATCH_MAX_AGE so uploads from other annotators coalesce.
+        return enqueue(
+            'UPLOAD_ANNOTATIONS',
+            {'annotation_ids': [str(annotation.id) for annotation in annotations]},
+            run_after=timezone.now() + timedelta(seconds=settings.MAL_BATCH_MAX_AGE)
+        )
 
-            # Save classifications
-            for classification in classifications:
-                Classification.objects.create(
-                    annotation=annotation,
-                    name=classification['name'],
-                    classification_type=classification['type'],
-                    value=classification['value']
-                )
 
-            # Convert annotation to Python annotation format
-            python_annotation = self._convert_to_python_annotation(annotation)
+class AnnotationView(AnnotationPayloadMixin, View):
+    """
+    Annotation page and submission, as async views: under ASGI a request waiting on
+    the database does not hold a worker thread. Reads use the async ORM, geometry
+    normalization runs in the bounded blocking pool, and only the transactional
+    save runs as sync code.
+    """
+
+    async def get(self, request, task_id):
+        task = await aget_object_or_404(AnnotationTask.objects.all(), id=task_id)
+        return render(request, 'annotation/annotate.html', {
+            'task': task,
+            'annotation_types': Annotation.ANNOTATION_TYPES
+        })
+
+    async def post(self, request, task_id):
+        # Parse JSON data from request body
+        data = json.loads(request.body)
+        task = await aget_object_or_404(
+            AnnotationTask.objects.select_related('project__ontology_template'), id=task_id
+        )
+        owner = await sync_to_async(annotator_id)(request)
+
+        # Build the annotation before taking the task lock, so the lock is only held for the writes
+        annotation, classifications, error = await self._build_annotation(task, data)
+        if error is not None:
+            return error
+
+        job, conflict = await sync_to_async(self._save)(task.id, owner, annotation, classifications)
+        if conflict is not None:
+            return conflict
+
+        return JsonResponse(
+            {
+                "message": "Annotation saved and queued for upload to Labelbox.",
+                "annotation_id": str(annotation.id),
+                "version": annotation.version,
+                "job_id": str(job.id),
+                "status_url": reverse('job_status', kwargs={'pk': job.id}),
+            },
+            status=202,
+        )
 
-            # Upload annotations to Labelbox
-            self._upload_annotations_to_labelbox(task.global_key, [python_annotation], task.project.lb_uid)
+    @classmethod
+    def _save(cls, task_id, owner, annotation, classifications):
+        """
+        Store the annotation and queue its upload.
 
-            # Trigger ExportService after annotation task upload
-            export_service = ExportService()
-            export_service.export_annotations(task.project.lb_uid)
+        :return: Tuple of (upload SyncJob, None), or (None, 409 response) if the task is
+            leased to another annotator or was annotated meanwhile.
+        """
+        with transaction.atomic():
+            # The row lock serializes concurrent submissions for the same task
+            task = AnnotationTask.objects.select_for_update().get(id=task_id)
+            if task.is_leased_to_other(owner):
+                return None, JsonResponse({"message": "Another annotator is working on this task."}, status=409)
+            if task.status not in ('PENDING', 'IN_PROGRESS'):
+                return None, JsonResponse({"message": "The task is already annotated."}, status=409)
+
+            annotation.task = task
+            annotation.save()
+
+            # Save classifications
+            cls._create_classifications([(annotation, classifications)])
 
             # update task object as annotated
             task.mark_as_annotated()
 
+            return cls._enqueue_upload([annotation]), None
+
+
+class BulkAnnotationView(AnnotationPayloadMixin, View):
+    """
+    Submit many annotations, on one or many tasks, in one request.
+
+    POST /annotations/bulk/ takes {"annotations": [...]}, each item being an annotate
+    payload plus its `task_id`. Every item is validated before anything is written;
+    then the annotations and their classifications are inserted with one
+    `bulk_create` each and a single upload job is queued for all of them.
+    """
+
+    async def post(self, request):
+        data = json.loads(request.body)
+        items = data.get('annotations')
+        if not isinstance(items, list) or not items:
+            return JsonResponse({"message": "'annotations' must be a non-empty list."}, status=400)
+        # One request is uploaded as (at most) one MAL batch
+        if len(items) > settings.MAL_BATCH_MAX_SIZE:
             return JsonResponse(
-                {"message": "Annotation task created and export triggered successfully."},
-                status=201,
+                {"message": f"At most {settings.MAL_BATCH_MAX_SIZE} annotations per request."}, status=400
             )
 
-    def _convert_to_python_annotation(self, annotation):
-        """
-        Convert a Django Annotation object to the Labelbox Python annotation format.
+        task_ids = {self._task_id(item) for item in items} - {None}
+        tasks = {
+            task.id: task async for task in
+            AnnotationTask.objects.select_related('project__ontology_template').filter(id__in=task_ids)
+        }
+        owner = await sync_to_async(annotator_id)(request)
+
+        parsed, errors = await run_blocking(self._parse_all, items, tasks)
+        if errors:
+            return JsonResponse({"message": "No annotations were saved.", "errors": errors}, status=400)
+
+        job, conflict = await sync_to_async(self._save)(owner, parsed)
+        if conflict is not None:
+            return conflict
+
+        return JsonResponse(
+            {
+                "message": f"{len(parsed)} annotations saved and queued for upload to Labelbox.",
+                "annotation_ids": [str(annotation.id) for annotation, _ in parsed],
+                "versions": [annotation.version for annotation, _ in parsed],
+                "job_id": str(job.id),
+                "status_url": reverse('job_status', kwargs={'pk': job.id}),
+            },
+            status=202,
+        )
+
+    @staticmethod
+    def _task_id(item):
+        try:
+            return uuid.UUID(str(item['task_id']))
+        except (TypeError, KeyError, ValueError):
+            return None
+
+    @classmethod
+    def _parse_all(cls, items, tasks):
         """
-        classifications = [
-            lb_types.ClassificationAnnotation(
-                name=cls.name,
-                value=lb_types.Text(answer=cls.value) if cls.classification_type == "text" else None
-            )
-            for cls in annotation.classifications.all()
-        ]
+        Build every annotation of the request.
 
-        if annotation.annotation_type == "bounding_box":
-            bbox_data = annotation.data
-            print(bbox_data)
-            return lb_types.ObjectAnnotation(
-                name=annotation.name,
-                value=lb_types.Rectangle(
-                    start=lb_types.Point(x=bbox_data[0].get('left'), y=bbox_data[0].get('top')),
-                    end=lb_types.Point(x=bbox_data[0].get('left') + bbox_data[0].get('width'),
-                                       y=bbox_data[0].get('top') + bbox_data[0].get('height'))
-                ),
-                classifications=classifications
-            )
-        elif annotation.annotation_type == "polygon":
-            points = [lb_types.Point(x=pt['x'], y=pt['y']) for pt in annotation.data]
-            return lb_types.ObjectAnnotation(
-                name=annotation.name,
-                value=lb_types.Polygon(points=points),
-                classifications=classifications
-            )
-        elif annotation.annotation_type == "point":
-            point_data = annotation.data[0]
-            return lb_types.ObjectAnnotation(
-                name=annotation.name,
-                value=lb_types.Point(x=point_data.get('x'), y=point_data.get('y')),
-                classifications=classifications
-            )
-        else:
-            raise ValueError(f"Unsupported annotation type: {annotation.annotation_type}")
+        :return: Tuple of ((Annotation, classification dicts) pairs, [{"index", "message"}] errors).
+        """
+        parsed, errors = [], []
+        for index, item in enumerate(items):
+            task = tasks.get(cls._task_id(item))
+            if task is None:
+                errors.append({"index": index, "message": "Unknown or missing task_id."})
+            elif task.status not in ('PENDING', 'IN_PROGRESS'):
+                errors.append({"index": index, "message": "The task is already annotated."})
+            elif not isinstance(item.get('annotations'), dict):
+                errors.append({"index": index, "message": "'annotations' must be an object."})
+            else:
+                try:
+                    parsed.append(cls._parse(task, item))
+                except ValueError as exc:
+                    errors.append({"index": index, "message": str(exc)})
+        return parsed, errors
+
+    @classmethod
+    def _save(cls, owner, parsed):
+        """
+        Store all annotations and queue one upload for them.
 
-    def _upload_annotations_to_labelbox(self, global_key, annotations, project_id):
+        :return: Tuple of (upload SyncJob, None), or (None, 409 response) if a task
+            is leased to another annotator or was annotated meanwhile.
         """
-        Upload the converted annotations to Labelbox.
+        annotations = [annotation for annotation, _ in parsed]
+        with transaction.atomic():
+            # Locked in id order, so bulk requests sharing tasks cannot deadlock
+            tasks = AnnotationTask.objects.select_for_update().filter(
+                id__in={annotation.task_id for annotation in annotations}
+            ).order_by('id')
+            unavailable = [
+                str(task.id) for task in tasks
+                if task.is_leased_to_other(owner) or task.status not in ('PENDING', 'IN_PROGRESS')
+            ]
+            if unavailable:
+                return None, JsonResponse({
+                    "message": "Some tasks are being worked on by another annotator or were annotated meanwhile.",
+                    "task_ids": unavailable,
+                }, status=409)
+
+            Annotation.objects.bulk_create(annotations)
+            cls._create_classifications(parsed)
+
+            # AnnotationTask.mark_as_annotated for every task, in one UPDATE
+            now = timezone.now()
+            tasks.update(status='COMPLETED', annotated_at=now, lease_owner='', lease_expires_at=None, updated_at=now)
+
+            return cls._enqueue_upload(annotations), None
+
+
+class AnnotationDetailView(AnnotationPayloadMixin, View):
+    """
+    Read, edit or delete a saved annotation.
+
+    GET /annotations/<id>/ returns it with its current `version`. PUT takes the same
+    JSON as the annotate POST plus the `version` the edit was made against; DELETE
+    takes it as `?version=`. A stale version is rejected with 409 and the current
+    version, so concurrent edits never overwrite each other. An edit only queues a
+    Labelbox upload when the annotation differs from what was last uploaded.
+    """
+
+    async def get(self, request, pk):
+        annotation = await aget_object_or_404(Annotation.objects.prefetch_related('classifications'), id=pk)
+        return JsonResponse(annotation.as_dict())
+
+    async def put(self, request, pk):
+        data = json.loads(request.body)
+        version = self._version(data.get('version'))
+        if version is None:
+            return JsonResponse({"message": "An integer 'version' is required."}, status=400)
+
+        current = await aget_object_or_404(
+            Annotation.objects.select_related('task__project__ontology_template'), id=pk
+        )
+        owner = await sync_to_async(annotator_id)(request)
+        edited, classifications, error = await self._build_annotation(current.task, data)
+        if error is not None:
+            return error
+
+        annotation, job, conflict = await sync_to_async(self._update)(pk, version, owner, edited, classifications)
+        if conflict is not None:
+            return conflict
+
+        return JsonResponse({
+            "message": ("Annotation updated and queued for upload to Labelbox." if job is not None
+                        else "Annotation updated; it already matches the uploaded version."),
+            "annotation_id": str(annotation.id),
+            "version": annotation.version,
+            "sync_status": annotation.sync_status,
+            "job_id": str(job.id) if job is not None else None,
+            "status_url": reverse('job_status', kwargs={'pk': job.id}) if job is not None else None,
+        })
+
+    async def delete(self, request, pk):
+        version = self._version(request.GET.get('version'))
+        if version is None:
+            return JsonResponse({"message": "An integer 'version' query parameter is required."}, status=400)
+
+        owner = await sync_to_async(annotator_id)(request)
+        annotation, conflict = await sync_to_async(self._delete)(pk, version, owner)
+        if conflict is not None:
+            return conflict
+
+        return JsonResponse({
+            "message": "Annotation deleted.",
+            "annotation_id": str(pk),
+            # MAL imports cannot be withdrawn per annotation; an uploaded copy stays in Labelbox
+            "labelbox_copy_kept": bool(annotation.sync_hash),
+        })
+
+    @staticmethod
+    def _version(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _lock(pk, version, owner):
         """
-        labelbox_service = LabelboxService()  # Assuming LabelboxService handles API calls
+        Lock an annotation (and its task) for writing.
 
-        label = lb_types.Label(
-            data={"global_key": global_key},
-            annotations=annotations
+        :return: Tuple of (Annotation, None), or (None, 404/409 response).
+        """
+        annotation = (
+            Annotation.objects.select_for_update()
+            .select_related('task').filter(id=pk).first()
         )
-        # ontology = labelbox_service.get_ontology(project_id)
-        # print(ontology)
-        # project = labelbox_service.client.get_project("cm4y9lxj10b3m07y97ma33952")
-        # project = labelbox_service.client.get_project(project_id)
-        # data_rows = list(project.datasets().data_rows())
-        # data_row_keys = [row.global_key for row in data_rows]
-        # print("Existing Data Row Keys:", data_row_keys)
-        # upload_job = lb.MALPredictionImport.create_from_objects(
-        #     client=labelbox_service.client,
-        #     project_id=project_id,
-        #     name=f"mal_annotation_job_{str(uuid.uuid4())}",
-        #     predictions=[label]
-        # )
-        # Upload label for this data row in project
-        # Before upload
-        # if not labelbox_service.check_dataRow_exists(global_key, project_id):
-        #     raise Exception(f"DataRow with global_key {global_key} does not exist in project id {project_id}")
-        # print('lebel', label)
-        # keys = labelbox_service.get_existing_data_row_keys(project_id)
-        # print(keys)
-        # Then upload
-        upload_job = lb.MALPredictionImport.create_from_objects(
-            client=labelbox_service.client,
-            project_id=project_id,
-            name="mal_job" + str(uuid.uuid4()),
-            predictions=[label]
+        if annotation is None:
+            return None, JsonResponse({"message": "Annotation not found."}, status=404)
+        if annotation.task.is_leased_to_other(owner):
+            return None, JsonResponse({"message": "Another annotator is working on this task."}, status=409)
+        if annotation.version != version:
+            return None, JsonResponse({
+                "message": "The annotation was changed since this version was loaded.",
+                "version": annotation.version,
+            }, status=409)
+        return annotation, None
+
+    @classmethod
+    def _update(cls, pk, version, owner, edited, classifications):
+        """
+        Apply an edit if `version` is still current, and queue its upload if the
+        content differs from what Labelbox has.
+
+        :return: Tuple of (Annotation, upload SyncJob or None, conflict response or None).
+        """
+        with transaction.atomic():
+            annotation, conflict = cls._lock(pk, version, owner)
+            if conflict is not None:
+                return None, None, conflict
+
+            for field in ('name', 'annotation_type', 'data', 'geometry', 'vertex_count_received', 'vertex_count'):
+                setattr(annotation, field, getattr(edited, field))
+            annotation.version += 1
+            annotation.classifications.all().delete()
+            cls._create_classifications([(annotation, classifications)])
+
+            job = None
+            unchanged = annotation.sync_hash and annotation.compute_sync_hash() == annotation.sync_hash
+            # A batch in flight is uploading other content, so only an idle annotation can skip the upload
+            if unchanged and annotation.sync_status != 'SYNCING':
+                annotation.sync_status, annotation.sync_error = 'SYNCED', ''
+            else:
+                annotation.sync_status, annotation.sync_error = 'PENDING', ''
+                job = cls._enqueue_upload([annotation])
+            annotation.save()
+            return annotation, job, None
+
+    @classmethod
+    def _delete(cls, pk, version, owner):
+        with transaction.atomic():
+            annotation, conflict = cls._lock(pk, version, owner)
+            if conflict is not None:
+                return None, conflict
+            annotation.delete()
+            return annotation, None
+
+
+class NextTaskView(View):
+    """
+    Lease the next task of a project to the calling annotator.
+
+    POST /projects/<project_id>/tasks/next/ returns the task, or 204 when none is left.
+    """
+
+    async def post(self, request, project_id):
+        project = await aget_object_or_404(AnnotationProject.objects.all(), id=project_id)
+        owner = await sync_to_async(annotator_id)(request)
+        task = await sync_to_async(claim_next_task)(project, owner)
+        if task is None:
+            return HttpResponse(status=204)
+
+        return JsonResponse({
+            "task_id": str(task.id),
+            "global_key": task.global_key,
+            "image_url": task.image_url,
+            "lease_expires_at": task.lease_expires_at.isoformat(),
+            "annotate_url": reverse('task-annotate', kwargs={'task_id': task.id}),
+        })
+
+
+class MetricsView(View):
+    """
+    Prometheus metrics of this process, in the text exposition format.
+
+    Served to staff users and to scrapers calling from METRICS_ALLOWED_IPS.
+    """
+
+    def get(self, request):
+        if not (request.user.is_staff or metrics_client_allowed(request.META.get('REMOTE_ADDR', ''))):
+            return HttpResponse(status=403)
+        return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
+
+
+class AnnotationRegionView(View):
+    """
+    Annotations of a task that intersect a region, with their IoU against it.
+
+    GET /tasks/<task_id>/annotations/region/?bbox=left,top,width,height[&min_iou=0.5]
+    """
+
+    async def get(self, request, task_id):
+        task = await aget_object_or_404(AnnotationTask.objects.all(), id=task_id)
+        try:
+            left, top, width, height = (float(value) for value in request.GET['bbox'].split(','))
+            min_iou = float(request.GET.get('min_iou', 0))
+        except (KeyError, ValueError):
+            return JsonResponse({"message": "bbox=left,top,width,height is required"}, status=400)
+
+        region = shapely.box(min(left, left + width), min(top, top + height),
+                             max(left, left + width), max(top, top + height))
+        # The index may be (re)built from the database, so this runs as sync code
+        matches = await sync_to_async(lambda: get_task_index(task.id).query(region))()
+        return JsonResponse({
+            "task_id": str(task.id),
+            "annotations": [
+                {
+                    "id": str(annotation.id),
+                    "name": annotation.name,
+                    "annotation_type": annotation.annotation_type,
+                    "iou": score,
+                }
+                for annotation, score in matches if not min_iou or (score is not None and score >= min_iou)
+            ],
+        })
+
+
+class SyncJobStatusView(View):
+    """
+    GET /jobs/<id>/ returns the job. With `?wait=<seconds>` (up to JOB_STATUS_MAX_WAIT)
+    the response is held until the job succeeds or fails for good, so clients long-poll
+    instead of polling in a loop. Between polls a waiting request holds no worker thread.
+    """
+
+    async def get(self, request, pk):
+        try:
+            wait = min(float(request.GET.get('wait') or 0), settings.JOB_STATUS_MAX_WAIT)
+        except ValueError:
+            return JsonResponse({"message": "wait must be a number of seconds"}, status=400)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        job = await aget_object_or_404(SyncJob.objects.all(), pk=pk)
+        while job.status not in ('SUCCEEDED', 'FAILED') and loop.time() < deadline:
+            await asyncio.sleep(min(settings.JOB_STATUS_POLL_INTERVAL, max(deadline - loop.time(), 0)))
+            job = await aget_object_or_404(SyncJob.objects.all(), pk=pk)
+        return JsonResponse(job.as_dict())
+
+
+class ImageImportView(View):
+    """Upload a CSV or NDJSON manifest of image URLs; the sync worker imports it in the background."""
+
+    def post(self, request, project_id):
+        project = get_object_or_404(AnnotationProject, id=project_id)
+        manifest = request.FILES.get('manifest')
+        if manifest is None:
+            return JsonResponse({"message": "Upload the manifest file as 'manifest'."}, status=400)
+
+        file_format = request.POST.get('format', '').upper() or manifest_format(manifest.name)
+        if file_format not in dict(ImageImport.FORMAT_CHOICES):
+            return JsonResponse({"message": f"Unsupported manifest format: {file_format}"}, status=400)
+
+        with transaction.atomic():
+            image_import = ImageImport.objects.create(project=project, manifest=manifest, file_format=file_format)
+            job = enqueue('IMPORT_IMAGES', {'import_id': str(image_import.id)})
+
+        return JsonResponse(
+            {
+                "import_id": str(image_import.id),
+                "job_id": str(job.id),
+                "status_url": reverse('image_import_status', kwargs={'pk': image_import.id}),
+            },
+            status=202,
         )
 
-        upload_job.wait_till_done()
 
-        if upload_job.errors:
-            raise Exception(f"Labelbox upload errors: {upload_job.errors}")
+class ImageImportStatusView(View):
+    def get(self, request, pk):
+        image_import = get_object_or_404(ImageImport, pk=pk)
+        return JsonResponse(image_import.as_dict())
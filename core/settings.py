@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'annotation.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -132,3 +133,59 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LABELBOX_API_KEY = config('LABELBOX_API_KEY')
+# Shared Labelbox project/ontology cache (see annotation/clients.py): entries and lifetime in seconds
+LABELBOX_CACHE_SIZE = config('LABELBOX_CACHE_SIZE', default=256, cast=int)
+LABELBOX_CACHE_TTL = config('LABELBOX_CACHE_TTL', default=300, cast=int)
+
+# Background Labelbox sync jobs (see annotation/jobs.py and `manage.py run_sync_worker`)
+SYNC_JOB_MAX_ATTEMPTS = config('SYNC_JOB_MAX_ATTEMPTS', default=5, cast=int)
+SYNC_JOB_RETRY_BACKOFF = config('SYNC_JOB_RETRY_BACKOFF', default=30, cast=int)  # seconds, doubled per attempt
+SYNC_JOB_LEASE_SECONDS = config('SYNC_JOB_LEASE_SECONDS', default=600, cast=int)
+# How long an annotator keeps a task handed out by the next-task endpoint
+TASK_LEASE_SECONDS = config('TASK_LEASE_SECONDS', default=900, cast=int)
+
+# MAL uploads are coalesced into one import per project (see annotation/uploads.py)
+MAL_BATCH_MAX_SIZE = config('MAL_BATCH_MAX_SIZE', default=500, cast=int)
+MAL_BATCH_MAX_AGE = config('MAL_BATCH_MAX_AGE', default=5, cast=int)  # seconds
+
+# Labelbox exports: data rows per streamed page, image download timeout in seconds
+EXPORT_PAGE_SIZE = config('EXPORT_PAGE_SIZE', default=500, cast=int)
+IMAGE_DOWNLOAD_TIMEOUT = config('IMAGE_DOWNLOAD_TIMEOUT', default=30, cast=int)
+IMAGE_DOWNLOAD_WORKERS = config('IMAGE_DOWNLOAD_WORKERS', default=16, cast=int)
+IMAGE_DOWNLOAD_PER_HOST = config('IMAGE_DOWNLOAD_PER_HOST', default=8, cast=int)  # concurrent requests per host
+IMAGE_DOWNLOAD_CHUNK_SIZE = config('IMAGE_DOWNLOAD_CHUNK_SIZE', default=64 * 1024, cast=int)  # bytes
+# Images whose download failed: distinct URLs retried per export run, and failed downloads
+# after which a URL is given up on
+EXPORT_IMAGE_RETRY_LIMIT = config('EXPORT_IMAGE_RETRY_LIMIT', default=50, cast=int)
+EXPORT_IMAGE_MAX_ATTEMPTS = config('EXPORT_IMAGE_MAX_ATTEMPTS', default=5, cast=int)
+
+# Data row imports: rows per Labelbox create_data_rows call, and chunk uploads in flight
+DATA_ROW_IMPORT_CHUNK_SIZE = config('DATA_ROW_IMPORT_CHUNK_SIZE', default=1000, cast=int)
+DATA_ROW_IMPORT_WORKERS = config('DATA_ROW_IMPORT_WORKERS', default=4, cast=int)
+
+# Default Annotation coordinate storage for new projects: JSON or PACKED (float32 buffer, see
+# annotation/geometry.py). Existing annotations are converted with `manage.py convert_geometry_storage`.
+ANNOTATION_GEOMETRY_STORAGE = config('ANNOTATION_GEOMETRY_STORAGE', default='JSON')
+# Posted polygons are simplified to this tolerance in pixels before storing/uploading (0 keeps every vertex)
+POLYGON_SIMPLIFY_TOLERANCE = config('POLYGON_SIMPLIFY_TOLERANCE', default=0.5, cast=float)
+# One JSON line per request and sync job with its database, Labelbox and stage timings (annotation/metrics.py)
+TIMING_LOG_LEVEL = config('TIMING_LOG_LEVEL', default='INFO')
+# Clients (addresses or networks) that may read /metrics/ and the sync worker's metrics port; staff users always can
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1,::1', cast=Csv())
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'annotation.metrics': {'handlers': ['console'], 'level': TIMING_LOG_LEVEL, 'propagate': False},
+    },
+}
+# Async views (served through core.asgi): threads for blocking non-database work such as shapely,
+# and the longest a `GET /jobs/<id>/?wait=` long-poll is held open, checking every POLL_INTERVAL seconds
+ASYNC_BLOCKING_WORKERS = config('ASYNC_BLOCKING_WORKERS', default=8, cast=int)
+JOB_STATUS_MAX_WAIT = config('JOB_STATUS_MAX_WAIT', default=30, cast=float)
+JOB_STATUS_POLL_INTERVAL = config('JOB_STATUS_POLL_INTERVAL', default=1, cast=float)
+# Per-task annotation spatial indexes kept in memory by each process (see annotation/spatial.py)
+SPATIAL_INDEX_CACHE_SIZE = config('SPATIAL_INDEX_CACHE_SIZE', default=256, cast=int)